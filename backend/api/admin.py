@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Chat, Message, Profile, Tag, Post, Comment, Proposal, Job, Review, ForumTopic, ForumComment
+from .models import Chat, Message, Profile, Tag, Post, Comment, Proposal, Job, Review, ForumTopic, ForumComment, RatingSummary
 
 admin.site.register(Profile)
 admin.site.register(Tag)
@@ -11,4 +11,5 @@ admin.site.register(Message)
 admin.site.register(Comment)
 admin.site.register(Proposal)
 admin.site.register(Job)
-admin.site.register(Review)
\ No newline at end of file
+admin.site.register(Review)
+admin.site.register(RatingSummary)
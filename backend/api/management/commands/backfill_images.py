@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.services.images import backfill_images
+
+
+class Command(BaseCommand):
+    help = "Move inline base64 post, forum topic and avatar images into the content-addressed image store"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Rows loaded per batch')
+
+    def handle(self, *args, **options):
+        migrated = backfill_images(batch_size=options['batch_size'])
+        for column, count in migrated.items():
+            self.stdout.write(f"{column}: {count} images moved")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {sum(migrated.values())} images."))
@@ -0,0 +1,233 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+
+class BenchmarkRollback(Exception):
+    """Raised at the end of a run so all synthetic rows are rolled back"""
+
+
+def timed(func, repeat):
+    """Run func `repeat` times and return (median_ms, p95_ms)"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return statistics.median(samples), p95
+
+
+def seed_rated_users(start, stop, rng):
+    """Bulk insert users start..stop-1 with random rating summaries"""
+    from api.models import RatingSummary
+    from api.services.ratings import RATING_CRITERIA, overall_rating
+
+    users = User.objects.bulk_create(
+        [User(username=f'bench_user_{i}', password='!') for i in range(start, stop)],
+        batch_size=5000
+    )
+    summaries = []
+    for user in users:
+        review_count = rng.randint(0, 40)
+        totals = {f'{field}_total': sum(rng.randint(1, 5) for _ in range(review_count)) for field in RATING_CRITERIA}
+        summaries.append(RatingSummary(
+            user=user,
+            review_count=review_count,
+            overall_rating=overall_rating(sum(totals.values()), review_count),
+            **totals
+        ))
+    RatingSummary.objects.bulk_create(summaries, batch_size=5000)
+
+
+def bench_leaderboard(command, sizes, repeat, rng):
+    """Leaderboard query and full admin dashboard latency as the user count grows"""
+    from rest_framework.test import APIRequestFactory, force_authenticate
+    from api.services.leaderboard import get_leaderboard
+    from api.views import AdminDashboardView
+
+    admin = User.objects.create(username='bench_admin', password='!', is_staff=True)
+    factory = APIRequestFactory()
+    dashboard = AdminDashboardView.as_view()
+
+    def load_dashboard():
+        request = factory.get('/api/admin-dashboard/')
+        force_authenticate(request, user=admin)
+        dashboard(request)
+
+    seeded = 0
+    for size in sorted(sizes):
+        seed_rated_users(seeded, size, rng)
+        seeded = size
+        leaderboard_ms = timed(lambda: get_leaderboard(limit=3), repeat)
+        dashboard_ms = timed(load_dashboard, repeat)
+        command.stdout.write(
+            f"users={size:>8}  leaderboard median={leaderboard_ms[0]:.2f}ms p95={leaderboard_ms[1]:.2f}ms  "
+            f"dashboard median={dashboard_ms[0]:.2f}ms p95={dashboard_ms[1]:.2f}ms"
+        )
+
+
+def seed_located_posts(start, stop, owner, centers, rng):
+    """Bulk insert posts start..stop-1 scattered around random city centers"""
+    from api.models import Post
+    from api.services.geo import grid_cell
+
+    for batch_start in range(start, stop, 5000):
+        posts = []
+        for i in range(batch_start, min(batch_start + 5000, stop)):
+            center_lat, center_lon = rng.choice(centers)
+            lat = max(-90.0, min(90.0, rng.gauss(center_lat, 0.3)))
+            lon = max(-180.0, min(180.0, rng.gauss(center_lon, 0.3)))
+            posts.append(Post(
+                title=f'bench post {i}', description='', location='', duration='1 hour',
+                posted_by=owner, latitude=lat, longitude=lon, grid_cell=grid_cell(lat, lon)
+            ))
+        Post.objects.bulk_create(posts)
+
+
+def bench_geo(command, sizes, repeat, rng):
+    """Map bounding box (plain float filters vs grid cells) and radius search as the post count grows"""
+    from api.models import Post
+    from api.services.geo import filter_bbox, filter_near
+
+    owner = User.objects.create(username='bench_geo_owner', password='!')
+    centers = [(rng.uniform(-60, 70), rng.uniform(-180, 180)) for _ in range(200)]
+
+    def box():
+        lat, lon = rng.choice(centers)
+        return lat - 0.2, lat + 0.2, lon - 0.3, lon + 0.3
+
+    def legacy_bbox():
+        min_lat, max_lat, min_lon, max_lon = box()
+        list(Post.objects.filter(
+            latitude__gte=min_lat, latitude__lte=max_lat, longitude__gte=min_lon, longitude__lte=max_lon
+        ).values_list('id', flat=True))
+
+    def grid_bbox():
+        list(filter_bbox(Post.objects.all(), *box()).values_list('id', flat=True))
+
+    def near():
+        lat, lon = rng.choice(centers)
+        list(filter_near(Post.objects.all(), lat, lon, 25).values_list('id', flat=True)[:50])
+
+    seeded = 0
+    for size in sorted(sizes):
+        seed_located_posts(seeded, size, owner, centers, rng)
+        seeded = size
+        legacy_ms = timed(legacy_bbox, repeat)
+        grid_ms = timed(grid_bbox, repeat)
+        near_ms = timed(near, repeat)
+        command.stdout.write(
+            f"posts={size:>8}  bbox floats median={legacy_ms[0]:.2f}ms p95={legacy_ms[1]:.2f}ms  "
+            f"bbox grid median={grid_ms[0]:.2f}ms p95={grid_ms[1]:.2f}ms  "
+            f"near 25km median={near_ms[0]:.2f}ms p95={near_ms[1]:.2f}ms"
+        )
+
+
+SEARCH_WORDS = (
+    'guitar piano lessons cooking dinner garden repair bicycle moving help language english turkish '
+    'math tutoring painting wall furniture assembly computer setup photography dog walking plants '
+    'sewing knitting baking bread yoga running coaching homework chess music theory violin drums'
+).split()
+SEARCH_VOCABULARY_SIZE = 20000
+
+
+def search_vocabulary(rng):
+    """SEARCH_WORDS plus synthetic filler words, with Zipf weights so a few words are common and most are rare"""
+    syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'te', 'vi', 'yo', 'zu', 'bar', 'den', 'gol', 'han', 'pek']
+    filler = {''.join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(SEARCH_VOCABULARY_SIZE)}
+    words = SEARCH_WORDS + sorted(filler - set(SEARCH_WORDS))
+    rng.shuffle(words)
+    return words, [1 / rank for rank in range(1, len(words) + 1)]
+
+
+def seed_searchable_posts(start, stop, owner, tags, vocabulary, rng):
+    """Bulk insert posts start..stop-1 with random text and two tags each, then index them"""
+    from api.models import Post
+    from api.services.search import index_posts
+
+    words, weights = vocabulary
+    for batch_start in range(start, stop, 5000):
+        posts = Post.objects.bulk_create([
+            Post(
+                title=' '.join(rng.choices(words, weights, k=4)),
+                description=' '.join(rng.choices(words, weights, k=40)),
+                location='', duration='1 hour', posted_by=owner
+            )
+            for _ in range(batch_start, min(batch_start + 5000, stop))
+        ])
+        Post.tags.through.objects.bulk_create([
+            Post.tags.through(post_id=post.id, tag_id=tag.id)
+            for post in posts for tag in rng.sample(tags, 2)
+        ])
+        # bulk_create skips the post_save/m2m_changed signals that normally keep the index current
+        index_posts([post.id for post in posts])
+
+
+def bench_search(command, sizes, repeat, rng):
+    """Post list with DRF SearchFilter (?search=, ILIKE) vs the full-text index (?q=) as the post count grows"""
+    from rest_framework.test import APIRequestFactory
+    from api.models import Tag
+    from api.views import PostViewSet
+
+    owner = User.objects.create(username='bench_search_owner', password='!')
+    tags = [Tag.objects.create(name=f'bench_tag_{word}') for word in SEARCH_WORDS[:20]]
+    vocabulary = search_vocabulary(rng)
+    factory = APIRequestFactory()
+    post_list = PostViewSet.as_view({'get': 'list'})
+
+    def list_posts(param):
+        def run():
+            # Query words are drawn uniformly, so most are rare: the case ILIKE handles worst
+            # Pagination builds absolute next/previous links, so the request needs an allowed host
+            request = factory.get('/api/posts/', {param: rng.choice(vocabulary[0])}, HTTP_HOST='localhost')
+            post_list(request).render()
+        return run
+
+    seeded = 0
+    for size in sorted(sizes):
+        seed_searchable_posts(seeded, size, owner, tags, vocabulary, rng)
+        seeded = size
+        ilike_ms = timed(list_posts('search'), repeat)
+        fts_ms = timed(list_posts('q'), repeat)
+        command.stdout.write(
+            f"posts={size:>8}  search (ILIKE) median={ilike_ms[0]:.2f}ms p95={ilike_ms[1]:.2f}ms  "
+            f"q (full-text) median={fts_ms[0]:.2f}ms p95={fts_ms[1]:.2f}ms"
+        )
+
+
+SCENARIOS = {
+    'leaderboard': (bench_leaderboard, [100, 1000, 10000, 100000]),
+    'geo': (bench_geo, [10000, 100000, 1000000]),
+    'search': (bench_search, [10000, 100000, 500000]),
+}
+
+
+class Command(BaseCommand):
+    help = "Seed synthetic data inside a rolled-back transaction and time hot query paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS), help='Which code path to benchmark')
+        parser.add_argument('--sizes', type=int, nargs='+', help='Data set sizes to measure at')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per size')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed for synthetic data')
+
+    def handle(self, *args, **options):
+        scenario, default_sizes = SCENARIOS[options['scenario']]
+        sizes = options['sizes'] or default_sizes
+        if any(size <= 0 for size in sizes):
+            raise CommandError('Sizes must be positive.')
+
+        rng = random.Random(options['seed'])
+        try:
+            with transaction.atomic():
+                scenario(self, sizes, options['repeat'], rng)
+                raise BenchmarkRollback()
+        except BenchmarkRollback:
+            pass
+        self.stdout.write(self.style.SUCCESS('Benchmark finished; synthetic data rolled back.'))
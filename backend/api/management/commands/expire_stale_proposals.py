@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.services.expiry import BATCH_SIZE, sweep
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancel waiting proposals whose date has passed and refund overdue waiting jobs "
+        "(run from cron, or keep running with --loop)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Proposals changed per transaction')
+        parser.add_argument('--loop', type=int, metavar='SECONDS',
+                            help='Sweep again every SECONDS seconds until interrupted')
+
+    def handle(self, *args, **options):
+        while True:
+            report = sweep(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Expired {report['expired_proposals']} proposals and cancelled {report['overdue_jobs']} overdue jobs "
+                f"(refunded {report['refunded_hours']} hours) in {report['batches']} batches, "
+                f"{report['seconds']}s, {report['per_second']}/s."
+            ))
+            if not options['loop']:
+                return
+            try:
+                time.sleep(options['loop'])
+            except KeyboardInterrupt:
+                return
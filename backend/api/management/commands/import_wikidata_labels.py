@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.models import WikidataLabel
+from api.services.wikidata_mirror import import_labels, open_dump
+
+
+class Command(BaseCommand):
+    help = (
+        "Load Wikidata labels and descriptions into the local mirror used by tag search. "
+        "Reads the official JSON dump or JSON lines of {id, label, description, sitelinks}, "
+        "plain or .bz2/.gz compressed, streaming it in constant memory"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Dump file (use a filtered subset of the full dump)')
+        parser.add_argument('--language', default='en', help='Label language to import')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per upsert batch')
+        parser.add_argument('--replace', action='store_true', help='Empty the mirror before importing')
+
+    def handle(self, *args, **options):
+        try:
+            dump = open_dump(options['path'])
+        except OSError as e:
+            raise CommandError(f"Cannot open {options['path']}: {e}")
+        if options['replace']:
+            WikidataLabel.objects.all().delete()
+        with dump:
+            count = import_labels(dump, language=options['language'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Imported {count} Wikidata labels ({WikidataLabel.objects.count()} in the mirror)."))
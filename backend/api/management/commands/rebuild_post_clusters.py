@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.services.clusters import rebuild_post_clusters
+
+
+class Command(BaseCommand):
+    help = "Recompute the map cluster aggregates (PostGridCell) from the Post table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert batch')
+
+    def handle(self, *args, **options):
+        count = rebuild_post_clusters(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} post cluster cells."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.services.ratings import rebuild_rating_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's stored review rating totals from the Review table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert batch')
+
+    def handle(self, *args, **options):
+        count = rebuild_rating_summaries(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rating summaries for {count} users."))
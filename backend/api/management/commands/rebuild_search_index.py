@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from api.models import Post
+from api.services.search import index_posts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of every post (tsvector on PostgreSQL, FTS5 on SQLite)"
+
+    def handle(self, *args, **options):
+        index_posts()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {Post.objects.count()} posts."))
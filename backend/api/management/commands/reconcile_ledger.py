@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.services.ledger import reconcile
+
+
+class Command(BaseCommand):
+    help = "Verify every Profile.time_balance against the ledger journal (snapshot plus later entries)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Journal each difference as an adjustment entry')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Profiles checked per batch')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile(fix=options['fix'], batch_size=options['batch_size'])
+        for user_id, journaled, balance in mismatches:
+            self.stdout.write(f"User {user_id}: journal {journaled}, profile {balance}")
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("Journal matches every profile balance."))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Recorded adjustments for {len(mismatches)} users."))
+        else:
+            raise CommandError(f"{len(mismatches)} balances differ from the journal.")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from api.services.notifications import repair_pending_counts
+
+
+class Command(BaseCommand):
+    help = "Recount every user's pending proposals and correct stored counts that drifted (run periodically)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users recounted per transaction')
+
+    def handle(self, *args, **options):
+        fixed = repair_pending_counts(batch_size=options['batch_size'])
+        for user_id, stored, counted in fixed:
+            self.stdout.write(f"User {user_id}: stored {stored}, counted {counted}")
+        self.stdout.write(self.style.SUCCESS(f"Corrected {len(fixed)} pending proposal counts."))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.services.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot users' journal balances so balance and statement queries only sum recent entries (run periodically)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-entries', type=int, default=1, help='Only snapshot users with at least this many new entries')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users per bulk insert batch')
+
+    def handle(self, *args, **options):
+        count = take_snapshots(min_entries=options['min_entries'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Took {count} balance snapshots."))
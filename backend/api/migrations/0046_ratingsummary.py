@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_rating_summaries(apps, schema_editor):
+    from api.services.ratings import rebuild_rating_summaries
+    rebuild_rating_summaries(
+        review_model=apps.get_model('api', 'Review'),
+        summary_model=apps.get_model('api', 'RatingSummary'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0045_profile_birth_date'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RatingSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('review_count', models.PositiveIntegerField(default=0)),
+                ('friendliness_total', models.PositiveIntegerField(default=0)),
+                ('time_management_total', models.PositiveIntegerField(default=0)),
+                ('reliability_total', models.PositiveIntegerField(default=0)),
+                ('communication_total', models.PositiveIntegerField(default=0)),
+                ('work_quality_total', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_rating_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:35
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+
+
+def populate_overall_rating(apps, schema_editor):
+    RatingSummary = apps.get_model('api', 'RatingSummary')
+    criteria = ('friendliness', 'time_management', 'reliability', 'communication', 'work_quality')
+    grand_total = sum((F(f'{field}_total') for field in criteria[1:]), F(f'{criteria[0]}_total'))
+    RatingSummary.objects.filter(review_count__gt=0).update(
+        overall_rating=Cast(grand_total, FloatField()) / (F('review_count') * len(criteria))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0046_ratingsummary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ratingsummary',
+            name='overall_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='ratingsummary',
+            index=models.Index(fields=['-overall_rating', '-review_count'], name='api_ratings_overall_4c2af2_idx'),
+        ),
+        migrations.RunPython(populate_overall_rating, migrations.RunPython.noop),
+    ]
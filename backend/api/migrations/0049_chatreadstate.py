@@ -0,0 +1,80 @@
+# Generated by Django 5.2.7 on 2026-10-18 02:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max, Min, Q
+
+
+def populate_read_states(apps, schema_editor):
+    """
+    Convert per-message is_read flags into one read mark per (chat, participant):
+    just below the participant's oldest unread incoming message, or at the newest
+    incoming message when everything has been read.
+    """
+    Chat = apps.get_model('api', 'Chat')
+    Message = apps.get_model('api', 'Message')
+    ChatReadState = apps.get_model('api', 'ChatReadState')
+
+    incoming = {
+        (row['chat_id'], row['sender_id']): row
+        for row in Message.objects.order_by().values('chat_id', 'sender_id').annotate(
+            oldest_unread=Min('id', filter=Q(is_read=False)),
+            newest=Max('id'),
+        )
+    }
+
+    states = []
+    for chat in Chat.objects.only('id', 'participant1_id', 'participant2_id').iterator():
+        for reader_id, sender_id in (
+            (chat.participant1_id, chat.participant2_id),
+            (chat.participant2_id, chat.participant1_id),
+        ):
+            row = incoming.get((chat.id, sender_id))
+            if row is None:
+                continue
+            mark = row['oldest_unread'] - 1 if row['oldest_unread'] is not None else row['newest']
+            states.append(ChatReadState(chat_id=chat.id, user_id=reader_id, last_read_message_id=mark))
+    ChatReadState.objects.bulk_create(states, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0048_message_chat_created_at_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatReadState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_message_id', models.BigIntegerField(default=0)),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['chat', 'id'], name='api_message_chat_id_7933e6_idx'),
+        ),
+        migrations.AddField(
+            model_name='chatreadstate',
+            name='chat',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='read_states', to='api.chat'),
+        ),
+        migrations.AddField(
+            model_name='chatreadstate',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_read_states', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='chatreadstate',
+            unique_together={('chat', 'user')},
+        ),
+        migrations.RunPython(populate_read_states, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+from api.services.geo import grid_cell
+
+
+def populate_grid_cells(apps, schema_editor):
+    Post = apps.get_model('api', 'Post')
+    posts = Post.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    batch = []
+    for post in posts.iterator(chunk_size=2000):
+        post.grid_cell = grid_cell(post.latitude, post.longitude)
+        batch.append(post)
+        if len(batch) >= 2000:
+            Post.objects.bulk_update(batch, ['grid_cell'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['grid_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0049_chatreadstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='grid_cell',
+            field=models.IntegerField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_grid_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:08
+
+from django.db import migrations, models
+
+
+def populate_post_grid_cells(apps, schema_editor):
+    from api.services.clusters import rebuild_post_clusters
+    rebuild_post_clusters(
+        post_model=apps.get_model('api', 'Post'),
+        cell_model=apps.get_model('api', 'PostGridCell'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0050_post_grid_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostGridCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('zoom', models.PositiveSmallIntegerField()),
+                ('cell', models.BigIntegerField()),
+                ('post_count', models.IntegerField(default=0)),
+                ('offer_count', models.IntegerField(default=0)),
+                ('need_count', models.IntegerField(default=0)),
+                ('latitude_sum', models.FloatField(default=0.0)),
+                ('longitude_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('zoom', 'cell'), name='unique_post_grid_cell')],
+            },
+        ),
+        migrations.RunPython(populate_post_grid_cells, migrations.RunPython.noop),
+    ]
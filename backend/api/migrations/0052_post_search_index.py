@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def install_search_index(apps, schema_editor):
+    from api.services.search import get_search_backend
+    backend = get_search_backend(schema_editor.connection.vendor)
+    with schema_editor.connection.cursor() as cursor:
+        backend.install(cursor)
+        backend.index(cursor, None)
+
+
+def uninstall_search_index(apps, schema_editor):
+    from api.services.search import get_search_backend
+    with schema_editor.connection.cursor() as cursor:
+        get_search_backend(schema_editor.connection.vendor).uninstall(cursor)
+
+
+class Migration(migrations.Migration):
+    """
+    Full-text search storage that the ORM does not model: a tsvector column with a GIN
+    index on PostgreSQL, an FTS5 table on SQLite (see api/services/search.py).
+    """
+
+    dependencies = [
+        ('api', '0051_postgridcell'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
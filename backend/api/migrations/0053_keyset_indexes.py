@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0052_post_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='forumtopic',
+            index=models.Index(fields=['is_hidden', 'created_at', 'id'], name='api_forumto_is_hidd_59157a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='forumtopic',
+            index=models.Index(fields=['created_at', 'id'], name='api_forumto_created_58f241_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['is_hidden', 'created_at', 'id'], name='api_post_is_hidd_82f7ef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_at', 'id'], name='api_post_created_7ba740_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposal',
+            index=models.Index(fields=['requester', 'created_at', 'id'], name='api_proposa_request_5ada7c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposal',
+            index=models.Index(fields=['provider', 'created_at', 'id'], name='api_proposa_provide_4dda9e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proposal',
+            index=models.Index(fields=['created_at', 'id'], name='api_proposa_created_364f21_idx'),
+        ),
+    ]
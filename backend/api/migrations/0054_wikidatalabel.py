@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-18 03:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0053_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WikidataLabel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('wikidata_id', models.CharField(max_length=20, unique=True)),
+                ('label', models.CharField(max_length=250)),
+                ('search_label', models.CharField(db_index=True, max_length=250)),
+                ('description', models.TextField(blank=True)),
+                ('sitelinks', models.PositiveIntegerField(default=0, help_text='Number of Wikipedia articles; ranks popular entities first')),
+            ],
+        ),
+    ]
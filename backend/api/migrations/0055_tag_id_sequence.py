@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def install_sequences(apps, schema_editor):
+    from api.services.sequences import SEQUENCES, get_sequence_backend
+    backend = get_sequence_backend(schema_editor.connection.vendor)
+    with schema_editor.connection.cursor() as cursor:
+        for name in SEQUENCES:
+            backend.install(cursor, name)
+
+
+def uninstall_sequences(apps, schema_editor):
+    from api.services.sequences import SEQUENCES, get_sequence_backend
+    backend = get_sequence_backend(schema_editor.connection.vendor)
+    with schema_editor.connection.cursor() as cursor:
+        for name in SEQUENCES:
+            backend.uninstall(cursor, name)
+
+
+class Migration(migrations.Migration):
+    """
+    Allocator for Tag.tag_id, started after the existing tags: a native sequence on
+    PostgreSQL, a row in an api_sequence counter table on SQLite (see api/services/sequences.py).
+    """
+
+    dependencies = [
+        ('api', '0054_wikidatalabel'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_sequences, uninstall_sequences),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:09
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    """Balances that predate the journal become one opening entry per user"""
+    Profile = apps.get_model('api', 'Profile')
+    LedgerEntry = apps.get_model('api', 'LedgerEntry')
+    profiles = Profile.objects.exclude(time_balance=0).values_list('user_id', 'time_balance').iterator(chunk_size=2000)
+    batch = []
+    for user_id, balance in profiles:
+        batch.append(LedgerEntry(user_id=user_id, amount=balance, reason='opening_balance'))
+        if len(batch) >= 2000:
+            LedgerEntry.objects.bulk_create(batch)
+            batch = []
+    LedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0055_tag_id_sequence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, help_text='Signed; negative for debits', max_digits=6)),
+                ('reason', models.CharField(choices=[('opening_balance', 'Opening Balance'), ('signup_bonus', 'Signup Bonus'), ('payment', 'Payment'), ('refund', 'Refund'), ('payout', 'Payout'), ('no_show', 'No-show Payout'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('counterparty', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='api.job')),
+                ('proposal', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='api.proposal')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField(help_text='Time of last_entry')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('taken_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to=settings.AUTH_USER_MODEL)),
+                ('last_entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.ledgerentry')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['user', 'id'], name='api_ledgere_user_id_c435f9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ledgerentry',
+            index=models.Index(fields=['user', 'created_at'], name='api_ledgere_user_id_91fbf5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['user', 'last_entry'], name='api_balance_user_id_d95c87_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='balancesnapshot',
+            index=models.Index(fields=['user', 'as_of'], name='api_balance_user_id_8559bd_idx'),
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_pending_counts(apps, schema_editor):
+    from api.services.notifications import repair_pending_counts
+    repair_pending_counts(
+        proposal_model=apps.get_model('api', 'Proposal'),
+        count_model=apps.get_model('api', 'PendingApprovalCount'),
+        notify=False,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0057_expiry_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingApprovalCount',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='pending_approval_count', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_pending_counts, migrations.RunPython.noop),
+    ]
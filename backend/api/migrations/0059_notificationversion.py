@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0058_pendingapprovalcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationVersion',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField()),
+            ],
+        ),
+    ]
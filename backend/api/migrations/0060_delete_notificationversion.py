@@ -0,0 +1,16 @@
+# Generated by Django 5.2.7 on 2026-10-18 05:16
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0059_notificationversion'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='NotificationVersion',
+        ),
+    ]
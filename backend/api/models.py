@@ -1,11 +1,32 @@
-from django.db import models
+from contextlib import nullcontext
+
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Coalesce, Greatest
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 
+from .services.clusters import update_post_clusters
+from .services.geo import grid_cell
+from .services.images import externalize_image
+from .services import transitions
+from .services.notifications import pending_deltas
+from .services.ratings import RATING_CRITERIA
+from .services.sequences import next_value
+
+
+def externalize_image_field(instance, field_name, update_fields=None):
+    """Swap an inline base64 image on the instance for its blob store URL before saving"""
+    if update_fields is not None and field_name not in update_fields:
+        return
+    if field_name in instance.get_deferred_fields():
+        return
+    setattr(instance, field_name, externalize_image(getattr(instance, field_name)))
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     avatar = models.TextField(blank=True, null=True, default="https://placehold.co/100x100/EBF8FF/3B82F6?text=User")
@@ -27,48 +48,13 @@ class Profile(models.Model):
         return self.avatar if self.avatar else "https://placehold.co/100x100/EBF8FF/3B82F6?text=User"
 
     def get_review_averages(self):
-        """Calculate average ratings from all reviews received by this user - optimized"""
-        from django.db.models import Avg, Count
-        # Use aggregate directly without exists() check - more efficient
-        averages = Review.objects.filter(reviewed_user=self.user).aggregate(
-            avg_friendliness=Avg('friendliness'),
-            avg_time_management=Avg('time_management'),
-            avg_reliability=Avg('reliability'),
-            avg_communication=Avg('communication'),
-            avg_work_quality=Avg('work_quality'),
-            total_count=Count('id')
-        )
-        
-        total_reviews = averages['total_count'] or 0
-        
-        if total_reviews == 0:
-            return {
-                'friendliness': 0,
-                'time_management': 0,
-                'reliability': 0,
-                'communication': 0,
-                'work_quality': 0,
-                'overall': 0,
-                'total_reviews': 0,
-            }
-        
-        overall = (
-            (averages['avg_friendliness'] or 0) +
-            (averages['avg_time_management'] or 0) +
-            (averages['avg_reliability'] or 0) +
-            (averages['avg_communication'] or 0) +
-            (averages['avg_work_quality'] or 0)
-        ) / 5
-        
-        return {
-            'friendliness': round(averages['avg_friendliness'] or 0, 2),
-            'time_management': round(averages['avg_time_management'] or 0, 2),
-            'reliability': round(averages['avg_reliability'] or 0, 2),
-            'communication': round(averages['avg_communication'] or 0, 2),
-            'work_quality': round(averages['avg_work_quality'] or 0, 2),
-            'overall': round(overall, 2),
-            'total_reviews': total_reviews,
-        }
+        """Return average ratings from the stored RatingSummary (no aggregate query)"""
+        summary = RatingSummary.objects.filter(user_id=self.user_id).first()
+        return RatingSummary.averages_for(summary)
+
+    def save(self, *args, **kwargs):
+        externalize_image_field(self, 'avatar', kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
@@ -90,17 +76,29 @@ class Tag(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.tag_id or self.tag_id == 0:
-            last_tag = Tag.objects.order_by('-tag_id').first()
-            if last_tag and last_tag.tag_id:
-                self.tag_id = last_tag.tag_id + 1
-            else:
-                self.tag_id = 1
+            self.tag_id = next_value('tag_id')
         super().save(*args, **kwargs)
 
     def __str__(self):
         return self.name
 
 
+class WikidataLabel(models.Model):
+    """
+    Local mirror of Wikidata labels/descriptions, loaded with the import_wikidata_labels command.
+    Tag search reads it before (or instead of) the live Wikidata API.
+    """
+    wikidata_id = models.CharField(max_length=20, unique=True)
+    label = models.CharField(max_length=250)
+    # Case- and accent-folded label for prefix range scans (see services/tag_index.fold)
+    search_label = models.CharField(max_length=250, db_index=True)
+    description = models.TextField(blank=True)
+    sitelinks = models.PositiveIntegerField(default=0, help_text="Number of Wikipedia articles; ranks popular entities first")
+
+    def __str__(self):
+        return f"{self.wikidata_id}: {self.label}"
+
+
 class ForumTopic(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='forum_topics')
     title = models.CharField(max_length=200)
@@ -113,6 +111,15 @@ class ForumTopic(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pages of the topic list (newest first, hidden topics filtered out for non-staff)
+            models.Index(fields=['is_hidden', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    def save(self, *args, **kwargs):
+        externalize_image_field(self, 'image', kwargs.get('update_fields'))
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.title} by {self.author.username}"
@@ -159,6 +166,8 @@ class Post(models.Model):
     latitude = models.FloatField(blank=True, null=True)
     longitude = models.FloatField(blank=True, null=True) 
     location_display_name = models.CharField(max_length=255, blank=True, null=True)
+    # Spatial grid cell of (latitude, longitude), maintained on save (see services/geo.py)
+    grid_cell = models.IntegerField(blank=True, null=True, db_index=True, editable=False)
     
     # Post image
     image = models.TextField(blank=True, null=True)
@@ -170,12 +179,81 @@ class Post(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ['-created_at'] 
+        ordering = ['-created_at']
+        indexes = [
+            # Keyset pages of the feed (newest first, hidden posts filtered out for non-staff)
+            models.Index(fields=['is_hidden', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
+
+    CLUSTER_FIELDS = ('latitude', 'longitude', 'post_type', 'is_hidden')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember what the map cluster aggregates currently count for this post
+        if all(field in field_names for field in cls.CLUSTER_FIELDS):
+            instance._stored_cluster_state = instance.cluster_state()
+        return instance
+
+    def cluster_state(self):
+        return tuple(getattr(self, field) for field in self.CLUSTER_FIELDS)
+
+    def _previous_cluster_state(self):
+        """Cluster state as stored, fetched only when it was not loaded with the instance"""
+        if self._state.adding:
+            return None
+        if hasattr(self, '_stored_cluster_state'):
+            return self._stored_cluster_state
+        return Post.objects.filter(pk=self.pk).values_list(*self.CLUSTER_FIELDS).first()
+
+    def save(self, *args, **kwargs):
+        externalize_image_field(self, 'image', kwargs.get('update_fields'))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'latitude', 'longitude'} & set(update_fields):
+            self.grid_cell = grid_cell(self.latitude, self.longitude)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'grid_cell'}
+        
+        if update_fields is not None and not set(self.CLUSTER_FIELDS) & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+        
+        with transaction.atomic():
+            previous = self._previous_cluster_state()
+            super().save(*args, **kwargs)
+            current = self.cluster_state()
+            update_post_clusters(previous, current)
+        self._stored_cluster_state = current
 
     def __str__(self):
         return self.title
 
 
+@receiver(pre_delete, sender=Post)
+def remove_post_from_clusters(sender, instance, **kwargs):
+    update_post_clusters(instance._previous_cluster_state(), None)
+
+
+class PostGridCell(models.Model):
+    """Visible post counts and coordinate sums per map cluster cell and zoom (see services/clusters.py)"""
+    zoom = models.PositiveSmallIntegerField()
+    cell = models.BigIntegerField()
+    post_count = models.IntegerField(default=0)
+    offer_count = models.IntegerField(default=0)
+    need_count = models.IntegerField(default=0)
+    latitude_sum = models.FloatField(default=0.0)
+    longitude_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['zoom', 'cell'], name='unique_post_grid_cell'),
+        ]
+
+    def __str__(self):
+        return f"Cell {self.cell} at zoom {self.zoom}: {self.post_count} posts"
+
+
 class Proposal(models.Model):
     STATUS_CHOICES = [
         ('waiting', 'Waiting'),
@@ -210,125 +288,90 @@ class Proposal(models.Model):
             models.Index(fields=['provider', 'status']),
             models.Index(fields=['status', 'created_at']),
             models.Index(fields=['requester', 'provider']),
+            # Keyset pages of sent / received / all proposals
+            models.Index(fields=['requester', 'created_at', 'id']),
+            models.Index(fields=['provider', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+            # Expiry sweep: waiting proposals by date (services/expiry.py)
+            models.Index(fields=['status', 'proposed_date', 'id']),
         ]
 
+    # Field values captured when the row is loaded, so save() knows the previous
+    # status without reading the row again
+    TRACKED_FIELDS = ('status', 'provider_approved', 'requester_approved')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._track()
+        return instance
+
+    def _track(self):
+        self._loaded_values = {field: self.__dict__[field] for field in self.TRACKED_FIELDS if field in self.__dict__}
+
+    def loaded_value(self, field: str):
+        """Value of a tracked field as last loaded or saved (None for unsaved proposals)"""
+        return getattr(self, '_loaded_values', {}).get(field)
+
+    def has_changed(self, field: str) -> bool:
+        return self.loaded_value(field) != getattr(self, field)
+
+    def _previous_status_for_save(self):
+        if 'status' in getattr(self, '_loaded_values', {}):
+            return self._loaded_values['status']
+        # Built by hand rather than loaded: read the stored status once
+        return Proposal.objects.filter(pk=self.pk).values_list('status', flat=True).first()
+
     def save(self, *args, **kwargs):
-        """Handle proposal status changes and related operations"""
-        # Track if this is a new proposal being accepted
-        is_being_accepted = False
-        was_accepted = False
-        was_cancelled = False
-        should_create_job = False
-        
-        if self.pk:
+        """
+        Handle proposal status changes and related operations.
+
+        The previous status comes from the load-time tracker. A status change
+        is written with an UPDATE guarded on that status (compare-and-set), so
+        of two concurrent transitions of the same proposal only one applies;
+        the other raises ValidationError. The write and its side effects
+        (declared in services/transitions.py: balance moves through the
+        ledger service, job rows) and the parties' pending counts share one
+        transaction. Saves that change no status run no extra queries.
+        """
+        previous_status = None if self.pk is None else self._previous_status_for_save()
+        # Previous status is exposed to post_save receivers (realtime events)
+        self._previous_status = previous_status
+        fired = transitions.transitions_for_save(self, previous_status)
+        for transition in fired:
+            if transition.requires_approvals:
+                self.status = transition.target
+        pending = pending_deltas([(self.requester_id, self.provider_id, previous_status, self.status)])
+        if not fired and not pending:
+            super().save(*args, **kwargs)
+        else:
+            is_new = self.pk is None
             try:
-                old_instance = Proposal.objects.get(pk=self.pk)
-                was_accepted = old_instance.status == 'accepted'
-                was_cancelled = old_instance.status == 'cancelled'
-                
-                # Check if status is changing to accepted
-                if old_instance.status != 'accepted' and self.status == 'accepted':
-                    is_being_accepted = True
-            except Proposal.DoesNotExist:
-                pass
-        elif self.status == 'accepted':
-            is_being_accepted = True
-        
-        # Handle accepted status - create Job and deduct balance
-        if is_being_accepted:
-            # Check if Job already exists for this proposal
-            # Only check if proposal is already saved (has primary key)
-            existing_job = None
-            if self.pk:
-                existing_job = self.jobs.filter(status='waiting').first()
-            
-            if not existing_job:
-                # Create Job with waiting status only if it doesn't exist
-                # Note: Job will be created after proposal is saved (see below)
-                # We'll create it after super().save() if this is a new proposal
-                should_create_job = True
-            else:
-                should_create_job = False
-            
-            # Check balance and deduct based on post type
-            if self.post.post_type == 'offer':
-                # Offer: requester pays (balance deducted from requester)
-                requester_profile = self.requester.profile
-                if requester_profile.time_balance < self.timebank_hour:
-                    raise ValidationError(
-                        f"Insufficient balance. Required: {self.timebank_hour} hours, "
-                        f"Available: {requester_profile.time_balance} hours."
-                    )
-                requester_profile.time_balance -= self.timebank_hour
-                requester_profile.save()
-            elif self.post.post_type == 'need':
-                # Need: provider pays (balance deducted from provider/post owner)
-                provider_profile = self.provider.profile
-                if provider_profile.time_balance < self.timebank_hour:
-                    raise ValidationError(
-                        f"Insufficient balance. Required: {self.timebank_hour} hours, "
-                        f"Available: {provider_profile.time_balance} hours."
-                    )
-                provider_profile.time_balance -= self.timebank_hour
-                provider_profile.save()
-        
-        # Handle cancelled status (if was accepted before)
-        if self.status == 'cancelled' and was_accepted and not was_cancelled:
-            # Refund balance based on post type
-            if self.post.post_type == 'offer':
-                # Offer: refund to requester
-                requester_profile = self.requester.profile
-                requester_profile.time_balance += self.timebank_hour
-                requester_profile.save()
-            elif self.post.post_type == 'need':
-                # Need: refund to provider
-                provider_profile = self.provider.profile
-                provider_profile.time_balance += self.timebank_hour
-                provider_profile.save()
-            
-            # Update related Job status to cancelled
-            # Note: cancelled_by will be set in the view where we have access to request.user
-            for job in self.jobs.all():
-                if job.status == 'waiting':
-                    job.status = 'cancelled'
-                    job.save()
-        
-        # Handle completed status - update Job and add balance
-        if self.status == 'accepted' and self.provider_approved and self.requester_approved:
-            self.status = 'completed'
-            # Update Job status to completed
-            for job in self.jobs.all():
-                if job.status == 'waiting':
-                    job.status = 'completed'
-                    job.save()
-                    
-                    # Add balance based on post type
-                    if self.post.post_type == 'offer':
-                        # Offer: provider receives (balance added to provider/post owner)
-                        provider_profile = self.provider.profile
-                        provider_profile.time_balance += self.timebank_hour
-                        provider_profile.save()
-                    elif self.post.post_type == 'need':
-                        # Need: requester receives (balance added to requester)
-                        requester_profile = self.requester.profile
-                        requester_profile.time_balance += self.timebank_hour
-                        requester_profile.save()
-        
-        super().save(*args, **kwargs)
-        
-        # Create Job after proposal is saved (if it's a new proposal being accepted)
-        if is_being_accepted and should_create_job:
-            # Double-check that Job doesn't exist (in case it was created elsewhere)
-            if not self.jobs.filter(status='waiting').exists():
-                Job.objects.create(
-                    post=self.post,
-                    proposal=self,
-                    requester=self.requester,
-                    provider=self.provider,
-                    timebank_hour=self.timebank_hour,
-                    status='waiting',
-                    date=self.proposed_date
-                )
+                with transitions.timed(fired[-1].name) if fired else nullcontext(), transaction.atomic():
+                    self._status_guard = previous_status if not is_new else None
+                    try:
+                        super().save(*args, **kwargs)
+                    finally:
+                        self._status_guard = None
+                    for transition in fired:
+                        transitions.apply_effects(transition, self, is_new=is_new,
+                                                  actor=getattr(self, '_transition_actor', None))
+                    PendingApprovalCount.apply_deltas(pending)
+            except Exception:
+                if is_new:
+                    # The insert was rolled back
+                    self.pk = None
+                    self._state.adding = True
+                raise
+        self._track()
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        guard = getattr(self, '_status_guard', None)
+        if guard is None:
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        if not super()._do_update(base_qs.filter(status=guard), using, pk_val, values, update_fields, forced_update):
+            raise ValidationError("This proposal was changed in the meantime. Reload it and try again.")
+        return True
 
     def __str__(self):
         return f"{self.requester.username} -> {self.post.title} ({self.status})"
@@ -364,6 +407,10 @@ class Job(models.Model):
 
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            # Expiry sweep: overdue waiting jobs (services/expiry.py)
+            models.Index(fields=['status', 'date', 'id']),
+        ]
 
     def save(self, *args, **kwargs):
         """Automatically set requester and provider from proposal if not set"""
@@ -380,6 +427,70 @@ class Job(models.Model):
     def __str__(self):
         return f"Job #{self.id} - {self.post.title} ({self.status})"
 
+
+class LedgerEntry(models.Model):
+    """
+    Append-only journal of time balance movements, written by services/ledger.py
+    in the same transaction as the Profile.time_balance update it records.
+    """
+    REASON_CHOICES = [
+        ('opening_balance', 'Opening Balance'),
+        ('signup_bonus', 'Signup Bonus'),
+        ('payment', 'Payment'),
+        ('refund', 'Refund'),
+        ('payout', 'Payout'),
+        ('no_show', 'No-show Payout'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_entries')
+    amount = models.DecimalField(max_digits=6, decimal_places=2, help_text="Signed; negative for debits")
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    proposal = models.ForeignKey(Proposal, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    job = models.ForeignKey(Job, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    counterparty = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            # Statements and snapshot tails: one user's entries in order
+            models.Index(fields=['user', 'id']),
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError("Ledger entries are append-only; record an adjustment instead.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError("Ledger entries are append-only; record an adjustment instead.")
+
+    def __str__(self):
+        return f"{self.user_id}: {self.amount} ({self.reason})"
+
+
+class BalanceSnapshot(models.Model):
+    """
+    A user's balance after every journal entry up to last_entry (taken by the
+    snapshot_balances command), so balance queries only sum the entries after it.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_snapshots')
+    last_entry = models.ForeignKey(LedgerEntry, on_delete=models.CASCADE, related_name='+')
+    as_of = models.DateTimeField(help_text="Time of last_entry")
+    balance = models.DecimalField(max_digits=8, decimal_places=2)
+    taken_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'last_entry']),
+            models.Index(fields=['user', 'as_of']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.balance} as of {self.as_of}"
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
@@ -436,10 +547,154 @@ class Review(models.Model):
         ordering = ['-created_at']
         unique_together = ['proposal', 'reviewer']  # One review per proposal per reviewer
 
+    def save(self, *args, **kwargs):
+        """Save the review and keep the reviewed user's RatingSummary in sync"""
+        previous = None
+        if self.pk:
+            previous = Review.objects.filter(pk=self.pk).values('reviewed_user_id', *RATING_CRITERIA).first()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            current = {field: getattr(self, field) for field in RATING_CRITERIA}
+            if previous is None:
+                RatingSummary.apply_delta(self.reviewed_user_id, current, count_delta=1)
+            elif previous['reviewed_user_id'] != self.reviewed_user_id:
+                # Review moved to another user: take it off the old summary, add it to the new one
+                RatingSummary.apply_delta(
+                    previous['reviewed_user_id'],
+                    {field: -previous[field] for field in RATING_CRITERIA},
+                    count_delta=-1
+                )
+                RatingSummary.apply_delta(self.reviewed_user_id, current, count_delta=1)
+            else:
+                RatingSummary.apply_delta(
+                    self.reviewed_user_id,
+                    {field: current[field] - previous[field] for field in RATING_CRITERIA},
+                    count_delta=0
+                )
+
     def __str__(self):
         return f"{self.reviewer.username} reviewed {self.reviewed_user.username} for proposal {self.proposal.id}"
 
 
+class RatingSummary(models.Model):
+    """Running review totals per reviewed user, maintained by Review.save and the post_delete signal"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='rating_summary')
+    review_count = models.PositiveIntegerField(default=0)
+    friendliness_total = models.PositiveIntegerField(default=0)
+    time_management_total = models.PositiveIntegerField(default=0)
+    reliability_total = models.PositiveIntegerField(default=0)
+    communication_total = models.PositiveIntegerField(default=0)
+    work_quality_total = models.PositiveIntegerField(default=0)
+    # Mean of the five criterion averages, kept in step with the totals so leaderboards can use an index
+    overall_rating = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-overall_rating', '-review_count']),
+        ]
+
+    @classmethod
+    def apply_delta(cls, user_id, deltas, count_delta):
+        """Atomically add per-criterion deltas (and a review count delta) to a user's summary"""
+        if not count_delta and not any(deltas.values()):
+            return
+        with transaction.atomic():
+            if count_delta > 0:
+                # Only new reviews create a summary row; removals never resurrect one
+                cls.objects.get_or_create(user_id=user_id)
+            updates = {f'{field}_total': F(f'{field}_total') + deltas[field] for field in RATING_CRITERIA}
+            updates['review_count'] = F('review_count') + count_delta
+            # Right-hand F() references see the pre-update row, so add the deltas here as well
+            new_grand_total = sum(
+                (F(f'{field}_total') for field in RATING_CRITERIA), Value(sum(deltas.values()))
+            )
+            updates['overall_rating'] = Case(
+                When(review_count__lte=-count_delta, then=Value(0.0)),
+                default=Cast(new_grand_total, FloatField()) / (
+                    (F('review_count') + count_delta) * len(RATING_CRITERIA)
+                ),
+                output_field=FloatField(),
+            )
+            updates['updated_at'] = timezone.now()
+            cls.objects.filter(user_id=user_id).update(**updates)
+
+    @staticmethod
+    def averages_for(summary):
+        """Build the review averages dict (same shape as before) from a summary row or None"""
+        total_reviews = summary.review_count if summary else 0
+
+        if total_reviews == 0:
+            return {
+                'friendliness': 0,
+                'time_management': 0,
+                'reliability': 0,
+                'communication': 0,
+                'work_quality': 0,
+                'overall': 0,
+                'total_reviews': 0,
+            }
+
+        averages = {
+            field: getattr(summary, f'{field}_total') / total_reviews
+            for field in RATING_CRITERIA
+        }
+        overall = sum(averages.values()) / len(RATING_CRITERIA)
+
+        result = {field: round(value, 2) for field, value in averages.items()}
+        result['overall'] = round(overall, 2)
+        result['total_reviews'] = total_reviews
+        return result
+
+    def __str__(self):
+        return f"Rating summary for {self.user.username} ({self.review_count} reviews)"
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_summary(sender, instance, **kwargs):
+    RatingSummary.apply_delta(
+        instance.reviewed_user_id,
+        {field: -getattr(instance, field) for field in RATING_CRITERIA},
+        count_delta=-1
+    )
+
+
+class PendingApprovalCount(models.Model):
+    """Proposals awaiting action per user (either party), maintained with every proposal status write"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='pending_approval_count')
+    count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Atomically add a signed delta to each user's count ({user_id: delta}); counts never drop below zero"""
+        by_delta = {}
+        for user_id, delta in deltas.items():
+            if delta:
+                by_delta.setdefault(delta, []).append(user_id)
+        with transaction.atomic(savepoint=False):
+            # One UPDATE per distinct delta (usually a single one for both parties)
+            for delta, user_ids in by_delta.items():
+                updated = cls.objects.filter(user_id__in=user_ids).update(count=Greatest(F('count') + delta, 0))
+                if updated < len(user_ids) and delta > 0:
+                    # First pending proposal of these users: their rows start at delta
+                    existing = set(cls.objects.filter(user_id__in=user_ids).values_list('user_id', flat=True))
+                    cls.objects.bulk_create(
+                        [cls(user_id=user_id, count=delta) for user_id in user_ids if user_id not in existing],
+                        ignore_conflicts=True
+                    )
+
+    def __str__(self):
+        return f"{self.user.username}: {self.count} pending proposals"
+
+
+@receiver(post_delete, sender=Proposal)
+def remove_proposal_from_pending_counts(sender, instance, **kwargs):
+    PendingApprovalCount.apply_deltas(
+        pending_deltas([(instance.requester_id, instance.provider_id, instance.status, None)])
+    )
+
+
 class Chat(models.Model):
     """1-on-1 Chat model between two users"""
     participant1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chats_as_p1')
@@ -461,11 +716,149 @@ class Message(models.Model):
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     content = models.TextField()
-    is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Read state lives in ChatReadState; is_read is derived from the recipient's read mark
+    _is_read = None
+    _is_read_dirty = False
+
     class Meta:
         ordering = ['created_at']  # Oldest first for display
+        indexes = [
+            models.Index(fields=['chat', 'created_at', 'id']),
+            models.Index(fields=['chat', 'id']),
+        ]
+
+    @property
+    def recipient_id(self):
+        """The chat participant who did not send this message"""
+        chat = self.chat
+        return chat.participant2_id if self.sender_id == chat.participant1_id else chat.participant1_id
+
+    @classmethod
+    def with_read_state(cls, queryset=None):
+        """
+        Annotate each message with its recipient's read mark, so is_read needs no
+        query per message when a list is serialized.
+        """
+        if queryset is None:
+            queryset = cls.objects.all()
+        # Only participants have read marks, and the recipient is the one who did not send the message
+        recipient_mark = ChatReadState.objects.filter(
+            chat_id=OuterRef('chat_id')
+        ).exclude(user_id=OuterRef('sender_id')).values('last_read_message_id')[:1]
+        return queryset.annotate(recipient_read_mark=Coalesce(Subquery(recipient_mark), 0))
+
+    @property
+    def is_read(self):
+        """True once the recipient's read mark has reached this message"""
+        if self._is_read is None:
+            if self.pk is None:
+                return False
+            if hasattr(self, 'recipient_read_mark'):
+                self._is_read = self.recipient_read_mark >= self.pk
+                return self._is_read
+            self._is_read = ChatReadState.objects.filter(
+                chat_id=self.chat_id,
+                user_id=self.recipient_id,
+                last_read_message_id__gte=self.pk
+            ).exists()
+        return self._is_read
+
+    @is_read.setter
+    def is_read(self, value):
+        self._is_read = bool(value)
+        self._is_read_dirty = True
+
+    def cache_read_state(self, is_read):
+        """Remember an already known read state without scheduling a read-mark update on save"""
+        self._is_read = is_read
+        self._is_read_dirty = False
+
+    def save(self, *args, **kwargs):
+        """Save the message; setting is_read=True advances the recipient's read mark up to it"""
+        super().save(*args, **kwargs)
+        if self._is_read_dirty and self._is_read:
+            ChatReadState.mark_read(self.chat_id, self.recipient_id, up_to_message_id=self.pk)
+        self._is_read_dirty = False
+
+    def __str__(self):
+        return f"Message from {self.sender.username} in chat {self.chat.id}"
+
+
+class ChatReadState(models.Model):
+    """
+    Per-participant read high-water mark for a chat.
+    Every message with id <= last_read_message_id counts as read for this user.
+    """
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_read_states')
+    last_read_message_id = models.BigIntegerField(default=0)
+    last_read_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        unique_together = ['chat', 'user']
+
+    @classmethod
+    def mark_read(cls, chat_id, user_id, up_to_message_id=None):
+        """
+        Move the user's read mark forward with a single upsert (never backwards).
+        Without up_to_message_id the mark moves to the newest message in the chat.
+        last_read_at is the time the mark last moved. Only a mark that moved
+        invalidates the user's notification summary, so polling an unchanged
+        chat keeps its ETag.
+
+        Returns:
+            The read mark stored after the upsert
+        """
+        quote = connection.ops.quote_name
+        table = quote(cls._meta.db_table)
+        greatest = 'GREATEST' if connection.vendor == 'postgresql' else 'MAX'
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        if up_to_message_id is None:
+            source = (
+                f"SELECT %s, %s, COALESCE(MAX({quote('id')}), 0), %s FROM {quote(Message._meta.db_table)} "
+                f"WHERE {quote('chat_id')} = %s"
+            )
+            params = [chat_id, user_id, now, chat_id]
+        else:
+            # "WHERE 1 = 1" keeps SQLite from reading ON CONFLICT as a join constraint
+            source = "SELECT %s, %s, %s, %s WHERE 1 = 1"
+            params = [chat_id, user_id, up_to_message_id, now]
+        sql = (
+            f"INSERT INTO {table} ({quote('chat_id')}, {quote('user_id')}, {quote('last_read_message_id')}, {quote('last_read_at')}) "
+            f"{source} "
+            f"ON CONFLICT ({quote('chat_id')}, {quote('user_id')}) DO UPDATE SET "
+            f"{quote('last_read_message_id')} = {greatest}({table}.{quote('last_read_message_id')}, excluded.{quote('last_read_message_id')}), "
+            f"{quote('last_read_at')} = excluded.{quote('last_read_at')} "
+            # Rows come back only when inserted or moved forward
+            f"WHERE {table}.{quote('last_read_message_id')} < excluded.{quote('last_read_message_id')} "
+            f"RETURNING {quote('last_read_message_id')}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return cls.objects.filter(chat_id=chat_id, user_id=user_id).values_list('last_read_message_id', flat=True)[0]
+
+        # Raw upsert sends no signals: invalidate the reader's notification summary here
+        from .services.notifications import bump_version
+        bump_version(user_id)
+        return row[0]
+
+    @classmethod
+    def unread_messages(cls, user, chats=None):
+        """
+        Messages the user has not read yet: newer than their read mark and sent by someone else.
+        Pass chats (a Chat queryset) to restrict the result to those chats.
+        """
+        read_mark = cls.objects.filter(chat=OuterRef('chat'), user=user).values('last_read_message_id')[:1]
+        messages = Message.objects.all()
+        if chats is not None:
+            messages = messages.filter(chat__in=chats)
+        return messages.filter(
+            id__gt=Coalesce(Subquery(read_mark), Value(0))
+        ).exclude(sender=user)
 
     def __str__(self):
-        return f"Message from {self.sender.username} in chat {self.chat.id}"
\ No newline at end of file
+        return f"{self.user.username} read chat {self.chat_id} up to message {self.last_read_message_id}"
@@ -0,0 +1,123 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def encode_cursor(created_at, pk):
+    """Encode a (created_at, id) position as an opaque URL-safe cursor string"""
+    payload = json.dumps([created_at.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor.
+
+    Returns:
+        (created_at, id) tuple, or None if the cursor is malformed
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at_raw, pk = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        created_at = parse_datetime(created_at_raw)
+        if created_at is None:
+            return None
+        return created_at, int(pk)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+def keyset_filter(position, before=True):
+    """Q filter selecting rows strictly before (or after) a (created_at, id) position"""
+    created_at, pk = position
+    if before:
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination with an opt-in keyset mode for lists ordered newest first.
+
+    ?pagination=cursor (or a before/after cursor) switches to keyset pages over
+    (created_at, id): no OFFSET scan, and rows inserted while a client pages
+    through the list never shift later pages. Cursors are opaque and the next /
+    previous links carry them. The total count is still returned unless
+    ?count=false is given. Lists in any other order (search rank, distance,
+    ?ordering=...) keep page numbers.
+    """
+    page_size_query_param = settings.REST_FRAMEWORK.get('PAGE_SIZE_QUERY_PARAM', 'page_size')
+    max_page_size = settings.REST_FRAMEWORK.get('MAX_PAGE_SIZE', 100)
+    mode_query_param = 'pagination'
+    keyset_orderings = (('-created_at',), ('-created_at', '-id'))
+
+    keyset = False
+
+    def wants_keyset(self, request):
+        params = request.query_params
+        return params.get(self.mode_query_param) == 'cursor' or 'before' in params or 'after' in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = False
+        ordering = queryset.query.order_by or (queryset.model._meta.ordering if queryset.query.default_ordering else ())
+        if not self.wants_keyset(request) or tuple(ordering) not in self.keyset_orderings:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        # Malformed cursors fall back to the first page, like the chat message cursors
+        before = decode_cursor(request.query_params.get('before'))
+        after = decode_cursor(request.query_params.get('after'))
+        self.count = queryset.count() if request.query_params.get('count', 'true').lower() != 'false' else None
+
+        if after is not None:
+            # Previous (newer) page: walk forward from the cursor, then flip back to newest first
+            rows = list(queryset.filter(keyset_filter(after, before=False)).order_by('created_at', 'id')[:page_size + 1])
+            self.has_previous = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+            self.has_next = True
+        else:
+            if before is not None:
+                queryset = queryset.filter(keyset_filter(before, before=True))
+            rows = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+            self.has_next = len(rows) > page_size
+            rows = rows[:page_size]
+            self.has_previous = before is not None
+        self.rows = rows
+        return rows
+
+    def _cursor_link(self, name, row):
+        other = 'after' if name == 'before' else 'before'
+        url = remove_query_param(remove_query_param(self.request.build_absolute_uri(), other), self.page_query_param)
+        url = replace_query_param(url, self.mode_query_param, 'cursor')
+        return replace_query_param(url, name, encode_cursor(row.created_at, row.pk))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.rows or not self.has_next:
+            return None
+        return self._cursor_link('before', self.rows[-1])
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.rows or not self.has_previous:
+            return None
+        return self._cursor_link('after', self.rows[0])
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        body = {'count': self.count} if self.count is not None else {}
+        body.update({'next': self.get_next_link(), 'previous': self.get_previous_link(), 'results': data})
+        return Response(body)
@@ -1,7 +1,31 @@
+import logging
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
-from .models import Profile, Tag, Post, Comment, Proposal, Review, Chat, Message, ForumTopic, ForumComment, Job
+from .models import Profile, Tag, Post, Comment, Proposal, Review, Chat, ChatReadState, Message, ForumTopic, ForumComment, Job
+from .services.images import image_url
+from .services import ledger
+from .services.tags import get_or_create_wikidata_tags, resolve_tags
+
+logger = logging.getLogger(__name__)
+
+
+class ImageURLField(serializers.CharField):
+    """
+    Image/avatar column: blob store paths are returned as absolute URLs.
+    `variant` picks a rendition (e.g. 'thumb'); views may override it per request
+    with a '<field_name>_variant' context entry (None for the original).
+    """
+    
+    def __init__(self, *, variant=None, **kwargs):
+        self.variant = variant
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        variant = self.context.get(f'{self.field_name}_variant', self.variant)
+        return image_url(super().to_representation(value), self.context.get('request'), variant)
+
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -22,6 +46,7 @@ class TagSearchSerializer(serializers.Serializer):
 
 # Simple profile serializer to get only avatar
 class ProfileSerializer(serializers.ModelSerializer):
+    avatar = ImageURLField(required=False, allow_blank=True, allow_null=True)
     review_averages = serializers.SerializerMethodField()
     
     def get_review_averages(self, obj):
@@ -78,7 +103,7 @@ class UserSerializer(serializers.ModelSerializer):
         return {
             'time_balance': obj.profile.time_balance,
             'review_averages': review_averages,
-            'avatar': obj.profile.avatar,
+            'avatar': image_url(obj.profile.avatar, request),
             'bio': obj.profile.bio if hasattr(obj.profile, 'bio') else None,
             'phone': obj.profile.phone if hasattr(obj.profile, 'phone') else None,
             'location': obj.profile.location if hasattr(obj.profile, 'location') else None,
@@ -149,9 +174,6 @@ class RegisterSerializer(serializers.ModelSerializer):
             last_name=last_name
         )
         
-        # ❗ STARTING BONUS
-        user.profile.time_balance = 3.0  # 3 hour bonus
-        
         # Set location, bio, and birth_date if provided
         if location:
             user.profile.location = location
@@ -161,56 +183,7 @@ class RegisterSerializer(serializers.ModelSerializer):
             user.profile.birth_date = birth_date
         
         # Process interested_tags: can be list of IDs or list of tag objects with name/text
-        tag_objects = []
-        if interested_tags_data:
-            for tag_data in interested_tags_data:
-                if isinstance(tag_data, dict):
-                    # If it's a dict with 'id', get existing tag
-                    if 'id' in tag_data:
-                        try:
-                            tag = Tag.objects.get(id=tag_data['id'])
-                            tag_objects.append(tag)
-                        except Tag.DoesNotExist:
-                            continue
-                    # If it's a dict with 'name' or string, create new custom tag
-                    elif 'name' in tag_data or isinstance(tag_data.get('value'), str):
-                        tag_name = tag_data.get('name') or tag_data.get('value', '').strip()
-                        if tag_name:
-                            tag, created = Tag.objects.get_or_create(
-                                name=tag_name,
-                                defaults={
-                                    'description': tag_data.get('description', ''),
-                                    'wikidata_id': tag_data.get('wikidata_id'),
-                                    'is_custom': True,
-                                    'label': tag_data.get('label', tag_name)
-                                }
-                            )
-                            tag_objects.append(tag)
-                    # If it's just a string
-                    elif 'value' in tag_data:
-                        tag_name = str(tag_data['value']).strip()
-                        if tag_name:
-                            tag, created = Tag.objects.get_or_create(
-                                name=tag_name,
-                                defaults={'is_custom': True}
-                            )
-                            tag_objects.append(tag)
-                # If it's just an integer (tag ID)
-                elif isinstance(tag_data, int):
-                    try:
-                        tag = Tag.objects.get(id=tag_data)
-                        tag_objects.append(tag)
-                    except Tag.DoesNotExist:
-                        continue
-                # If it's a string (tag name)
-                elif isinstance(tag_data, str):
-                    tag_name = tag_data.strip()
-                    if tag_name:
-                        tag, created = Tag.objects.get_or_create(
-                            name=tag_name,
-                            defaults={'is_custom': True}
-                        )
-                        tag_objects.append(tag)
+        tag_objects = resolve_tags(interested_tags_data)
         
         # Add interested_tags to profile
         if tag_objects:
@@ -218,6 +191,9 @@ class RegisterSerializer(serializers.ModelSerializer):
         
         user.profile.save()
         
+        # ❗ STARTING BONUS (3 hours), journaled like every other balance change
+        user.profile.time_balance = ledger.credit(user.id, ledger.SIGNUP_BONUS, 'signup_bonus')
+        
         return user
 
 # Main Post Serializer
@@ -228,7 +204,7 @@ class PostSerializer(serializers.ModelSerializer):
     # by deriving them from the 'posted_by' (User) object.
     postedBy = serializers.CharField(source='posted_by.username', read_only=True)
     posted_by_id = serializers.IntegerField(source='posted_by.id', read_only=True)
-    avatar = serializers.URLField(source='posted_by.profile.avatar', read_only=True)
+    avatar = ImageURLField(source='posted_by.profile.avatar', read_only=True, variant='avatar')
     
     # 'tags' field: Takes ID list or tag objects for write, returns name list for read
     # We will use SerializerMethodField for read
@@ -253,63 +229,24 @@ class PostSerializer(serializers.ModelSerializer):
         return []
     
     def _process_tags(self, tags_data):
-        """Helper method to process tags from various formats"""
-        tag_objects = []
-        if not tags_data:
-            return tag_objects
-            
-        for tag_item in tags_data:
-            if isinstance(tag_item, dict):
-                # If it's a dict with 'id', get existing tag
-                if 'id' in tag_item:
-                    try:
-                        tag = Tag.objects.get(id=tag_item['id'])
-                        tag_objects.append(tag)
-                    except Tag.DoesNotExist:
-                        continue
-                # If it's a dict with 'name' or string, create new custom tag
-                elif 'name' in tag_item or isinstance(tag_item.get('value'), str):
-                    tag_name = tag_item.get('name') or tag_item.get('value', '').strip()
-                    if tag_name:
-                        tag, created = Tag.objects.get_or_create(
-                            name=tag_name,
-                            defaults={
-                                'description': tag_item.get('description', ''),
-                                'wikidata_id': tag_item.get('wikidata_id'),
-                                'is_custom': True,
-                                'label': tag_item.get('label', tag_name)
-                            }
-                        )
-                        tag_objects.append(tag)
-                # If it's just a string
-                elif 'value' in tag_item:
-                    tag_name = str(tag_item['value']).strip()
-                    if tag_name:
-                        tag, created = Tag.objects.get_or_create(
-                            name=tag_name,
-                            defaults={'is_custom': True}
-                        )
-                        tag_objects.append(tag)
-            # If it's just an integer (tag ID)
-            elif isinstance(tag_item, int):
-                try:
-                    tag = Tag.objects.get(id=tag_item)
-                    tag_objects.append(tag)
-                except Tag.DoesNotExist:
-                    continue
-            # If it's a string (tag name)
-            elif isinstance(tag_item, str):
-                tag_name = tag_item.strip()
-                if tag_name:
-                    tag, created = Tag.objects.get_or_create(
-                        name=tag_name,
-                        defaults={'is_custom': True}
-                    )
-                    tag_objects.append(tag)
-        return tag_objects
+        """Helper method to process tags from various formats (resolved in bulk, input order kept)"""
+        return resolve_tags(tags_data)
     
     postedDate = serializers.DateTimeField(source='created_at', read_only=True)
-    image = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    distance_km = serializers.SerializerMethodField()
+    
+    def get_distance_km(self, obj):
+        """Distance from the ?near= point, only present on radius searches"""
+        distance = getattr(obj, 'distance_km', None)
+        return round(distance, 3) if distance is not None else None
+    
+    search_rank = serializers.FloatField(read_only=True, required=False)
+    search_snippet = serializers.SerializerMethodField()
+    
+    def get_search_snippet(self, obj):
+        """Highlighted match from the ?q= full-text search (HTML-escaped, matches in <mark>)"""
+        return getattr(obj, 'search_snippet', None)
+    image = ImageURLField(required=False, allow_blank=True, allow_null=True, variant='thumb')
     
     def create(self, validated_data):
         """Manually process tags in create operation"""
@@ -355,6 +292,9 @@ class PostSerializer(serializers.ModelSerializer):
             'posted_by_id',
             'avatar',
             'postedDate',
+            'distance_km',
+            'search_rank',
+            'search_snippet',
         ]
 
 
@@ -369,7 +309,7 @@ class CommentSerializer(serializers.ModelSerializer):
     def get_avatar(self, obj):
         """Get user's avatar from profile"""
         if hasattr(obj.user, 'profile') and obj.user.profile.avatar:
-            return obj.user.profile.avatar
+            return image_url(obj.user.profile.avatar, self.context.get('request'), 'avatar')
         return None
 
     class Meta:
@@ -405,7 +345,7 @@ class ProposalSerializer(serializers.ModelSerializer):
         # Profile is already loaded via select_related('requester__profile')
         # Direct field access is faster than property call
         try:
-            avatar = obj.requester.profile.avatar
+            avatar = image_url(obj.requester.profile.avatar, self.context.get('request'), 'avatar')
             return avatar if avatar else "https://placehold.co/100x100/EBF8FF/3B82F6?text=User"
         except AttributeError:
             return "https://placehold.co/100x100/EBF8FF/3B82F6?text=User"
@@ -415,7 +355,7 @@ class ProposalSerializer(serializers.ModelSerializer):
         # Profile is already loaded via select_related('provider__profile')
         # Direct field access is faster than property call
         try:
-            avatar = obj.provider.profile.avatar
+            avatar = image_url(obj.provider.profile.avatar, self.context.get('request'), 'avatar')
             return avatar if avatar else "https://placehold.co/100x100/EBF8FF/3B82F6?text=User"
         except AttributeError:
             return "https://placehold.co/100x100/EBF8FF/3B82F6?text=User"
@@ -472,7 +412,7 @@ class ProposalSerializer(serializers.ModelSerializer):
         
         # Only include image if not excluded (saves significant bandwidth)
         if not exclude_images:
-            post_details['image'] = post.image
+            post_details['image'] = image_url(post.image, self.context.get('request'), self.context.get('image_variant', 'thumb'))
         
         return post_details
     
@@ -696,6 +636,8 @@ class ReviewSerializer(serializers.ModelSerializer):
 class MessageSerializer(serializers.ModelSerializer):
     sender_id = serializers.IntegerField(source='sender.id', read_only=True)
     sender_username = serializers.CharField(source='sender.username', read_only=True)
+    # Derived from the recipient's ChatReadState read mark
+    is_read = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Message
@@ -743,19 +685,31 @@ class ChatListSerializer(serializers.ModelSerializer):
         current_user = request.user
         other_user = obj.participant2 if obj.participant1 == current_user else obj.participant1
         if hasattr(other_user, 'profile') and other_user.profile.avatar:
-            return other_user.profile.avatar
+            return image_url(other_user.profile.avatar, request, 'avatar')
         return None
 
     def get_last_message(self, obj):
         """Get the last message in this chat"""
-        last_msg = obj.messages.last()  # Get last message due to ordering
-        if last_msg:
-            return {
-                'content': last_msg.content[:50] + '...' if len(last_msg.content) > 50 else last_msg.content,
-                'created_at': last_msg.created_at,
-                'sender_username': last_msg.sender.username,
-            }
-        return None
+        # Use inbox annotations from ChatViewSet if available
+        if hasattr(obj, 'last_message_created_at'):
+            if obj.last_message_created_at is None:
+                return None
+            content = obj.last_message_content or ''
+            sender_username = obj.last_message_sender_username
+            created_at = obj.last_message_created_at
+        else:
+            last_msg = obj.messages.select_related('sender').last()  # Get last message due to ordering
+            if not last_msg:
+                return None
+            content = last_msg.content
+            sender_username = last_msg.sender.username
+            created_at = last_msg.created_at
+        
+        return {
+            'content': content[:50] + '...' if len(content) > 50 else content,
+            'created_at': created_at,
+            'sender_username': sender_username,
+        }
 
     def get_post_id(self, obj):
         """Get post ID if post exists"""
@@ -775,12 +729,12 @@ class ChatListSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return 0
         
-        current_user = request.user
-        # Count unread messages where sender is NOT the current user
-        unread_count = obj.messages.filter(
-            is_read=False
-        ).exclude(sender=current_user).count()
-        return unread_count
+        # Use inbox annotation from ChatViewSet if available
+        if hasattr(obj, 'unread_message_count'):
+            return obj.unread_message_count
+        
+        # Count messages above the current user's read mark, sent by the other participant
+        return ChatReadState.unread_messages(request.user).filter(chat=obj).count()
 
     class Meta:
         model = Chat
@@ -850,6 +804,7 @@ class ForumTopicSerializer(serializers.ModelSerializer):
     )
     comments = ForumCommentSerializer(many=True, read_only=True)
     comments_count = serializers.SerializerMethodField()
+    image = ImageURLField(required=False, allow_blank=True, allow_null=True)
     
     class Meta:
         model = ForumTopic
@@ -859,7 +814,7 @@ class ForumTopicSerializer(serializers.ModelSerializer):
     def get_author(self, obj):
         avatar = None
         if hasattr(obj.author, 'profile') and obj.author.profile.avatar:
-            avatar = obj.author.profile.avatar
+            avatar = image_url(obj.author.profile.avatar, self.context.get('request'), 'avatar')
         return {
             'id': obj.author.id,
             'username': obj.author.username,
@@ -894,38 +849,13 @@ class ForumTopicSerializer(serializers.ModelSerializer):
                 all_tags.extend(tags_by_id)
                 print(f"[ForumTopicSerializer] Found {tags_by_id.count()} tags by ID: {list(tags_by_id.values_list('id', 'name'))}")
         
-        # Add tags by wikidata_id (find existing or create them)
+        # Add tags by wikidata_id: existing ones in one query, missing ones fetched in batches and bulk-created
         if wikidata_ids and len(wikidata_ids) > 0:
-            from .services.wikidata import get_wikidata_entity
-            
-            # Try to find existing tags with these wikidata_ids
-            tags_by_wikidata = Tag.objects.filter(wikidata_id__in=wikidata_ids)
-            found_wikidata_ids = set(tags_by_wikidata.values_list('wikidata_id', flat=True))
-            all_tags.extend(tags_by_wikidata)
-            
-            # For wikidata_ids not found, create them from Wikidata
-            missing_wikidata_ids = [wid for wid in wikidata_ids if wid not in found_wikidata_ids]
-            if missing_wikidata_ids:
-                print(f"[ForumTopicSerializer] Creating {len(missing_wikidata_ids)} tags from Wikidata: {missing_wikidata_ids}")
-                for wikidata_id in missing_wikidata_ids:
-                    try:
-                        # Try to get entity details from Wikidata
-                        entity_data = get_wikidata_entity(wikidata_id)
-                        if entity_data:
-                            # Create tag
-                            tag = Tag.objects.create(
-                                name=entity_data.get('label', wikidata_id),
-                                label=entity_data.get('label', wikidata_id),
-                                description=entity_data.get('description', ''),
-                                wikidata_id=wikidata_id,
-                                is_custom=False
-                            )
-                            all_tags.append(tag)
-                            print(f"[ForumTopicSerializer] Created tag: {tag.name} (ID: {tag.id})")
-                        else:
-                            print(f"[ForumTopicSerializer] Could not fetch entity data for {wikidata_id}")
-                    except Exception as e:
-                        print(f"[ForumTopicSerializer] Error creating tag for {wikidata_id}: {e}")
+            tags_by_wikidata = get_or_create_wikidata_tags(wikidata_ids)
+            all_tags.extend(tags_by_wikidata.values())
+            not_found = [wid for wid in wikidata_ids if wid not in tags_by_wikidata]
+            if not_found:
+                logger.warning(f"Could not create tags for Wikidata ids {not_found} on forum topic {topic.id}")
         
         # Set all tags
         if all_tags:
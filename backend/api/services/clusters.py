@@ -0,0 +1,257 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models import Count, F, FloatField, IntegerField, Q, Sum, Value
+from django.db.models.functions import Cast, Floor, Least
+
+# Precomputed aggregation levels. At zoom z the world is 4 * 2^z cells wide (about four
+# clusters per 256px map tile) and half as many cells tall, so cells are square in degrees.
+MAX_CLUSTER_ZOOM = 12
+CELLS_PER_TILE = 4
+# Viewports covering more cells than this are answered at a coarser zoom
+MAX_VISIBLE_CELLS = 2500
+CLUSTER_CACHE_ALIAS = 'clusters'
+# The cluster cache is per process and writes only invalidate the writer's own copy, so
+# other workers may serve counts this many seconds old (acceptable for map markers)
+CLUSTER_CACHE_TIMEOUT = 30
+
+# (latitude, longitude, post_type, is_hidden) of a post as stored
+ClusterState = Tuple[Optional[float], Optional[float], str, bool]
+
+
+def cell_degrees(zoom: int) -> float:
+    return 360.0 / (CELLS_PER_TILE * 2 ** zoom)
+
+
+def grid_size(zoom: int) -> Tuple[int, int]:
+    """(rows, columns) of the grid at a zoom level"""
+    columns = CELLS_PER_TILE * 2 ** zoom
+    return columns // 2, columns
+
+
+def _row(lat: float, zoom: int) -> int:
+    rows, _ = grid_size(zoom)
+    return min(rows - 1, max(0, int(math.floor((lat + 90) / cell_degrees(zoom)))))
+
+
+def _column(lon: float, zoom: int) -> int:
+    _, columns = grid_size(zoom)
+    return min(columns - 1, max(0, int(math.floor((lon + 180) / cell_degrees(zoom)))))
+
+
+def cluster_cell(lat: float, lon: float, zoom: int) -> int:
+    return _row(lat, zoom) * grid_size(zoom)[1] + _column(lon, zoom)
+
+
+def cell_bounds(cell: int, zoom: int) -> List[float]:
+    """[min_lat, min_lon, max_lat, max_lon] of a cell"""
+    _, columns = grid_size(zoom)
+    size = cell_degrees(zoom)
+    row, column = divmod(cell, columns)
+    return [row * size - 90, column * size - 180, (row + 1) * size - 90, (column + 1) * size - 180]
+
+
+def visible_cells(min_lat: float, max_lat: float, min_lon: float, max_lon: float, zoom: int) -> List[int]:
+    """
+    Cells intersecting a bounding box. A box with min_lon > max_lon wraps the antimeridian.
+    """
+    first_row, last_row = _row(min_lat, zoom), _row(max_lat, zoom)
+    _, columns = grid_size(zoom)
+    if min_lon <= max_lon:
+        column_ids = range(_column(min_lon, zoom), _column(max_lon, zoom) + 1)
+    else:
+        column_ids = list(range(_column(min_lon, zoom), columns)) + list(range(0, _column(max_lon, zoom) + 1))
+    return [row * columns + column for row in range(first_row, last_row + 1) for column in column_ids]
+
+
+def fit_zoom(min_lat: float, max_lat: float, min_lon: float, max_lon: float, zoom: int) -> int:
+    """Clamp zoom to the precomputed range and coarsen it until the viewport fits MAX_VISIBLE_CELLS"""
+    zoom = min(max(zoom, 0), MAX_CLUSTER_ZOOM)
+    lon_span = max_lon - min_lon if min_lon <= max_lon else 360 - (min_lon - max_lon)
+    while zoom > 0:
+        size = cell_degrees(zoom)
+        estimate = (math.floor((max_lat - min_lat) / size) + 2) * (math.floor(lon_span / size) + 2)
+        if estimate <= MAX_VISIBLE_CELLS:
+            break
+        zoom -= 1
+    return zoom
+
+
+def _cache_key(zoom: int, cell: int) -> str:
+    return f'post_cluster_{zoom}_{cell}'
+
+
+def get_cache():
+    return caches[CLUSTER_CACHE_ALIAS]
+
+
+def _contribution(state: Optional[ClusterState]) -> Optional[Tuple[float, float, str]]:
+    """What a post adds to the aggregates: visible posts with coordinates only"""
+    if state is None:
+        return None
+    lat, lon, post_type, is_hidden = state
+    if lat is None or lon is None or is_hidden:
+        return None
+    return lat, lon, post_type
+
+
+def update_post_clusters(previous: Optional[ClusterState], current: Optional[ClusterState]):
+    """
+    Move a post's contribution in the cluster aggregates from its previous to its current state.
+
+    All zoom levels are adjusted with one multi-row upsert of deltas; cells that
+    drop to zero posts are deleted. Cached cells are invalidated after commit.
+
+    Args:
+        previous: State before the write (None for a new post)
+        current: State after the write (None for a deleted post)
+    """
+    from ..models import PostGridCell
+
+    old, new = _contribution(previous), _contribution(current)
+    if old == new:
+        return
+
+    deltas: Dict[Tuple[int, int], List[float]] = defaultdict(lambda: [0, 0, 0, 0.0, 0.0])
+    for contribution, sign in ((old, -1), (new, 1)):
+        if contribution is None:
+            continue
+        lat, lon, post_type = contribution
+        for zoom in range(MAX_CLUSTER_ZOOM + 1):
+            delta = deltas[(zoom, cluster_cell(lat, lon, zoom))]
+            delta[0] += sign
+            delta[1] += sign if post_type == 'offer' else 0
+            delta[2] += sign if post_type == 'need' else 0
+            delta[3] += sign * lat
+            delta[4] += sign * lon
+
+    table = connection.ops.quote_name(PostGridCell._meta.db_table)
+    rows = [(zoom, cell, *delta) for (zoom, cell), delta in deltas.items()]
+    placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s)'] * len(rows))
+    sql = (
+        f"INSERT INTO {table} (zoom, cell, post_count, offer_count, need_count, latitude_sum, longitude_sum) "
+        f"VALUES {placeholders} "
+        "ON CONFLICT (zoom, cell) DO UPDATE SET "
+        f"post_count = {table}.post_count + excluded.post_count, "
+        f"offer_count = {table}.offer_count + excluded.offer_count, "
+        f"need_count = {table}.need_count + excluded.need_count, "
+        f"latitude_sum = {table}.latitude_sum + excluded.latitude_sum, "
+        f"longitude_sum = {table}.longitude_sum + excluded.longitude_sum"
+    )
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [value for row in rows for value in row])
+        if old is not None:
+            emptied = Q()
+            for zoom, cell in deltas:
+                emptied |= Q(zoom=zoom, cell=cell)
+            PostGridCell.objects.filter(emptied, post_count__lte=0).delete()
+
+    keys = [_cache_key(zoom, cell) for zoom, cell in deltas]
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def get_clusters(min_lat: float, max_lat: float, min_lon: float, max_lon: float, zoom: int) -> dict:
+    """
+    Aggregated post clusters for a viewport.
+
+    Cells are read from the per-(zoom, cell) cache; misses are loaded from the
+    PostGridCell table in one query and cached, including empty cells.
+
+    Args:
+        min_lat, max_lat, min_lon, max_lon: Viewport in degrees
+        zoom: Requested map zoom (clamped to what the viewport allows)
+
+    Returns:
+        Dict with the zoom used, the cell size and the non-empty clusters
+    """
+    from ..models import PostGridCell
+
+    zoom = fit_zoom(min_lat, max_lat, min_lon, max_lon, zoom)
+    cells = visible_cells(min_lat, max_lat, min_lon, max_lon, zoom)
+    cache = get_cache()
+    cached = cache.get_many([_cache_key(zoom, cell) for cell in cells])
+
+    clusters = {}
+    missing = []
+    for cell in cells:
+        value = cached.get(_cache_key(zoom, cell))
+        if value is None:
+            missing.append(cell)
+        elif value:
+            clusters[cell] = value
+
+    if missing:
+        loaded = {}
+        for row in PostGridCell.objects.filter(zoom=zoom, cell__in=missing, post_count__gt=0):
+            loaded[row.cell] = {
+                'cell': row.cell,
+                'count': row.post_count,
+                'offer_count': row.offer_count,
+                'need_count': row.need_count,
+                'latitude': row.latitude_sum / row.post_count,
+                'longitude': row.longitude_sum / row.post_count,
+                'bounds': cell_bounds(row.cell, zoom),
+            }
+        clusters.update(loaded)
+        # Empty cells are cached as 0 so they are not looked up again
+        cache.set_many(
+            {_cache_key(zoom, cell): loaded.get(cell, 0) for cell in missing},
+            CLUSTER_CACHE_TIMEOUT
+        )
+
+    return {
+        'zoom': zoom,
+        'cell_degrees': cell_degrees(zoom),
+        'clusters': [clusters[cell] for cell in cells if cell in clusters],
+    }
+
+
+def rebuild_post_clusters(post_model=None, cell_model=None, batch_size: int = 1000) -> int:
+    """
+    Recompute every cluster aggregate from the Post table with one grouped query per zoom level.
+
+    Model classes can be passed in so data migrations can run this against historical models.
+
+    Args:
+        post_model: Post model class (defaults to api.models.Post)
+        cell_model: PostGridCell model class (defaults to api.models.PostGridCell)
+        batch_size: Rows per bulk insert batch
+
+    Returns:
+        Number of cluster cells written
+    """
+    if post_model is None or cell_model is None:
+        from ..models import Post, PostGridCell
+        post_model = post_model or Post
+        cell_model = cell_model or PostGridCell
+
+    visible = post_model.objects.filter(is_hidden=False, latitude__isnull=False, longitude__isnull=False)
+    with transaction.atomic():
+        cell_model.objects.all().delete()
+        for zoom in range(MAX_CLUSTER_ZOOM + 1):
+            rows, columns = grid_size(zoom)
+            size = cell_degrees(zoom)
+            # Same cell arithmetic as cluster_cell(), clamped at the +90/+180 edges
+            cell = (
+                Least(Cast(Floor((F('latitude') + 90) / size), IntegerField()), Value(rows - 1)) * columns
+                + Least(Cast(Floor((F('longitude') + 180) / size), IntegerField()), Value(columns - 1))
+            )
+            aggregates = visible.annotate(cluster_cell=cell).values('cluster_cell').annotate(
+                post_count=Count('id'),
+                offer_count=Count('id', filter=Q(post_type='offer')),
+                need_count=Count('id', filter=Q(post_type='need')),
+                latitude_sum=Sum(Cast('latitude', FloatField())),
+                longitude_sum=Sum(Cast('longitude', FloatField())),
+            ).order_by()
+            cell_model.objects.bulk_create(
+                (cell_model(zoom=zoom, cell=row.pop('cluster_cell'), **row) for row in aggregates.iterator()),
+                batch_size=batch_size
+            )
+        written = cell_model.objects.count()
+
+    transaction.on_commit(get_cache().clear)
+    return written
@@ -0,0 +1,177 @@
+import asyncio
+import itertools
+import json
+import logging
+import select
+import threading
+from typing import Dict, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class EventSubscription:
+    """A single stream's inbox of events for one user, bound to the subscriber's event loop"""
+
+    def __init__(self, broker, user_id: int):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, event: Dict):
+        """Thread-safe hand-off of an event into this subscription's queue"""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event: Dict):
+        if self.queue.full():
+            # Slow consumer: drop the oldest event rather than block publishers
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout: float) -> Optional[Dict]:
+        """Wait for the next event, or return None after timeout seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InMemoryEventBroker:
+    """
+    In-process broker: events only reach streams served by the same process.
+    Only for tests, development and single-process deployments; with several
+    workers (the Docker image runs four) use PostgresEventBroker, the default
+    on PostgreSQL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, user_id: int) -> EventSubscription:
+        """Open a subscription for user_id; must be called from the stream's event loop"""
+        subscription = EventSubscription(self, user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id: int, event_type: str, data: Dict):
+        """Send an event to every open stream of user_id"""
+        self.dispatch(user_id, {'id': next(self._ids), 'type': event_type, 'data': data})
+
+    def dispatch(self, user_id: int, event: Dict):
+        """Fan an already built event out to this process's subscribers"""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+
+class PostgresEventBroker(InMemoryEventBroker):
+    """
+    Cross-process broker on PostgreSQL LISTEN/NOTIFY.
+
+    publish() sends NOTIFY through Django's connection; each process runs one
+    background listener thread (started on first subscribe) that receives
+    notifications and fans them out to its local subscribers.
+    """
+
+    channel = 'the_hive_events'
+
+    def __init__(self):
+        super().__init__()
+        self._listener = None
+
+    def subscribe(self, user_id: int) -> EventSubscription:
+        self._ensure_listener()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id: int, event_type: str, data: Dict):
+        payload = json.dumps({'user_id': user_id, 'type': event_type, 'data': data}, default=str)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, payload])
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name='event-broker-listener', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        try:
+            self._listen_forever()
+        except Exception as e:
+            # The next subscribe() starts a fresh listener thread
+            logger.error(f"Event broker listener stopped: {e}")
+
+    def _listen_forever(self):
+        import psycopg2
+
+        db = settings.DATABASES['default']
+        conn = psycopg2.connect(
+            dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'], host=db['HOST'], port=db['PORT']
+        )
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cursor:
+            cursor.execute(f'LISTEN {self.channel}')
+        logger.info("Event broker listening on PostgreSQL channel %s", self.channel)
+
+        while True:
+            if select.select([conn], [], [], 30) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                try:
+                    message = json.loads(notify.payload)
+                except ValueError:
+                    logger.error(f"Invalid event payload on {self.channel}: {notify.payload[:200]}")
+                    continue
+                event = {'id': next(self._ids), 'type': message['type'], 'data': message['data']}
+                self.dispatch(message['user_id'], event)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker configured by settings.EVENT_BROKER"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_path = getattr(settings, 'EVENT_BROKER', 'api.services.events.InMemoryEventBroker')
+                _broker = import_string(broker_path)()
+    return _broker
+
+
+def publish_event(user_id: int, event_type: str, data: Dict):
+    """Publish an event for user_id once the current transaction commits"""
+    transaction.on_commit(lambda: _safe_publish(user_id, event_type, data))
+
+
+def _safe_publish(user_id: int, event_type: str, data: Dict):
+    try:
+        get_broker().publish(user_id, event_type, data)
+    except Exception as e:
+        # Realtime delivery is best effort; never fail the write that triggered it
+        logger.error(f"Error publishing {event_type} event for user {user_id}: {e}")
@@ -0,0 +1,92 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .transitions import PAID_POST_TYPES, TRANSITIONS, apply_bulk
+
+# Waiting proposals without a proposed date expire this long after they were sent
+PROPOSAL_TTL_DAYS = 30
+# Days after a job's date left to both parties to approve it before it is cancelled and refunded
+JOB_GRACE_DAYS = 7
+BATCH_SIZE = 100
+
+
+def _batches(queryset, field: str, batch_size: int, value_field: str = 'pk') -> Iterator[List]:
+    """
+    Yield value_field of queryset rows in (field, id) order, batch_size at a time.
+
+    Each batch is an indexed range read after the last row of the previous
+    batch (keyset), so rows a batch left alone are never read again.
+    """
+    position = None
+    while True:
+        page = queryset
+        if position is not None:
+            value, pk = position
+            page = page.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}))
+        rows = list(page.order_by(field, 'pk').values_list(field, 'pk', value_field)[:batch_size])
+        if not rows:
+            return
+        position = rows[-1][:2]
+        yield [row[2] for row in rows]
+
+
+def sweep(today: Optional[date] = None, batch_size: int = BATCH_SIZE) -> Dict:
+    """
+    Close what can no longer happen: expired waiting proposals and overdue waiting jobs.
+
+    - Waiting proposals whose proposed date has passed, or undated ones sent
+      more than PROPOSAL_TTL_DAYS ago, are cancelled (nothing was charged yet).
+    - Waiting jobs dated more than JOB_GRACE_DAYS ago are cancelled through
+      the proposal 'cancel' transition, which refunds the payer in the same
+      transaction, exactly like a cancellation by a user.
+
+    Every batch is its own transaction, so an interrupted sweep keeps the
+    batches already done and the next run continues with the rest.
+
+    Args:
+        today: Reference date (default: the current local date)
+        batch_size: Proposals changed per transaction
+
+    Returns:
+        Dictionary with 'expired_proposals', 'overdue_jobs', 'refunded_hours',
+        'batches', 'seconds' and 'per_second' (proposals and jobs closed)
+    """
+    from ..models import Job, Proposal
+
+    today = today or timezone.localdate()
+    start = time.perf_counter()
+    report = {'expired_proposals': 0, 'overdue_jobs': 0, 'refunded_hours': Decimal('0.00'), 'batches': 0}
+
+    waiting = Proposal.objects.filter(status='waiting')
+    expired = [
+        (waiting.filter(proposed_date__lt=today), 'proposed_date'),
+        (
+            waiting.filter(proposed_date__isnull=True,
+                           created_at__lt=timezone.now() - timedelta(days=PROPOSAL_TTL_DAYS)),
+            'created_at',
+        ),
+    ]
+    for queryset, field in expired:
+        for pks in _batches(queryset, field, batch_size):
+            report['expired_proposals'] += len(apply_bulk(TRANSITIONS['expire'], Q(pk__in=pks)))
+            report['batches'] += 1
+
+    overdue = Job.objects.filter(status='waiting', date__lt=today - timedelta(days=JOB_GRACE_DAYS))
+    for proposal_ids in _batches(overdue, 'date', batch_size, value_field='proposal_id'):
+        cancelled = apply_bulk(TRANSITIONS['cancel'], Q(pk__in=proposal_ids))
+        report['overdue_jobs'] += len(cancelled)
+        report['refunded_hours'] += sum(
+            (proposal.timebank_hour for proposal in cancelled if proposal.post.post_type in PAID_POST_TYPES),
+            Decimal('0.00')
+        )
+        report['batches'] += 1
+
+    report['seconds'] = round(time.perf_counter() - start, 3)
+    closed = report['expired_proposals'] + report['overdue_jobs']
+    report['per_second'] = round(closed / report['seconds'], 1) if report['seconds'] else 0.0
+    return report
@@ -0,0 +1,139 @@
+import math
+from typing import List, Optional, Tuple
+
+from django.db.models import F, Q, Value
+from django.db.models.functions import ASin, Cos, Least, Power, Radians, Sin, Sqrt
+
+# Fixed lat/lon grid: cell = row * GRID_COLUMNS + column, cells are GRID_CELL_DEGREES wide (~11 km)
+GRID_CELL_DEGREES = 0.1
+GRID_ROWS = int(round(180 / GRID_CELL_DEGREES))
+GRID_COLUMNS = int(round(360 / GRID_CELL_DEGREES))
+# Beyond this many grid rows a bbox is answered with plain lat/lon filters instead of cell ranges
+MAX_GRID_ROWS = 50
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+DEFAULT_RADIUS_KM = 10.0
+MAX_RADIUS_KM = 500.0
+
+
+def _row(lat: float) -> int:
+    return min(GRID_ROWS - 1, max(0, int(math.floor((lat + 90) / GRID_CELL_DEGREES))))
+
+
+def _column(lon: float) -> int:
+    return min(GRID_COLUMNS - 1, max(0, int(math.floor((lon + 180) / GRID_CELL_DEGREES))))
+
+
+def grid_cell(lat: Optional[float], lon: Optional[float]) -> Optional[int]:
+    """
+    Grid cell containing a coordinate.
+
+    Args:
+        lat: Latitude in degrees
+        lon: Longitude in degrees
+
+    Returns:
+        Integer cell id, or None if either coordinate is missing
+    """
+    if lat is None or lon is None:
+        return None
+    return _row(lat) * GRID_COLUMNS + _column(lon)
+
+
+def cell_ranges(min_lat: float, max_lat: float, min_lon: float, max_lon: float) -> Optional[List[Tuple[int, int]]]:
+    """
+    Contiguous cell id ranges covering a bounding box, one per grid row.
+    Rows that span every column merge into a single range.
+
+    Returns:
+        List of (first_cell, last_cell), or None if the box covers too many rows
+    """
+    first_row, last_row = _row(min_lat), _row(max_lat)
+    if last_row - first_row + 1 > MAX_GRID_ROWS:
+        return None
+    first_col, last_col = _column(min_lon), _column(max_lon)
+    if first_col == 0 and last_col == GRID_COLUMNS - 1:
+        return [(first_row * GRID_COLUMNS, last_row * GRID_COLUMNS + GRID_COLUMNS - 1)]
+    return [
+        (row * GRID_COLUMNS + first_col, row * GRID_COLUMNS + last_col)
+        for row in range(first_row, last_row + 1)
+    ]
+
+
+def filter_bbox(queryset, min_lat: float, max_lat: float, min_lon: float, max_lon: float):
+    """
+    Restrict a Post queryset to a bounding box.
+
+    The indexed grid_cell column narrows the scan to the covering cells; the
+    exact latitude/longitude comparisons then trim rows at the box edges.
+
+    Args:
+        queryset: Post queryset
+        min_lat, max_lat, min_lon, max_lon: Box corners in degrees
+
+    Returns:
+        Filtered queryset
+    """
+    queryset = queryset.filter(
+        latitude__gte=min_lat, latitude__lte=max_lat,
+        longitude__gte=min_lon, longitude__lte=max_lon,
+    )
+    if min_lat > max_lat or min_lon > max_lon:
+        return queryset
+
+    ranges = cell_ranges(min_lat, max_lat, min_lon, max_lon)
+    if ranges is None:
+        return queryset
+    cells = Q()
+    for first, last in ranges:
+        cells |= Q(grid_cell__gte=first, grid_cell__lte=last)
+    return queryset.filter(cells)
+
+
+def haversine_km(lat: float, lon: float):
+    """
+    Database expression for the great-circle distance in km from a point to each row's coordinates.
+    Built from Django's math functions, so it runs on PostgreSQL and SQLite alike.
+    """
+    lat_r, lon_r = math.radians(lat), math.radians(lon)
+    half_dlat = (Radians(F('latitude')) - Value(lat_r)) / 2
+    half_dlon = (Radians(F('longitude')) - Value(lon_r)) / 2
+    a = Power(Sin(half_dlat), 2) + Value(math.cos(lat_r)) * Cos(Radians(F('latitude'))) * Power(Sin(half_dlon), 2)
+    # Rounding can push a just above 1 for antipodal points, outside ASIN's domain
+    return Value(2 * EARTH_RADIUS_KM) * ASin(Sqrt(Least(a, Value(1.0))))
+
+
+def filter_near(queryset, lat: float, lon: float, radius_km: float):
+    """
+    Restrict a Post queryset to posts within radius_km of a point, nearest first.
+
+    Candidates come from the grid cells of the bounding box around the circle;
+    rows are annotated with distance_km and filtered on the true haversine distance.
+
+    Args:
+        queryset: Post queryset
+        lat: Latitude in degrees
+        lon: Longitude in degrees
+        radius_km: Search radius, clamped to (0, MAX_RADIUS_KM]
+
+    Returns:
+        Queryset annotated with distance_km and ordered by it
+    """
+    radius_km = min(max(radius_km, 0.0), MAX_RADIUS_KM)
+    # 1% margin keeps the flat-earth box a superset of the spherical circle
+    dlat = radius_km * 1.01 / KM_PER_DEGREE
+    min_lat, max_lat = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+
+    cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    dlon = radius_km * 1.01 / (KM_PER_DEGREE * cos_lat) if cos_lat > 1e-6 else 360.0
+    if dlon >= 180 or lon - dlon < -180 or lon + dlon > 180:
+        # Circle reaches a pole or wraps the antimeridian: keep whole grid rows
+        min_lon, max_lon = -180.0, 180.0
+    else:
+        min_lon, max_lon = lon - dlon, lon + dlon
+
+    queryset = filter_bbox(queryset, min_lat, max_lat, min_lon, max_lon)
+    return queryset.annotate(
+        distance_km=haversine_km(lat, lon)
+    ).filter(distance_km__lte=radius_km).order_by('distance_km', 'id')
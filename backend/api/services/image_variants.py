@@ -0,0 +1,179 @@
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+
+from .images import blob_path, get_store_root
+
+logger = logging.getLogger(__name__)
+
+# Fixed-size WebP renditions: (max width, max height, crop to exact size)
+IMAGE_VARIANTS = {
+    'thumb': (320, 320, False),   # Feed, map and proposal cards
+    'avatar': (96, 96, True),     # Square user avatars
+    'medium': (1024, 1024, False),  # Detail pages
+}
+VARIANT_CONTENT_TYPE = 'image/webp'
+WEBP_QUALITY = 80
+VARIANT_TIMEOUT = 30  # Seconds a request waits for an on-demand rendition
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = {}  # (key, variant) -> Future, so concurrent requests share one rendition
+
+
+def variant_path(key: str, variant: str) -> Path:
+    """Path of a cached rendition; kept beside the originals under variants/<name>/"""
+    return get_store_root() / 'variants' / variant / key[:2] / key[2:4] / f'{key}.webp'
+
+
+def render_variant(source: str, destination: str, width: int, height: int, crop: bool) -> str:
+    """
+    Render one WebP rendition of an image file.
+
+    Runs inside the process pool, so it only takes plain arguments and never
+    touches Django settings or the database.
+
+    Args:
+        source: Path of the original blob
+        destination: Path to write the rendition to
+        width: Maximum (or, when cropping, exact) width
+        height: Maximum (or, when cropping, exact) height
+        crop: Center-crop to exactly width x height instead of fitting inside
+
+    Returns:
+        The destination path
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image.seek(0)  # First frame of animated GIF/WebP
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+        if crop:
+            image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        else:
+            image.thumbnail((width, height), Image.Resampling.LANCZOS)
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(destination), prefix='.render-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                image.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_name, destination)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+    return destination
+
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    """
+    Shared process pool for renditions, created on first use.
+
+    Returns:
+        The pool, or None when IMAGE_VARIANT_WORKERS is 0 (render inline, used by tests)
+    """
+    global _executor
+    workers = getattr(settings, 'IMAGE_VARIANT_WORKERS', 0)
+    if not workers:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            # spawn: forking a threaded ASGI worker is unsafe
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def _submit(key: str, variant: str) -> Future:
+    """Queue a rendition, joining an identical one already in flight"""
+    width, height, crop = IMAGE_VARIANTS[variant]
+    args = (str(blob_path(key)), str(variant_path(key, variant)), width, height, crop)
+    with _executor_lock:
+        future = _pending.get((key, variant))
+        if future is not None:
+            return future
+
+    executor = get_executor()
+    if executor is None:
+        future = Future()
+        try:
+            future.set_result(render_variant(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    with _executor_lock:
+        future = _pending.get((key, variant))
+        if future is None:
+            try:
+                future = executor.submit(render_variant, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed by the OOM killer): start a fresh pool next time
+                _discard_executor(executor)
+                raise
+            _pending[(key, variant)] = future
+            future.add_done_callback(lambda f: _pending.pop((key, variant), None))
+    return future
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Drop a broken pool so get_executor() creates a new one; caller holds _executor_lock"""
+    global _executor
+    if _executor is executor:
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def ensure_variant(key: str, variant: str) -> Optional[Path]:
+    """
+    Get the cached rendition of a blob, rendering it in the pool if missing.
+
+    Args:
+        key: SHA-256 key of the original blob
+        variant: Name from IMAGE_VARIANTS
+
+    Returns:
+        Path of the rendition, or None if the original is missing or cannot be decoded
+    """
+    path = variant_path(key, variant)
+    if path.exists():
+        return path
+    if not blob_path(key).exists():
+        return None
+    try:
+        _submit(key, variant).result(timeout=VARIANT_TIMEOUT)
+    except Exception as e:
+        logger.warning(f"Could not render {variant} variant of image {key}: {e}")
+        return None
+    return path
+
+
+def schedule_variants(key: str):
+    """
+    Pre-render every variant of a new blob in the background.
+    Skipped when rendering inline; variants are then produced on first request.
+
+    Args:
+        key: SHA-256 key of the original blob
+    """
+    if get_executor() is None:
+        return
+    for variant in IMAGE_VARIANTS:
+        if not variant_path(key, variant).exists():
+            _submit(key, variant).add_done_callback(_log_failure(key, variant))
+
+
+def _log_failure(key: str, variant: str):
+    def callback(future):
+        if future.exception() is not None:
+            logger.warning(f"Could not render {variant} variant of image {key}: {future.exception()}")
+    return callback
@@ -0,0 +1,222 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+IMAGE_URL_PREFIX = '/api/images/'  # Must match the 'image-blob' route in api/urls.py
+DATA_URL_RE = re.compile(r'^data:(?P<mime>[\w.+-]+/[\w.+-]+)?(?:;[\w=.+-]+)*;base64,', re.IGNORECASE)
+IMAGE_PATH_RE = re.compile(r'^' + re.escape(IMAGE_URL_PREFIX) + r'(?P<key>[0-9a-f]{64})/$')
+IMAGE_KEY_RE = re.compile(r'^[0-9a-f]{64}$')
+# Blobs are content-addressed, so a URL always names the same bytes
+IMAGE_STORE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Magic numbers of the formats browsers render in <img>; anything else stays as submitted
+IMAGE_SIGNATURES = [
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """
+    Detect the image format from the first bytes of a file.
+
+    Args:
+        head: At least the first 12 bytes of the image
+
+    Returns:
+        MIME type, or None if the bytes are not a supported image
+    """
+    for signature, content_type in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def get_store_root() -> Path:
+    return Path(settings.IMAGE_STORE_ROOT)
+
+
+def blob_path(key: str) -> Path:
+    """Path of a stored blob, fanned out by the first two hex pairs to keep directories small"""
+    return get_store_root() / key[:2] / key[2:4] / key
+
+
+def image_path(key: str) -> str:
+    """Relative URL stored in image/avatar columns for a blob key"""
+    return f'{IMAGE_URL_PREFIX}{key}/'
+
+
+def store_bytes(data: bytes) -> str:
+    """
+    Store image bytes under their SHA-256 key. Identical uploads share one file.
+
+    Args:
+        data: Raw image bytes
+
+    Returns:
+        Hex SHA-256 key of the stored blob
+    """
+    key = hashlib.sha256(data).hexdigest()
+    path = blob_path(key)
+    if path.exists():
+        return key
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so readers never see a partial blob
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+        raise
+    return key
+
+
+def decode_data_url(value: str) -> Optional[Tuple[bytes, str]]:
+    """
+    Decode a base64 image data URL.
+
+    Args:
+        value: Candidate data URL
+
+    Returns:
+        Tuple of (bytes, content type), or None if it is not a decodable image
+    """
+    match = DATA_URL_RE.match(value)
+    if not match:
+        return None
+    try:
+        data = base64.b64decode(value[match.end():], validate=False)
+    except (binascii.Error, ValueError):
+        return None
+    content_type = sniff_content_type(data[:12])
+    if content_type is None:
+        return None
+    return data, content_type
+
+
+def externalize_image(value: Optional[str]) -> Optional[str]:
+    """
+    Move an inline image out of the database.
+
+    Base64 data URLs are decoded and stored in the blob store and replaced by
+    their short relative URL. Absolute URLs pointing at the blob endpoint (as
+    returned by the API) are normalized back to the relative form. Anything
+    else, such as external URLs, is returned unchanged.
+
+    Args:
+        value: Image or avatar column value
+
+    Returns:
+        Value to store in the column
+    """
+    if not value:
+        return value
+
+    if value.startswith('data:'):
+        decoded = decode_data_url(value)
+        if decoded is None:
+            logger.warning("Keeping undecodable or unsupported image data URL inline")
+            return value
+        key = store_bytes(decoded[0])
+        # Pre-render thumbnails once the row pointing at the blob is committed
+        from django.db import transaction
+        from .image_variants import schedule_variants
+        transaction.on_commit(lambda: schedule_variants(key))
+        return image_path(key)
+
+    if IMAGE_URL_PREFIX in value:
+        path = urlparse(value).path
+        if IMAGE_PATH_RE.match(path):
+            return path
+
+    return value
+
+
+def image_url(value: Optional[str], request=None, variant: Optional[str] = None) -> Optional[str]:
+    """
+    Public URL for an image or avatar column value.
+
+    Blob store paths are made absolute when a request is available, because
+    the frontend is served from a different origin than the API.
+
+    Args:
+        value: Image or avatar column value
+        request: Current request, if any
+        variant: Rendition name (see image_variants.IMAGE_VARIANTS); None for the original
+
+    Returns:
+        URL (or legacy inline value) for API responses
+    """
+    if not value or not value.startswith(IMAGE_URL_PREFIX):
+        return value
+    if variant:
+        value = f'{value}{variant}/'
+    if request is not None:
+        return request.build_absolute_uri(value)
+    return value
+
+
+# (model label, column) pairs that may hold inline base64 images
+IMAGE_COLUMNS = [
+    ('api.Post', 'image'),
+    ('api.ForumTopic', 'image'),
+    ('api.Profile', 'avatar'),
+]
+
+
+def backfill_images(batch_size: int = 100) -> dict:
+    """
+    Move inline base64 images of existing rows into the blob store.
+
+    Rows are read in primary-key order, batch_size at a time, fetching only the
+    key and the image column. Rows are rewritten with queryset updates, so
+    save() side effects and signals do not fire and updated_at is kept.
+
+    Args:
+        batch_size: Rows per batch (each row may hold up to 10 MB of base64)
+
+    Returns:
+        Dict mapping 'Model.column' to the number of rows migrated
+    """
+    from django.apps import apps
+    from django.db import transaction
+
+    migrated = {}
+    for label, column in IMAGE_COLUMNS:
+        model = apps.get_model(label)
+        inline = model.objects.filter(**{f'{column}__startswith': 'data:'}).order_by('pk')
+        count = 0
+        last_pk = 0
+        while True:
+            rows = list(inline.filter(pk__gt=last_pk).values_list('pk', column)[:batch_size])
+            if not rows:
+                break
+            with transaction.atomic():
+                for pk, value in rows:
+                    new_value = externalize_image(value)
+                    if new_value != value:
+                        model.objects.filter(pk=pk).update(**{column: new_value})
+                        count += 1
+            last_pk = rows[-1][0]
+            logger.info(f"Backfilled {count} {model.__name__}.{column} images (up to pk {last_pk})")
+        migrated[f'{model.__name__}.{column}'] = count
+    return migrated
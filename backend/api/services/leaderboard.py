@@ -0,0 +1,39 @@
+from typing import Dict, List
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+def get_leaderboard(limit: int = DEFAULT_LIMIT, min_reviews: int = 1) -> List[Dict]:
+    """
+    Return the best rated users in a single indexed query.
+
+    Reads RatingSummary.overall_rating (kept up to date on every review write)
+    with ORDER BY ... LIMIT, so cost does not grow with the number of users.
+
+    Args:
+        limit: Number of users to return (capped at MAX_LIMIT)
+        min_reviews: Minimum number of received reviews to be ranked
+
+    Returns:
+        List of dictionaries with 'username', 'rating' and 'total_reviews' keys
+    """
+    from api.models import RatingSummary
+
+    limit = max(1, min(limit, MAX_LIMIT))
+    min_reviews = max(1, min_reviews)
+
+    rows = (
+        RatingSummary.objects
+        .filter(review_count__gte=min_reviews)
+        .order_by('-overall_rating', '-review_count', 'user_id')
+        .values('user__username', 'overall_rating', 'review_count')[:limit]
+    )
+    return [
+        {
+            'username': row['user__username'],
+            'rating': round(row['overall_rating'], 2),
+            'total_reviews': row['review_count'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,337 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .events import publish_event
+from .notifications import bump_version
+
+SIGNUP_BONUS = Decimal('3.00')
+# Entries younger than this are left to the next snapshot, so a transaction still
+# committing a lower entry id can never fall between a snapshot and its tail
+SNAPSHOT_SETTLE_SECONDS = 60
+BATCH_SIZE = 1000
+STATEMENT_CHUNK_SIZE = 2000
+ZERO = Decimal('0.00')
+
+
+def insufficient_balance(required, available) -> ValidationError:
+    return ValidationError(
+        f"Insufficient balance. Required: {required} hours, "
+        f"Available: {available} hours."
+    )
+
+
+class Move(NamedTuple):
+    """One journal line: a signed amount for one user and what it was for"""
+    user_id: int
+    amount: Decimal
+    reason: str
+    proposal_id: Optional[int] = None
+    job_id: Optional[int] = None
+    counterparty_id: Optional[int] = None
+
+
+def post_moves(moves: List[Move]) -> Dict[int, Decimal]:
+    """
+    Apply balance moves for one or many users as one atomic, row-locked operation.
+
+    Moves are netted per user. Profiles are locked in user id order, so two
+    batches touching the same users can never wait on each other in opposite
+    order (no deadlocks), then all balances change in a single conditional
+    UPDATE that only matches users whose balance covers their net debit. If
+    any user is short nothing is applied and ValidationError is raised. Every
+    move is journaled as a LedgerEntry in the same transaction. Updates
+    bypass Profile.save(), so the balance event and the notification version
+    bump are issued here.
+
+    Args:
+        moves: Journal lines; negative amounts are debits
+
+    Returns:
+        Dict mapping user_id to the new balance
+    """
+    from ..models import LedgerEntry, Profile
+
+    moves = [move._replace(amount=Decimal(move.amount)) for move in moves if move.amount]
+    if not moves:
+        return {}
+    totals = {}
+    for move in moves:
+        totals[move.user_id] = totals.get(move.user_id, ZERO) + move.amount
+    user_ids = sorted(totals)
+    # No savepoint of its own: a failure rolls back the caller's whole transaction
+    with transaction.atomic(savepoint=False):
+        if len(user_ids) > 1:
+            # Row locks on PostgreSQL; SQLite serializes writers at the first UPDATE.
+            # A single-row UPDATE locks its one row by itself
+            list(Profile.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id').values_list('pk'))
+        covered = Q(user_id__in=[user_id for user_id in user_ids if totals[user_id] >= 0])
+        for user_id in user_ids:
+            if totals[user_id] < 0:
+                covered |= Q(user_id=user_id, time_balance__gte=-totals[user_id])
+        if len(user_ids) == 1:
+            change = Value(totals[user_ids[0]])
+        else:
+            change = Case(
+                *[When(user_id=user_id, then=Value(totals[user_id])) for user_id in user_ids],
+                output_field=DecimalField(max_digits=6, decimal_places=2)
+            )
+        updated = Profile.objects.filter(user_id__in=user_ids).filter(covered).update(time_balance=F('time_balance') + change)
+        if updated != len(user_ids):
+            available = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'time_balance'))
+            # Raised inside the atomic block: the balances updated above are rolled back
+            missing = next((user_id for user_id in user_ids if user_id not in available), None)
+            if missing is not None:
+                raise ValidationError(f"User {missing} has no profile to hold a time balance.")
+            short = next((
+                user_id for user_id in user_ids
+                if totals[user_id] < 0 and available[user_id] < -totals[user_id]
+            ), None)
+            if short is None:
+                # Every balance covered its debit, so a concurrent change must have moved one
+                raise ValidationError("Balances changed while being updated. Please try again.")
+            raise insufficient_balance(-totals[short], available[short])
+        LedgerEntry.objects.bulk_create([LedgerEntry(**move._asdict()) for move in moves])
+        balances = dict(Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'time_balance'))
+    for user_id, balance in balances.items():
+        publish_event(user_id, 'balance', {'time_balance': str(balance)})
+        bump_version(user_id)
+    return balances
+
+
+def apply_changes(changes: Dict[int, Decimal], reason: str, proposal=None, job=None,
+                  counterparties: Optional[Dict[int, int]] = None) -> Dict[int, Decimal]:
+    """
+    Apply balance changes to several users atomically (see post_moves).
+
+    Args:
+        changes: {user_id: signed amount}; negative amounts are debits
+        reason: LedgerEntry reason
+        proposal: Proposal the movement belongs to, if any
+        job: Job the movement belongs to, if any
+        counterparties: Optional {user_id: other party's user_id}
+
+    Returns:
+        Dict mapping user_id to the new balance
+    """
+    counterparties = counterparties or {}
+    return post_moves([
+        Move(
+            user_id, amount, reason,
+            proposal_id=proposal.pk if proposal is not None else None,
+            job_id=job.pk if job is not None else None,
+            counterparty_id=counterparties.get(user_id),
+        )
+        for user_id, amount in changes.items()
+    ])
+
+
+def debit(user_id: int, amount: Decimal, reason: str, proposal=None, job=None,
+          counterparty_id: Optional[int] = None) -> Decimal:
+    """Take amount from a user's balance, raising ValidationError if it does not cover it"""
+    return apply_changes(
+        {user_id: -Decimal(amount)}, reason, proposal, job, {user_id: counterparty_id}
+    ).get(user_id)
+
+
+def credit(user_id: int, amount: Decimal, reason: str, proposal=None, job=None,
+           counterparty_id: Optional[int] = None) -> Decimal:
+    """Add amount to a user's balance"""
+    return apply_changes(
+        {user_id: Decimal(amount)}, reason, proposal, job, {user_id: counterparty_id}
+    ).get(user_id)
+
+
+def transfer(from_user_id: int, to_user_id: int, amount: Decimal, reason: str,
+             proposal=None, job=None) -> Dict[int, Decimal]:
+    """Move amount between two users atomically; fails as a whole if the payer is short"""
+    amount = Decimal(amount)
+    if from_user_id == to_user_id:
+        return {}
+    return apply_changes(
+        {from_user_id: -amount, to_user_id: amount}, reason, proposal, job,
+        {from_user_id: to_user_id, to_user_id: from_user_id}
+    )
+
+
+def payer_id(proposal) -> int:
+    """User charged when a proposal is accepted: the requester of an offer, the post owner of a need"""
+    return proposal.requester_id if proposal.post.post_type == 'offer' else proposal.provider_id
+
+
+def payee_id(proposal) -> int:
+    """User paid when the job is done: the provider of an offer, the requester of a need"""
+    return proposal.provider_id if proposal.post.post_type == 'offer' else proposal.requester_id
+
+
+def other_party_id(proposal, user_id: int) -> int:
+    return proposal.provider_id if user_id == proposal.requester_id else proposal.requester_id
+
+
+# Journal reads: latest snapshot plus the entries after it
+
+def _latest_snapshot(until: Optional[datetime] = None):
+    """Correlated subquery on user_id selecting the newest snapshot (entirely before until)"""
+    from ..models import BalanceSnapshot
+
+    snapshots = BalanceSnapshot.objects.filter(user_id=OuterRef('user_id'))
+    if until is not None:
+        snapshots = snapshots.filter(as_of__lt=until)
+    return snapshots.order_by('-last_entry_id')
+
+
+def journal_balances(user_ids: Iterable[int], until: Optional[datetime] = None) -> Dict[int, Decimal]:
+    """
+    Balances according to the journal for a batch of users, in two queries.
+
+    Each user's newest snapshot is read, plus the sum of that user's entries
+    after it, so the work per user is bounded by the snapshot interval.
+
+    Args:
+        user_ids: Users to compute
+        until: Only count entries created before this time (default: all)
+
+    Returns:
+        Dict mapping every requested user_id to its journal balance
+    """
+    from ..models import BalanceSnapshot, LedgerEntry
+
+    user_ids = list(user_ids)
+    balances = {user_id: ZERO for user_id in user_ids}
+    if not user_ids:
+        return balances
+    latest = _latest_snapshot(until)
+    balances.update(
+        BalanceSnapshot.objects.filter(user_id__in=user_ids)
+        .annotate(latest_id=Subquery(latest.values('id')[:1]))
+        .filter(id=F('latest_id'))
+        .values_list('user_id', 'balance')
+    )
+    tail = LedgerEntry.objects.filter(user_id__in=user_ids).alias(
+        after=Coalesce(Subquery(latest.values('last_entry_id')[:1]), Value(0))
+    ).filter(id__gt=F('after'))
+    if until is not None:
+        tail = tail.filter(created_at__lt=until)
+    for user_id, total in tail.order_by().values('user_id').annotate(total=Sum('amount')).values_list('user_id', 'total'):
+        balances[user_id] += total
+    return balances
+
+
+def balance_at(user_id: int, when: Optional[datetime] = None) -> Decimal:
+    """A user's balance just before when (now if omitted), from the journal"""
+    return journal_balances([user_id], until=when)[user_id]
+
+
+def statement(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Tuple[Decimal, Iterator[Dict]]:
+    """
+    A user's journal between start (inclusive) and end (exclusive).
+
+    Returns:
+        (opening balance, iterator of entry dicts with the running 'balance'); entries
+        are read from the database in chunks as the iterator is consumed
+    """
+    from ..models import LedgerEntry
+
+    opening = balance_at(user_id, start) if start is not None else ZERO
+    entries = LedgerEntry.objects.filter(user_id=user_id)
+    if start is not None:
+        entries = entries.filter(created_at__gte=start)
+    if end is not None:
+        entries = entries.filter(created_at__lt=end)
+    rows = entries.order_by('id').values(
+        'id', 'created_at', 'reason', 'amount', 'proposal_id', 'job_id', 'counterparty__username'
+    ).iterator(chunk_size=STATEMENT_CHUNK_SIZE)
+
+    def running():
+        balance = opening
+        for row in rows:
+            balance += row['amount']
+            row['balance'] = balance
+            yield row
+    return opening, running()
+
+
+# Maintenance (snapshot_balances and reconcile_ledger commands)
+
+def take_snapshots(min_entries: int = 1, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Snapshot every user with at least min_entries settled entries since their last snapshot.
+
+    Args:
+        min_entries: Skip users with fewer new entries
+        batch_size: Users per round of queries
+
+    Returns:
+        Number of snapshots written
+    """
+    from ..models import BalanceSnapshot, LedgerEntry
+
+    cutoff = timezone.now() - timedelta(seconds=SNAPSHOT_SETTLE_SECONDS)
+    latest = _latest_snapshot()
+    pending = LedgerEntry.objects.filter(created_at__lt=cutoff).alias(
+        after=Coalesce(Subquery(latest.values('last_entry_id')[:1]), Value(0))
+    ).filter(id__gt=F('after')).order_by().values('user_id').annotate(
+        total=Sum('amount'), last_id=Max('id'), last_at=Max('created_at'), count=Count('id')
+    ).filter(count__gte=min_entries).values_list('user_id', 'total', 'last_id', 'last_at')
+
+    written = 0
+    pending = list(pending)
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        previous = dict(
+            BalanceSnapshot.objects.filter(user_id__in=[row[0] for row in batch])
+            .annotate(latest_id=Subquery(latest.values('id')[:1]))
+            .filter(id=F('latest_id'))
+            .values_list('user_id', 'balance')
+        )
+        BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(
+                user_id=user_id,
+                last_entry_id=last_id,
+                as_of=last_at,
+                balance=previous.get(user_id, ZERO) + total,
+            )
+            for user_id, total, last_id, last_at in batch
+        ])
+        written += len(batch)
+    return written
+
+
+def reconcile(fix: bool = False, batch_size: int = BATCH_SIZE) -> List[Tuple[int, Decimal, Decimal]]:
+    """
+    Compare every profile's time_balance with its journal balance, batch by batch.
+
+    Args:
+        fix: Journal each difference as an 'adjustment' entry (the profile is the source of truth)
+        batch_size: Profiles per round of queries
+
+    Returns:
+        List of (user_id, journal balance, profile balance) for the users that differ
+    """
+    from ..models import LedgerEntry, Profile
+
+    mismatches = []
+    last_user_id = 0
+    while True:
+        # Keyset batches: no cursor stays open while adjustments are written
+        batch = list(
+            Profile.objects.filter(user_id__gt=last_user_id).order_by('user_id')
+            .values_list('user_id', 'time_balance')[:batch_size]
+        )
+        if not batch:
+            return mismatches
+        last_user_id = batch[-1][0]
+        journal = journal_balances([user_id for user_id, _ in batch])
+        found = [(user_id, journal[user_id], balance) for user_id, balance in batch if journal[user_id] != balance]
+        if fix and found:
+            LedgerEntry.objects.bulk_create([
+                LedgerEntry(user_id=user_id, amount=balance - journaled, reason='adjustment')
+                for user_id, journaled, balance in found
+            ])
+        mismatches.extend(found)
@@ -0,0 +1,174 @@
+import time
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, F
+
+logger = logging.getLogger(__name__)
+
+VERSION_CACHE_ALIAS = 'shared'  # Must be shared by all worker processes, see settings.CACHES
+VERSION_TIMEOUT = None  # Version counters never expire on their own
+
+
+def _version_key(user_id: int) -> str:
+    return f'notification_version_{user_id}'
+
+
+def get_cache():
+    return caches[VERSION_CACHE_ALIAS]
+
+
+def get_version(user_id: int) -> int:
+    """
+    Get the current notification version for a user (cache only, no database access).
+
+    A missing counter is seeded from the clock so it never repeats a version
+    a client may still hold from before a cache restart.
+
+    Args:
+        user_id: The user whose version is read
+
+    Returns:
+        Integer version, increasing on every relevant write
+    """
+    cache = get_cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns() // 1000, VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(user_id: int):
+    """
+    Invalidate the user's notification summary once the current transaction commits.
+
+    Robust: a failing cache only leaves the ETag stale and is logged, it never
+    fails a write that has already committed.
+    """
+    transaction.on_commit(lambda: _bump(user_id), robust=True)
+
+
+def _bump(user_id: int):
+    key = _version_key(user_id)
+    try:
+        get_cache().incr(key)
+    except ValueError:
+        # Counter not seeded yet (or evicted): seeding gives a fresh version as well
+        get_version(user_id)
+
+
+# Proposal statuses counted as awaiting action for both parties
+PENDING_STATUSES = ('waiting', 'pending')
+
+
+def pending_proposal_count(user) -> int:
+    """
+    Count proposals awaiting action (waiting/pending) where the user is either party.
+
+    Reads the user's PendingApprovalCount row (a primary key lookup), which
+    proposal writes keep up to date in their own transaction.
+
+    Args:
+        user: The user whose proposals are counted
+
+    Returns:
+        Number of waiting or pending proposals
+    """
+    from ..models import PendingApprovalCount
+    return PendingApprovalCount.objects.filter(pk=user.pk).values_list('count', flat=True).first() or 0
+
+
+def pending_deltas(changes: Iterable[Tuple[int, int, Optional[str], Optional[str]]]) -> Dict[int, int]:
+    """
+    Pending count changes caused by proposal status changes.
+
+    Args:
+        changes: (requester_id, provider_id, previous_status, status) per proposal;
+            None as previous_status for new proposals, as status for deleted ones
+
+    Returns:
+        {user_id: delta}, without zero deltas
+    """
+    deltas = {}
+    for requester_id, provider_id, previous_status, new_status in changes:
+        delta = int(new_status in PENDING_STATUSES) - int(previous_status in PENDING_STATUSES)
+        if delta:
+            # A party counts each proposal once, even on both sides of it
+            for user_id in {requester_id, provider_id}:
+                deltas[user_id] = deltas.get(user_id, 0) + delta
+    return {user_id: delta for user_id, delta in deltas.items() if delta}
+
+
+def _counted_pending(proposal_model, user_ids: Optional[List[int]] = None) -> Dict[int, int]:
+    """Pending proposals per user, counted from the Proposal table with two grouped aggregates"""
+    pending = proposal_model.objects.filter(status__in=PENDING_STATUSES).order_by()
+    counts = Counter()
+    as_requester = pending if user_ids is None else pending.filter(requester_id__in=user_ids)
+    as_provider = pending.exclude(provider_id=F('requester_id'))
+    if user_ids is not None:
+        as_provider = as_provider.filter(provider_id__in=user_ids)
+    for field, queryset in (('requester_id', as_requester), ('provider_id', as_provider)):
+        for user_id, count in queryset.values(field).annotate(count=Count('id')).values_list(field, 'count'):
+            counts[user_id] += count
+    return counts
+
+
+def repair_pending_counts(proposal_model=None, count_model=None, batch_size: int = 1000,
+                          notify: bool = True) -> List[Tuple[int, int, int]]:
+    """
+    Compare every stored pending count with the Proposal table and correct the ones that differ.
+
+    Suspect users are found with one pass over both tables; each batch of them
+    is then recounted with its counter rows locked, so a proposal change
+    committing meanwhile is either part of the recount or applies its delta
+    after the corrected value is written. Model classes can be passed in so
+    data migrations can run this against historical models.
+
+    Args:
+        proposal_model: Proposal model class (defaults to api.models.Proposal)
+        count_model: PendingApprovalCount model class (defaults to api.models.PendingApprovalCount)
+        batch_size: Users recounted per transaction
+        notify: Bump the notification version of corrected users
+
+    Returns:
+        List of (user_id, stored, counted) for every corrected user
+    """
+    if proposal_model is None or count_model is None:
+        from api.models import PendingApprovalCount, Proposal
+        proposal_model = proposal_model or Proposal
+        count_model = count_model or PendingApprovalCount
+
+    counted = _counted_pending(proposal_model)
+    stored = dict(count_model.objects.values_list('user_id', 'count').iterator(chunk_size=batch_size))
+    suspects = sorted(user_id for user_id in counted.keys() | stored.keys() if counted[user_id] != stored.get(user_id, 0))
+
+    fixed = []
+    for start in range(0, len(suspects), batch_size):
+        batch = suspects[start:start + batch_size]
+        with transaction.atomic():
+            stored = dict(
+                count_model.objects.select_for_update().filter(user_id__in=batch)
+                .order_by('user_id').values_list('user_id', 'count')
+            )
+            counted = _counted_pending(proposal_model, batch)
+            changed = [user_id for user_id in batch if counted[user_id] != stored.get(user_id, 0)]
+            count_model.objects.bulk_update(
+                [count_model(user_id=user_id, count=counted[user_id]) for user_id in changed if user_id in stored],
+                ['count']
+            )
+            count_model.objects.bulk_create(
+                [count_model(user_id=user_id, count=counted[user_id]) for user_id in changed if user_id not in stored],
+                ignore_conflicts=True
+            )
+            for user_id in changed:
+                fixed.append((user_id, stored.get(user_id, 0), counted[user_id]))
+                if notify:
+                    bump_version(user_id)
+    if fixed:
+        logger.info(f"Corrected {len(fixed)} pending proposal counts")
+    return fixed
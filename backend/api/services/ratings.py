@@ -0,0 +1,56 @@
+import logging
+from django.db import transaction
+from django.db.models import Count, Sum
+
+logger = logging.getLogger(__name__)
+
+RATING_CRITERIA = ('friendliness', 'time_management', 'reliability', 'communication', 'work_quality')
+
+
+def overall_rating(grand_total: int, review_count: int) -> float:
+    """Mean of the per-criterion averages, i.e. the grand total over every criterion of every review"""
+    if not review_count:
+        return 0.0
+    return grand_total / (review_count * len(RATING_CRITERIA))
+
+
+def rebuild_rating_summaries(review_model=None, summary_model=None, batch_size: int = 1000) -> int:
+    """
+    Recompute every RatingSummary row from the Review table with one grouped aggregate.
+
+    Model classes can be passed in so data migrations can run this against historical models.
+
+    Args:
+        review_model: Review model class (defaults to api.models.Review)
+        summary_model: RatingSummary model class (defaults to api.models.RatingSummary)
+        batch_size: Rows per bulk_create batch
+
+    Returns:
+        Number of summary rows written
+    """
+    if review_model is None or summary_model is None:
+        from api.models import Review, RatingSummary
+        review_model = review_model or Review
+        summary_model = summary_model or RatingSummary
+
+    aggregates = {f'{field}_total': Sum(field) for field in RATING_CRITERIA}
+    rows = (
+        review_model.objects.order_by()
+        .values('reviewed_user_id')
+        .annotate(review_count=Count('id'), **aggregates)
+    )
+
+    summaries = []
+    for row in rows.iterator():
+        totals = {f'{field}_total': row[f'{field}_total'] or 0 for field in RATING_CRITERIA}
+        summary = summary_model(user_id=row['reviewed_user_id'], review_count=row['review_count'], **totals)
+        if hasattr(summary, 'overall_rating'):
+            summary.overall_rating = overall_rating(sum(totals.values()), row['review_count'])
+        summaries.append(summary)
+
+    with transaction.atomic():
+        summary_model.objects.all().delete()
+        summary_model.objects.bulk_create(summaries, batch_size=batch_size)
+
+    logger.info(f"Rebuilt {len(summaries)} rating summaries")
+    return len(summaries)
@@ -0,0 +1,209 @@
+import html
+import re
+from typing import Dict, Iterable, List, Optional
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+# Highlight markers from private-use code points: snippets are HTML-escaped first, then the
+# markers become <mark> tags, so post text can never inject markup
+HIGHLIGHT_START = '\ue000'
+HIGHLIGHT_STOP = '\ue001'
+SNIPPET_WORDS = 24
+MAX_QUERY_TERMS = 8
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+POSTGRES_CONFIG = 'simple'  # Posts are multilingual; no language-specific stemming
+
+
+def query_terms(query: str) -> List[str]:
+    """Word tokens of a user query (punctuation and operators are dropped)"""
+    return [term.lower() for term in TERM_RE.findall(query or '')][:MAX_QUERY_TERMS]
+
+
+def highlight(snippet: Optional[str]) -> Optional[str]:
+    """Escape a raw snippet and turn the highlight markers into <mark> tags"""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_STOP, '</mark>')
+
+
+class PostgresSearchBackend:
+    """tsvector column api_post.search_vector with a GIN index; title weighs A, description B, tags C"""
+
+    def install(self, cursor):
+        cursor.execute("ALTER TABLE api_post ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        cursor.execute("CREATE INDEX IF NOT EXISTS api_post_search_vector_gin ON api_post USING GIN (search_vector)")
+
+    def uninstall(self, cursor):
+        cursor.execute("DROP INDEX IF EXISTS api_post_search_vector_gin")
+        cursor.execute("ALTER TABLE api_post DROP COLUMN IF EXISTS search_vector")
+
+    def index(self, cursor, post_ids: Optional[List[int]]):
+        where, params = ("WHERE p.id = ANY(%s)", [list(post_ids)]) if post_ids is not None else ("", [])
+        cursor.execute(
+            "UPDATE api_post p SET search_vector = "
+            f"setweight(to_tsvector('{POSTGRES_CONFIG}', coalesce(p.title, '')), 'A') || "
+            f"setweight(to_tsvector('{POSTGRES_CONFIG}', coalesce(p.description, '')), 'B') || "
+            f"setweight(to_tsvector('{POSTGRES_CONFIG}', coalesce(("
+            "SELECT string_agg(t.name, ' ') FROM api_post_tags pt JOIN api_tag t ON t.id = pt.tag_id "
+            "WHERE pt.post_id = p.id), '')), 'C') "
+            + where,
+            params
+        )
+
+    def remove(self, cursor, post_ids: List[int]):
+        """The vector lives on the post row and goes away with it"""
+
+    def tsquery(self, terms: List[str]) -> str:
+        # Terms are \w-only, so they cannot carry tsquery operators
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def filter(self, queryset, terms: List[str]):
+        query = self.tsquery(terms)
+        return queryset.alias(
+            search_match=RawSQL(
+                f"api_post.search_vector @@ to_tsquery('{POSTGRES_CONFIG}', %s)", [query], output_field=BooleanField()
+            )
+        ).filter(search_match=True).annotate(
+            search_rank=RawSQL(
+                f"ts_rank_cd(api_post.search_vector, to_tsquery('{POSTGRES_CONFIG}', %s))", [query], output_field=FloatField()
+            )
+        )
+
+    def snippets(self, cursor, post_ids: List[int], terms: List[str]) -> Dict[int, str]:
+        options = f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, MaxWords={SNIPPET_WORDS}, MinWords=8, HighlightAll=false'
+        cursor.execute(
+            f"SELECT id, ts_headline('{POSTGRES_CONFIG}', title || ' — ' || description, "
+            f"to_tsquery('{POSTGRES_CONFIG}', %s), %s) FROM api_post WHERE id = ANY(%s)",
+            [self.tsquery(terms), options, list(post_ids)]
+        )
+        return dict(cursor.fetchall())
+
+
+class SqliteSearchBackend:
+    """FTS5 table api_post_fts (rowid = post id) for tests and small installs; bm25 weighs title 10, description 5, tags 2"""
+
+    def install(self, cursor):
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS api_post_fts USING fts5("
+            "title, description, tags, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+
+    def uninstall(self, cursor):
+        cursor.execute("DROP TABLE IF EXISTS api_post_fts")
+
+    def index(self, cursor, post_ids: Optional[List[int]]):
+        if post_ids is None:
+            cursor.execute("DELETE FROM api_post_fts")
+            where, params = "", []
+        else:
+            placeholders = ', '.join(['%s'] * len(post_ids))
+            cursor.execute(f"DELETE FROM api_post_fts WHERE rowid IN ({placeholders})", post_ids)
+            where, params = f"WHERE p.id IN ({placeholders})", post_ids
+        cursor.execute(
+            "INSERT INTO api_post_fts (rowid, title, description, tags) "
+            "SELECT p.id, coalesce(p.title, ''), coalesce(p.description, ''), coalesce(("
+            "SELECT group_concat(t.name, ' ') FROM api_post_tags pt JOIN api_tag t ON t.id = pt.tag_id "
+            "WHERE pt.post_id = p.id), '') FROM api_post p " + where,
+            params
+        )
+
+    def remove(self, cursor, post_ids: List[int]):
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        cursor.execute(f"DELETE FROM api_post_fts WHERE rowid IN ({placeholders})", post_ids)
+
+    def match(self, terms: List[str]) -> str:
+        # Quoted prefix tokens, implicitly ANDed
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def filter(self, queryset, terms: List[str]):
+        # Joined rather than correlated: a per-row subquery would re-run the MATCH for every post.
+        # bm25() is lower-is-better; negate so both backends sort by descending rank
+        return queryset.extra(
+            tables=['api_post_fts'],
+            where=['api_post_fts.rowid = api_post.id', 'api_post_fts MATCH %s'],
+            params=[self.match(terms)],
+            select={'search_rank': '-bm25(api_post_fts, 10.0, 5.0, 2.0)'},
+        )
+
+    def snippets(self, cursor, post_ids: List[int], terms: List[str]) -> Dict[int, str]:
+        placeholders = ', '.join(['%s'] * len(post_ids))
+        cursor.execute(
+            "SELECT rowid, snippet(api_post_fts, -1, %s, %s, '…', %s) FROM api_post_fts "
+            f"WHERE api_post_fts MATCH %s AND rowid IN ({placeholders})",
+            [HIGHLIGHT_START, HIGHLIGHT_STOP, SNIPPET_WORDS, self.match(terms), *post_ids]
+        )
+        return dict(cursor.fetchall())
+
+
+def get_search_backend(vendor: Optional[str] = None):
+    vendor = vendor or connection.vendor
+    if vendor == 'postgresql':
+        return PostgresSearchBackend()
+    if vendor == 'sqlite':
+        return SqliteSearchBackend()
+    raise NotImplementedError(f"Full-text search is not available on {vendor}")
+
+
+def index_posts(post_ids: Optional[Iterable[int]] = None):
+    """
+    (Re)build the search entries of some posts, or of every post when post_ids is None.
+
+    Args:
+        post_ids: Post primary keys
+    """
+    if post_ids is not None:
+        post_ids = sorted(set(post_ids))
+        if not post_ids:
+            return
+    with connection.cursor() as cursor:
+        get_search_backend().index(cursor, post_ids)
+
+
+def remove_posts(post_ids: Iterable[int]):
+    post_ids = sorted(set(post_ids))
+    if post_ids:
+        with connection.cursor() as cursor:
+            get_search_backend().remove(cursor, post_ids)
+
+
+def search_posts(queryset, query: str):
+    """
+    Restrict a Post queryset to full-text matches of a query, best first.
+
+    Every word is matched as a prefix and all words must match. Rows are
+    annotated with search_rank (higher is better).
+
+    Args:
+        queryset: Post queryset
+        query: User search text
+
+    Returns:
+        Filtered, annotated queryset ordered by rank; empty when the query has no words
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+    return get_search_backend().filter(queryset, terms).order_by('-search_rank', '-created_at')
+
+
+def get_snippets(post_ids: Iterable[int], query: str) -> Dict[int, str]:
+    """
+    Highlighted text snippets for a page of search results.
+
+    Args:
+        post_ids: Posts on the current page
+        query: User search text
+
+    Returns:
+        Dict mapping post id to an HTML-escaped snippet with <mark> around matches
+    """
+    post_ids = list(post_ids)
+    terms = query_terms(query)
+    if not post_ids or not terms:
+        return {}
+    with connection.cursor() as cursor:
+        raw = get_search_backend().snippets(cursor, post_ids, terms)
+    return {post_id: highlight(snippet) for post_id, snippet in raw.items()}
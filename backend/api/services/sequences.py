@@ -0,0 +1,107 @@
+from typing import List, Optional
+
+from django.db import connection, transaction
+
+# Sequence name -> (table, column) it numbers; used to start the sequence after existing rows
+SEQUENCES = {
+    'tag_id': ('api_tag', 'tag_id'),
+}
+
+
+class PostgresSequenceBackend:
+    """Native sequences: nextval() never blocks other transactions and never hands out a value twice"""
+
+    def sequence(self, name: str) -> str:
+        return f'api_{name}_seq'
+
+    def install(self, cursor, name: str):
+        table, column = SEQUENCES[name]
+        cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {self.sequence(name)}")
+        # Start after existing rows, never moving back past values already handed out
+        cursor.execute(
+            f"SELECT setval(%s, MAX({column})) FROM {table} HAVING MAX({column}) > "
+            f"(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {self.sequence(name)})",
+            [self.sequence(name)]
+        )
+
+    def uninstall(self, cursor, name: str):
+        cursor.execute(f"DROP SEQUENCE IF EXISTS {self.sequence(name)}")
+
+    def allocate(self, cursor, name: str, count: int) -> Optional[List[int]]:
+        # Values of concurrent callers may interleave, so the block is a list, not a range
+        cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [self.sequence(name), count])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class CounterTableBackend:
+    """
+    One row per sequence in api_sequence, bumped by count in a single UPDATE.
+
+    The UPDATE holds the row's write lock until the surrounding transaction ends,
+    so concurrent callers get disjoint blocks (SQLite serializes writers anyway).
+    """
+
+    def install(self, cursor, name: str):
+        table, column = SEQUENCES[name]
+        cursor.execute("CREATE TABLE IF NOT EXISTS api_sequence (name varchar(50) PRIMARY KEY, value bigint NOT NULL)")
+        cursor.execute(
+            f"INSERT INTO api_sequence (name, value) SELECT %s, COALESCE(MAX({column}), 0) FROM {table} WHERE 1 "
+            "ON CONFLICT (name) DO UPDATE SET value = MAX(api_sequence.value, excluded.value)",
+            [name]
+        )
+
+    def uninstall(self, cursor, name: str):
+        cursor.execute("DELETE FROM api_sequence WHERE name = %s", [name])
+
+    def allocate(self, cursor, name: str, count: int) -> Optional[List[int]]:
+        if connection.features.can_return_columns_from_insert:
+            cursor.execute("UPDATE api_sequence SET value = value + %s WHERE name = %s RETURNING value", [count, name])
+            row = cursor.fetchone()
+        else:
+            # SQLite before 3.35: read back inside the same transaction
+            with transaction.atomic():
+                cursor.execute("UPDATE api_sequence SET value = value + %s WHERE name = %s", [count, name])
+                cursor.execute("SELECT value FROM api_sequence WHERE name = %s", [name])
+                row = cursor.fetchone()
+        if row is None:
+            return None
+        return list(range(row[0] - count + 1, row[0] + 1))
+
+
+def get_sequence_backend(vendor: Optional[str] = None):
+    vendor = vendor or connection.vendor
+    if vendor == 'postgresql':
+        return PostgresSequenceBackend()
+    if vendor == 'sqlite':
+        return CounterTableBackend()
+    raise NotImplementedError(f"Sequences are not available on {vendor}")
+
+
+def next_values(name: str, count: int = 1) -> List[int]:
+    """
+    Reserve count values of a sequence in one round-trip.
+
+    Values are unique across concurrent callers and never reused, but may have
+    gaps (rolled-back or unused reservations on PostgreSQL).
+
+    Args:
+        name: Sequence name (a key of SEQUENCES)
+        count: Number of values to reserve
+
+    Returns:
+        The reserved values in increasing order
+    """
+    if count < 1:
+        return []
+    backend = get_sequence_backend()
+    with connection.cursor() as cursor:
+        values = backend.allocate(cursor, name, count)
+        if values is None:
+            # No counter yet (e.g. its row was deleted); start after existing rows
+            backend.install(cursor, name)
+            values = backend.allocate(cursor, name, count)
+    return values
+
+
+def next_value(name: str) -> int:
+    return next_values(name, 1)[0]
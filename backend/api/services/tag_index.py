@@ -0,0 +1,215 @@
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from django.core.cache import caches
+from django.db import transaction
+
+VERSION_CACHE_ALIAS = 'shared'  # Must be shared by all worker processes, see settings.CACHES
+VERSION_KEY = 'tag_index_version'
+VERSION_TIMEOUT = None
+# Popularity drifts where no signal fires (e.g. cascaded deletes); rebuild at least this often
+MAX_INDEX_AGE = 300
+SEARCH_LIMIT = 10
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(text: Optional[str]) -> str:
+    """Case- and accent-insensitive form used for matching ('İş' and 'is' fold alike)"""
+    decomposed = unicodedata.normalize('NFKD', (text or '').casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).strip()
+
+
+def tag_keys(name: str, label: Optional[str]) -> Set[str]:
+    """Index keys of a tag: its whole folded name plus every word of its name and label"""
+    folded = fold(name)
+    keys = {folded} if folded else set()
+    keys.update(WORD_RE.findall(folded))
+    keys.update(WORD_RE.findall(fold(label)))
+    return keys
+
+
+class TagIndex:
+    """
+    Sorted array of (key, tag pk) pairs answering prefix queries with bisect.
+
+    Only keys, folded names and usage counts are kept; callers load the
+    matching tags by primary key.
+    """
+
+    def __init__(self):
+        self.keys: List[Tuple[str, int]] = []
+        self.names: Dict[int, str] = {}
+        self.tag_keys: Dict[int, Set[str]] = {}
+        self.popularity: Dict[int, int] = defaultdict(int)
+        self.version: Optional[int] = None
+        self.loaded_at = 0.0
+
+    def load(self, rows, popularity: Dict[int, int], version: int):
+        """Replace the contents with (pk, name, label) rows"""
+        self.names, self.tag_keys = {}, {}
+        entries = []
+        for pk, name, label in rows:
+            self.names[pk] = fold(name)
+            self.tag_keys[pk] = tag_keys(name, label)
+            entries.extend((key, pk) for key in self.tag_keys[pk])
+        entries.sort()
+        self.keys = entries
+        self.popularity = defaultdict(int, popularity)
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def put(self, pk: int, name: str, label: Optional[str], created: bool = False):
+        self.remove(pk)
+        if created:
+            self.popularity.pop(pk, None)
+        self.names[pk] = fold(name)
+        self.tag_keys[pk] = tag_keys(name, label)
+        for key in self.tag_keys[pk]:
+            bisect.insort(self.keys, (key, pk))
+
+    def remove(self, pk: int):
+        for key in self.tag_keys.pop(pk, ()):
+            position = bisect.bisect_left(self.keys, (key, pk))
+            if position < len(self.keys) and self.keys[position] == (key, pk):
+                del self.keys[position]
+        self.names.pop(pk, None)
+
+    def add_usage(self, pk: int, delta: int):
+        self.popularity[pk] = max(0, self.popularity[pk] + delta)
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> List[int]:
+        """
+        Tag pks matching a query by prefix, best first.
+
+        Ranked by match quality (exact name, name prefix, word prefix), then by
+        usage count, then alphabetically.
+        """
+        prefix = fold(query)
+        if not prefix:
+            return []
+        tiers = {}
+        position = bisect.bisect_left(self.keys, (prefix, -1))
+        while position < len(self.keys) and self.keys[position][0].startswith(prefix):
+            pk = self.keys[position][1]
+            name = self.names[pk]
+            tier = 0 if name == prefix else 1 if name.startswith(prefix) else 2
+            tiers[pk] = min(tier, tiers.get(pk, tier))
+            position += 1
+        ranked = sorted(tiers, key=lambda pk: (tiers[pk], -self.popularity[pk], self.names[pk]))
+        return ranked[:limit]
+
+
+_index = TagIndex()
+_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[VERSION_CACHE_ALIAS]
+
+
+def get_version() -> int:
+    """Shared index version; seeded from the clock like the notification versions"""
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns() // 1000, VERSION_TIMEOUT)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _usage_relations():
+    from ..models import ForumTopic, Post, Profile
+    return (Post.tags.through, ForumTopic.semantic_tags.through, Profile.interested_tags.through)
+
+
+def _rebuild(version: int):
+    from django.db.models import Count
+    from ..models import Tag
+
+    popularity = defaultdict(int)
+    for through in _usage_relations():
+        for tag_id, uses in through.objects.values('tag_id').annotate(uses=Count('id')).values_list('tag_id', 'uses'):
+            popularity[tag_id] += uses
+    _index.load(Tag.objects.values_list('pk', 'name', 'label').iterator(), popularity, version)
+
+
+def _ensure_current(version: int):
+    """
+    (Re)load the process-local index when missing, when another process changed the
+    tags (shared version moved) or when older than MAX_INDEX_AGE. Caller holds _lock.
+    """
+    if _index.version != version or time.monotonic() - _index.loaded_at > MAX_INDEX_AGE:
+        _rebuild(version)
+
+
+def search_tags(query: str, limit: int = SEARCH_LIMIT) -> list:
+    """
+    Local tags for an autocomplete query, best match first.
+
+    The index picks the candidates; they are loaded with one primary key query
+    and re-checked, so entries left behind by rolled-back writes never leak out.
+
+    Args:
+        query: Text typed so far
+        limit: Maximum number of tags
+
+    Returns:
+        List of Tag instances
+    """
+    from ..models import Tag
+
+    version = get_version()
+    with _lock:
+        _ensure_current(version)
+        pks = _index.search(query, limit)
+    tags = Tag.objects.in_bulk(pks)
+    prefix = fold(query)
+    return [
+        tags[pk] for pk in pks
+        if pk in tags and any(key.startswith(prefix) for key in tag_keys(tags[pk].name, tags[pk].label))
+    ]
+
+
+def _publish(apply, reapply=None):
+    """
+    Apply a change to this process's index now and again after commit (a reload in
+    between would not have seen it), then move the shared version so other processes
+    reload. If nobody else moved it in the meantime this process stays current.
+    """
+    with _lock:
+        apply()
+
+    def on_commit():
+        with _lock:
+            (reapply or apply)()
+            try:
+                version = get_cache().incr(VERSION_KEY)
+            except ValueError:
+                version = None
+            if _index.version is not None and version == _index.version + 1:
+                _index.version = version
+    transaction.on_commit(on_commit)
+
+
+def tag_saved(tag, created: bool = False):
+    # Only the first apply may reset usage: the tag can be attached before the commit
+    _publish(
+        lambda: _index.put(tag.pk, tag.name, tag.label, created=created),
+        lambda: _index.put(tag.pk, tag.name, tag.label)
+    )
+
+
+def tag_deleted(pk: int):
+    _publish(lambda: _index.remove(pk))
+
+
+def tags_used(tag_ids, delta: int):
+    """Adjust usage counts locally; other processes pick them up on their next reload"""
+    with _lock:
+        for tag_id in tag_ids:
+            _index.add_usage(tag_id, delta)
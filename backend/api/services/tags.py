@@ -0,0 +1,160 @@
+from typing import Dict, Iterable, List, Optional
+
+from . import tag_index
+from .sequences import next_values
+from .wikidata import get_wikidata_entities
+
+
+def _insert_tags(new_tags: list, field_name: str) -> Dict:
+    """
+    Insert new tags with one bulk_create and read them back keyed by field_name.
+
+    Rows clashing with an existing tag (name or wikidata_id, e.g. a concurrent
+    insert) are skipped; the read-back returns whichever row won.
+    """
+    from ..models import Tag
+
+    if not new_tags:
+        return {}
+    # bulk_create skips Tag.save(), so tag_ids are reserved here as one block
+    for tag, tag_id in zip(new_tags, next_values('tag_id', len(new_tags))):
+        tag.tag_id = tag_id
+    Tag.objects.bulk_create(new_tags, ignore_conflicts=True)
+    created = Tag.objects.in_bulk([getattr(tag, field_name) for tag in new_tags], field_name=field_name)
+    for tag in created.values():
+        # No post_save signal fired for these rows
+        tag_index.tag_saved(tag, created=True)
+    return created
+
+
+def get_or_create_wikidata_tags(wikidata_ids: Iterable[str], known_entities: Optional[Dict[str, Dict]] = None) -> Dict:
+    """
+    Tags for a list of Wikidata ids, creating the missing ones.
+
+    Existing tags are read with one wikidata_id__in query. Labels of the missing
+    ids are fetched in batches (get_wikidata_entities) unless the caller already
+    knows them, and the new tags are inserted with a single bulk_create.
+    Entities whose label is already another tag's name are skipped, as before.
+
+    Args:
+        wikidata_ids: Wikidata Q identifiers
+        known_entities: Optional {wikidata_id: {'label', 'description', 'name'}} supplied by the client
+
+    Returns:
+        Dict mapping wikidata_id to Tag, in input order, for the ids that have a tag
+    """
+    from ..models import Tag
+
+    ids = list(dict.fromkeys(wid for wid in wikidata_ids if wid))
+    tags = Tag.objects.in_bulk(ids, field_name='wikidata_id')
+    missing = [wid for wid in ids if wid not in tags]
+    if missing:
+        known_entities = known_entities or {}
+        entities = {wid: known_entities[wid] for wid in missing if known_entities.get(wid, {}).get('label')}
+        entities.update(get_wikidata_entities([wid for wid in missing if wid not in entities]))
+
+        new_tags = []
+        for wid in missing:
+            entity = entities.get(wid)
+            if entity:
+                label = entity.get('label') or wid
+                new_tags.append(Tag(
+                    name=entity.get('name') or label,
+                    label=label,
+                    description=entity.get('description', ''),
+                    wikidata_id=wid,
+                    is_custom=False
+                ))
+        tags.update(_insert_tags(new_tags, 'wikidata_id'))
+
+    return {wid: tags[wid] for wid in ids if wid in tags}
+
+
+def resolve_wikidata_items(items) -> Dict:
+    """
+    Batch-resolve the Wikidata-backed entries of a tag payload.
+
+    Entries are {'name', 'label', 'description', 'wikidata_id'} dicts as sent by
+    the tag picker; other entries (ids, plain names) are left to the caller.
+
+    Returns:
+        Dict mapping wikidata_id to Tag
+    """
+    known_entities = {}
+    for item in items or []:
+        if isinstance(item, dict) and 'id' not in item and item.get('wikidata_id'):
+            name = str(item.get('name') or item.get('value') or '').strip()
+            known_entities[item['wikidata_id']] = {
+                'name': name,
+                'label': item.get('label') or name,
+                'description': item.get('description', ''),
+            }
+    if not known_entities:
+        return {}
+    return get_or_create_wikidata_tags(known_entities, known_entities)
+
+
+def resolve_tags(items) -> List:
+    """
+    Turn a tag payload into Tag instances with a fixed number of queries.
+
+    Items may be tag ids (int or {'id'}), tag picker entries carrying a
+    wikidata_id, names ({'name'} / {'value'} dicts or plain strings). Each group
+    is fetched with one __in query; missing names become custom tags and all
+    new tags are inserted with a single bulk_create per group. Unknown ids and
+    empty names are skipped.
+
+    Args:
+        items: List from the request body
+
+    Returns:
+        Tags in input order, without duplicates
+    """
+    from ..models import Tag
+
+    items = items or []
+    wikidata_tags = resolve_wikidata_items(items)
+
+    # Partition: ('id', pk) or ('name', name, defaults)
+    specs = []
+    for item in items:
+        if isinstance(item, dict):
+            if 'id' in item:
+                try:
+                    specs.append(('id', int(item['id'])))
+                except (TypeError, ValueError):
+                    continue
+            elif item.get('wikidata_id') in wikidata_tags:
+                specs.append(('wikidata', item['wikidata_id']))
+            elif 'name' in item or 'value' in item:
+                name = str(item.get('name') or item.get('value') or '').strip()
+                if name:
+                    specs.append(('name', name, {
+                        'description': item.get('description', ''),
+                        'wikidata_id': item.get('wikidata_id'),
+                        'is_custom': item.get('is_custom', True),
+                        'label': item.get('label', name),
+                    }))
+        elif isinstance(item, bool):
+            continue
+        elif isinstance(item, int):
+            specs.append(('id', item))
+        elif isinstance(item, str) and item.strip():
+            specs.append(('name', item.strip(), {'is_custom': True}))
+
+    by_id = Tag.objects.in_bulk([spec[1] for spec in specs if spec[0] == 'id'])
+    names = list(dict.fromkeys(spec[1] for spec in specs if spec[0] == 'name'))
+    by_name = Tag.objects.in_bulk(names, field_name='name') if names else {}
+    new_tags = {}
+    for spec in specs:
+        if spec[0] == 'name' and spec[1] not in by_name and spec[1] not in new_tags:
+            new_tags[spec[1]] = Tag(name=spec[1], **spec[2])
+    by_name.update(_insert_tags(list(new_tags.values()), 'name'))
+
+    resolved = {'id': by_id, 'wikidata': wikidata_tags, 'name': by_name}
+    tags = []
+    for spec in specs:
+        tag = resolved[spec[0]].get(spec[1])
+        if tag is not None and tag not in tags:
+            tags.append(tag)
+    return tags
@@ -0,0 +1,336 @@
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import ledger
+from .events import publish_event
+from .notifications import bump_version, pending_deltas
+
+MAX_BULK_SIZE = 100
+
+
+@dataclass(frozen=True)
+class BalanceEffect:
+    """Hours moved when a transition applies: to or from the payer / payee of the proposal"""
+    party: str  # 'payer' or 'payee' (see ledger.payer_id / ledger.payee_id)
+    sign: int  # -1 debits the party, +1 credits it
+    reason: str  # LedgerEntry reason
+    per_job: bool = False  # Once per job closed by the transition instead of once per proposal
+
+
+@dataclass(frozen=True)
+class Transition:
+    """
+    A legal proposal status change and its side effects.
+
+    sources are the statuses the bulk endpoint accepts the transition from;
+    save_sources the previous statuses for which Proposal.save() runs its
+    effects (None: any other status). actors are the parties (requester /
+    provider) allowed to apply it in bulk.
+    """
+    name: str
+    sources: Tuple[str, ...]
+    target: str
+    actors: Tuple[str, ...]
+    balance: Optional[BalanceEffect] = None
+    jobs: Optional[str] = None  # 'open', 'cancel' or 'complete' the proposal's waiting jobs
+    save_sources: Optional[Tuple[str, ...]] = None
+    requires_approvals: bool = False  # Both parties approved (status is then set by save())
+    bulk: bool = True
+
+    @property
+    def has_effects(self) -> bool:
+        return self.balance is not None or self.jobs is not None
+
+    def fires_on_save(self, proposal, previous_status: Optional[str]) -> bool:
+        if not self.has_effects:
+            return False
+        if self.requires_approvals:
+            return proposal.status in self.sources and proposal.provider_approved and proposal.requester_approved
+        if proposal.status != self.target or previous_status == self.target:
+            return False
+        return self.save_sources is None or previous_status in self.save_sources
+
+
+TRANSITIONS: Dict[str, Transition] = {
+    # Offer: requester pays; need: provider (post owner) pays
+    'accept': Transition(
+        'accept', sources=('waiting',), target='accepted', actors=('provider',),
+        balance=BalanceEffect('payer', -1, 'payment'), jobs='open',
+    ),
+    'decline': Transition('decline', sources=('waiting',), target='declined', actors=('provider',)),
+    'cancel': Transition(
+        'cancel', sources=('accepted',), target='cancelled', actors=('requester', 'provider'),
+        balance=BalanceEffect('payer', +1, 'refund'), jobs='cancel', save_sources=('accepted',),
+    ),
+    # Waiting proposals whose date has passed (see services/expiry.py); nothing was charged yet
+    'expire': Transition('expire', sources=('waiting',), target='cancelled', actors=(), bulk=False),
+    # Each party approves separately through the proposal update; there is no bulk completion
+    'complete': Transition(
+        'complete', sources=('accepted',), target='completed', actors=('requester', 'provider'),
+        balance=BalanceEffect('payee', +1, 'payout', per_job=True), jobs='complete',
+        requires_approvals=True, bulk=False,
+    ),
+}
+
+PAID_POST_TYPES = ('offer', 'need')
+
+
+# Timing metrics, per transition and process
+
+_metrics: Dict[str, Dict[str, float]] = {}
+_metrics_lock = threading.Lock()
+
+
+@contextmanager
+def timed(name: str):
+    """Record how long the block takes under name (also when it raises)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _metrics_lock:
+            entry = _metrics.setdefault(name, {'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0})
+            entry['count'] += 1
+            entry['total_seconds'] += elapsed
+            entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+
+
+def get_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Timings of transitions applied by this process since start (or reset_metrics).
+
+    Returns:
+        {name: {'count', 'total_seconds', 'max_seconds', 'avg_seconds'}}; bulk
+        runs are recorded as '<transition>:bulk'
+    """
+    with _metrics_lock:
+        return {
+            name: dict(entry, avg_seconds=entry['total_seconds'] / entry['count'])
+            for name, entry in _metrics.items()
+        }
+
+
+def reset_metrics():
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# Single proposal: run by Proposal.save()
+
+def transitions_for_save(proposal, previous_status: Optional[str]) -> List[Transition]:
+    """Transitions whose effects a save of proposal (previously in previous_status) must run, in order"""
+    return [transition for transition in TRANSITIONS.values() if transition.fires_on_save(proposal, previous_status)]
+
+
+def _party_id(proposal, party: str) -> int:
+    return ledger.payer_id(proposal) if party == 'payer' else ledger.payee_id(proposal)
+
+
+def _moves(transition: Transition, proposal, job_ids: Iterable[Optional[int]]) -> List[ledger.Move]:
+    effect = transition.balance
+    if effect is None or proposal.post.post_type not in PAID_POST_TYPES:
+        return []
+    user_id = _party_id(proposal, effect.party)
+    return [
+        ledger.Move(
+            user_id, effect.sign * Decimal(proposal.timebank_hour), effect.reason,
+            proposal_id=proposal.pk, job_id=job_id,
+            counterparty_id=ledger.other_party_id(proposal, user_id),
+        )
+        for job_id in job_ids
+    ]
+
+
+def apply_effects(transition: Transition, proposal, is_new: bool = False, actor=None):
+    """
+    Run the side effects of one proposal's transition (its status is already written).
+
+    Must be called inside the transaction that wrote the status.
+
+    Args:
+        transition: The transition being applied
+        proposal: Proposal instance, status already saved
+        is_new: The proposal was inserted by this save (it cannot have jobs yet)
+        actor: User applying it, recorded on cancelled jobs
+    """
+    from ..models import Job
+
+    job_ids = [None]
+    if transition.jobs == 'open':
+        # Only one waiting job per proposal
+        if is_new or not proposal.jobs.filter(status='waiting').exists():
+            Job.objects.create(
+                post_id=proposal.post_id,
+                proposal=proposal,
+                requester_id=proposal.requester_id,
+                provider_id=proposal.provider_id,
+                timebank_hour=proposal.timebank_hour,
+                status='waiting',
+                date=proposal.proposed_date
+            )
+    elif transition.jobs == 'cancel':
+        proposal.jobs.filter(status='waiting').update(status='cancelled', cancelled_by=actor, updated_at=timezone.now())
+    elif transition.jobs == 'complete':
+        job_ids = list(proposal.jobs.filter(status='waiting').values_list('pk', flat=True))
+        if not job_ids:
+            return
+        Job.objects.filter(pk__in=job_ids).update(status='completed', updated_at=timezone.now())
+    if transition.balance is not None and not transition.balance.per_job:
+        job_ids = [None]
+    ledger.post_moves(_moves(transition, proposal, job_ids))
+
+
+# Many proposals: one transaction, set-based writes
+
+def apply_bulk(transition: Transition, condition: Q, actor=None) -> List:
+    """
+    Apply transition, in one transaction, to the proposals matching condition.
+
+    Only proposals in one of the transition's source statuses are changed. The
+    status change is one UPDATE, jobs are created or closed with one
+    statement, and all balance moves and pending count changes are one
+    call each. If any payer
+    cannot cover the hours nothing is applied and ValidationError is raised.
+    Callers bound condition (e.g. pk__in a batch).
+
+    Args:
+        transition: The transition to apply
+        condition: Q filter selecting the proposals
+        actor: User applying it (None for system sweeps), recorded on cancelled jobs
+
+    Returns:
+        The changed proposals (with their previous status), in id order
+    """
+    from ..models import Job, PendingApprovalCount, Proposal
+
+    label = f'{transition.name}:bulk'
+    with timed(label), transaction.atomic():
+        proposals = list(
+            Proposal.objects.select_for_update(of=('self',))
+            .filter(condition, status__in=transition.sources)
+            .select_related('post')
+            .only('status', 'requester', 'provider', 'timebank_hour', 'proposed_date', 'post__post_type')
+            .order_by('pk')
+        )
+        pks = [proposal.pk for proposal in proposals]
+        if not pks:
+            return []
+        now = timezone.now()
+        updated = Proposal.objects.filter(pk__in=pks, status__in=transition.sources).update(
+            status=transition.target, updated_at=now
+        )
+        if updated != len(pks):
+            raise ValidationError("Some proposals were changed in the meantime. Reload them and try again.")
+        if transition.jobs == 'open':
+            with_job = set(
+                Job.objects.filter(proposal_id__in=pks, status='waiting').values_list('proposal_id', flat=True)
+            )
+            Job.objects.bulk_create([
+                Job(post_id=proposal.post_id, proposal_id=proposal.pk, requester_id=proposal.requester_id,
+                    provider_id=proposal.provider_id, timebank_hour=proposal.timebank_hour,
+                    status='waiting', date=proposal.proposed_date)
+                for proposal in proposals if proposal.pk not in with_job
+            ])
+        elif transition.jobs == 'cancel':
+            Job.objects.filter(proposal_id__in=pks, status='waiting').update(
+                status='cancelled', cancelled_by=actor, updated_at=now
+            )
+        ledger.post_moves([move for proposal in proposals for move in _moves(transition, proposal, [None])])
+        PendingApprovalCount.apply_deltas(pending_deltas(
+            (proposal.requester_id, proposal.provider_id, proposal.status, transition.target) for proposal in proposals
+        ))
+
+    # update() skips post_save: notify both parties as the Proposal signals do
+    for proposal in proposals:
+        data = {
+            'proposal_id': proposal.pk,
+            'post_id': proposal.post_id,
+            'status': transition.target,
+            'previous_status': proposal.status,
+        }
+        for user_id in {proposal.requester_id, proposal.provider_id}:
+            publish_event(user_id, 'proposal', data)
+            bump_version(user_id)
+    return proposals
+
+
+def bulk_transition(name: str, proposal_ids: Iterable[int], actor) -> Dict:
+    """
+    Apply one transition to many proposals on behalf of a user (see apply_bulk).
+
+    Proposals not in a source status of the transition, or on which actor is
+    not an allowed party, are skipped.
+
+    Args:
+        name: Transition name (a key of TRANSITIONS)
+        proposal_ids: Proposals to change, at most MAX_BULK_SIZE
+        actor: The requesting user
+
+    Returns:
+        Dictionary with 'updated' and 'skipped' proposal id lists and 'duration_ms'
+    """
+    transition = TRANSITIONS.get(name)
+    if transition is None or not transition.bulk:
+        raise ValidationError(f"Unknown transition '{name}'.")
+    proposal_ids = list(dict.fromkeys(int(pk) for pk in proposal_ids))
+    if len(proposal_ids) > MAX_BULK_SIZE:
+        raise ValidationError(f"At most {MAX_BULK_SIZE} proposals can be changed at once.")
+
+    allowed = Q()
+    for role in transition.actors:
+        allowed |= Q(**{role: actor})
+    start = time.perf_counter()
+    updated = {proposal.pk for proposal in apply_bulk(transition, allowed & Q(pk__in=proposal_ids), actor)}
+    return {
+        'updated': [pk for pk in proposal_ids if pk in updated],
+        'skipped': [pk for pk in proposal_ids if pk not in updated],
+        'duration_ms': round((time.perf_counter() - start) * 1000, 2),
+    }
+
+
+def decline_job(proposal, actor, cancellation_reason: str = 'other'):
+    """
+    Cancel the waiting job of an accepted proposal at the approval stage; the proposal stays accepted.
+
+    'not_showed_up' pays the hours to the other party (as if completed);
+    'other' refunds them to the original payer. The conditional update lets
+    only one of two concurrent declines through, so hours move once.
+
+    Args:
+        proposal: Proposal whose waiting job is declined
+        actor: User declining, recorded as cancelled_by
+        cancellation_reason: 'not_showed_up' or 'other'
+
+    Returns:
+        The cancelled Job, or None if there was no waiting job
+    """
+    from ..models import Job
+
+    with timed('decline_job'), transaction.atomic():
+        job = proposal.jobs.filter(status='waiting').first()
+        cancelled = job and Job.objects.filter(pk=job.pk, status='waiting').update(
+            status='cancelled',
+            cancelled_by=actor,
+            cancellation_reason=cancellation_reason,
+            updated_at=timezone.now(),
+        )
+        if not cancelled:
+            return None
+        if proposal.post.post_type in PAID_POST_TYPES:
+            if cancellation_reason == 'not_showed_up':
+                user_id, reason = ledger.payee_id(proposal), 'no_show'
+            else:
+                user_id, reason = ledger.payer_id(proposal), 'refund'
+            ledger.credit(user_id, proposal.timebank_hour, reason, proposal=proposal, job=job,
+                          counterparty_id=ledger.other_party_id(proposal, user_id))
+    return job
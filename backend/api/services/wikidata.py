@@ -1,141 +1,344 @@
+import hashlib
 import requests
 import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from django.conf import settings
 from django.core.cache import cache
-from typing import List, Dict, Optional
+from requests.adapters import HTTPAdapter
+from typing import Callable, Iterable, List, Dict, Optional
+
+from .wikidata_mirror import mirror_entities, search_mirror
 
 logger = logging.getLogger(__name__)
 
 CACHE_TIMEOUT = 3600  # 1 hour in seconds
+NEGATIVE_CACHE_TIMEOUT = 60  # Empty results and failures are retried after a minute
+STALE_CACHE_TIMEOUT = 7 * 24 * 3600  # Last good answer, served while Wikidata is unavailable
+REQUEST_TIMEOUT = 10
+COALESCED_WAIT_SECONDS = REQUEST_TIMEOUT * 2  # How long a coalesced caller waits for the leading call
+SLOW_REQUEST_SECONDS = 3  # Successful but slower responses still count against the circuit breaker
+BREAKER_FAILURES = 3
+BREAKER_OPEN_SECONDS = 30
+MAX_IDS_PER_REQUEST = 50  # wbgetentities limit for anonymous clients
+
+# Wikidata API requires User-Agent header
+HEADERS = {
+    'User-Agent': 'TheHive/1.0 (https://thehive.example.com; contact@example.com)'
+}
+
+
+class WikidataUnavailable(Exception):
+    """The API failed, timed out or is skipped because the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Stops calling Wikidata after repeated failures so requests do not each wait for a timeout.
+
+    Closed: calls go through. After failure_threshold consecutive failures it opens
+    and rejects calls for reset_timeout seconds, then lets a single trial call
+    through (half-open): success closes it, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_OPEN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_running or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.reset()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Wikidata circuit breaker opened")
+                self.opened_at = time.monotonic()
+                self.trial_running = False
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one; the other callers wait for its result"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+
+    def do(self, key: str, func: Callable):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(timeout=COALESCED_WAIT_SECONDS)
+        try:
+            result = func()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+
+breaker = CircuitBreaker()
+_in_flight = SingleFlight()
+
+# One pooled session: batches and searches reuse kept-alive HTTPS connections
+_session = requests.Session()
+_session.headers.update(HEADERS)
+_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=10))
+_session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=10))
+
+
+def _api_get(params: Dict) -> Dict:
+    """GET the Wikidata API through the circuit breaker"""
+    if not breaker.allow():
+        raise WikidataUnavailable("circuit breaker open")
+    started = time.monotonic()
+    try:
+        response = _session.get(settings.WIKIDATA_API_URL, params=params, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+    except (requests.exceptions.RequestException, ValueError) as e:
+        breaker.record_failure()
+        raise WikidataUnavailable(str(e)) from e
+    if time.monotonic() - started > SLOW_REQUEST_SECONDS:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return data
+
+
+def _cached_lookup(cache_key: str, fetch: Callable, empty):
+    """
+    Cache-aside lookup shared by the public functions.
+
+    Misses are fetched once per key at a time (single flight). Good answers are
+    cached for CACHE_TIMEOUT and kept as a stale copy; empty answers are cached
+    for NEGATIVE_CACHE_TIMEOUT. When the API fails, the stale copy (or the empty
+    value) is served and cached briefly so the failure is not retried per request.
+
+    Args:
+        cache_key: Cache key of the answer
+        fetch: Performs the API call, may raise WikidataUnavailable
+        empty: Value meaning "nothing found"
+    """
+    cached_result = cache.get(cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    def fallback(error, remember=True):
+        result = cache.get(f'{cache_key}_stale')
+        logger.error(f"Wikidata unavailable for {cache_key} ({error}); serving {'stale' if result is not None else 'empty'} result")
+        if result is None:
+            result = empty
+        if remember:
+            cache.set(cache_key, result, NEGATIVE_CACHE_TIMEOUT)
+        return result
+
+    def refresh():
+        # A concurrent caller may have filled the cache while this one waited
+        cached_result = cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
+        try:
+            result = fetch()
+        except WikidataUnavailable as e:
+            return fallback(e)
+        except Exception as e:
+            # Unexpected response shape: counts against the breaker like a failed call
+            breaker.record_failure()
+            return fallback(e)
+        if result == empty:
+            cache.set(cache_key, result, NEGATIVE_CACHE_TIMEOUT)
+        else:
+            cache.set(cache_key, result, CACHE_TIMEOUT)
+            cache.set(f'{cache_key}_stale', result, STALE_CACHE_TIMEOUT)
+        return result
+
+    try:
+        return _in_flight.do(cache_key, refresh)
+    except FutureTimeoutError:
+        # The leading call is still running; give up like a timed out request and leave caching to it
+        breaker.record_failure()
+        return fallback('timed out waiting for the coalesced call', remember=False)
+
+
+def search_cache_key(query: str) -> str:
+    """Cache key of a search; hashed because user text may contain spaces or other characters memcached rejects"""
+    return 'wikidata_search_' + hashlib.md5(query.strip().lower().encode()).hexdigest()
+
 
 def search_wikidata(query: str) -> List[Dict]:
     """
     Search Wikidata for entities matching the query.
-    Results are cached for 1 hour to improve performance.
-    
+    The local label mirror (WikidataLabel) is searched first; the live API is
+    only asked when the mirror has nothing and WIKIDATA_LIVE_API is on.
+    API results are cached for 1 hour to improve performance; empty results
+    and failures for a minute.
+
     Args:
         query: Search query string
-        
+
     Returns:
         List of dictionaries with 'label', 'id', and 'description' keys
     """
     if not query or len(query.strip()) < 2:
         return []
-    
+
     query = query.strip()
-    cache_key = f'wikidata_search_{query.lower()}'
-    
-    # Check cache first
-    cached_result = cache.get(cache_key)
-    if cached_result is not None:
-        logger.info(f"Cache hit for Wikidata search: {query}")
-        return cached_result
-    
-    try:
-        url = "https://www.wikidata.org/w/api.php"
-        params = {
+    if settings.WIKIDATA_MIRROR:
+        results = search_mirror(query)
+        if results or not settings.WIKIDATA_LIVE_API:
+            return results
+    elif not settings.WIKIDATA_LIVE_API:
+        return []
+
+    def fetch():
+        data = _api_get({
             'action': 'wbsearchentities',
             'language': 'en',
             'format': 'json',
             'search': query,
             'limit': 10,  # Limit results to 10
-        }
-        
-        # Wikidata API requires User-Agent header
-        headers = {
-            'User-Agent': 'TheHive/1.0 (https://thehive.example.com; contact@example.com)'
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
+        })
         results = []
-        
-        if 'search' in data:
-            for item in data['search']:
-                result = {
-                    'label': item.get('label', ''),
-                    'id': item.get('id', ''),  # Q identifier (e.g., Q42)
-                    'description': item.get('description', ''),
-                }
-                # Only add if we have a label and ID
-                if result['label'] and result['id']:
-                    results.append(result)
-        
-        # Cache the results
-        cache.set(cache_key, results, CACHE_TIMEOUT)
-        logger.info(f"Cached Wikidata search results for: {query}")
-        
+        for item in data.get('search', []):
+            result = {
+                'label': item.get('label', ''),
+                'id': item.get('id', ''),  # Q identifier (e.g., Q42)
+                'description': item.get('description', ''),
+            }
+            # Only add if we have a label and ID
+            if result['label'] and result['id']:
+                results.append(result)
         return results
-        
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching from Wikidata API: {e}")
-        return []
+
+    try:
+        return _cached_lookup(search_cache_key(query), fetch, [])
     except Exception as e:
-        logger.error(f"Unexpected error in search_wikidata: {e}")
+        # Search degrades to no suggestions, never to an error response
+        breaker.record_failure()
+        logger.error(f"Wikidata search failed for {query!r}: {e}")
         return []
 
+
 def get_wikidata_entity(wikidata_id: str) -> Optional[Dict]:
     """
     Get entity details from Wikidata by Q ID.
-    
+
     Args:
         wikidata_id: Wikidata Q identifier (e.g., 'Q17' for Japan)
-        
+
     Returns:
         Dictionary with 'label' and 'description' keys, or None if not found
     """
     if not wikidata_id or not wikidata_id.startswith('Q'):
         return None
-    
-    cache_key = f'wikidata_entity_{wikidata_id}'
-    
-    # Check cache first
-    cached_result = cache.get(cache_key)
-    if cached_result is not None:
-        logger.info(f"Cache hit for Wikidata entity: {wikidata_id}")
-        return cached_result
-    
-    try:
-        url = "https://www.wikidata.org/w/api.php"
-        params = {
+    if settings.WIKIDATA_MIRROR:
+        entity = mirror_entities([wikidata_id]).get(wikidata_id)
+        if entity is not None:
+            return entity
+    if not settings.WIKIDATA_LIVE_API:
+        return None
+
+    def fetch():
+        data = _api_get({
             'action': 'wbgetentities',
             'ids': wikidata_id,
             'languages': 'en',
             'format': 'json',
             'props': 'labels|descriptions'
-        }
-        
-        headers = {
-            'User-Agent': 'TheHive/1.0 (https://thehive.example.com; contact@example.com)'
-        }
-        response = requests.get(url, params=params, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if 'entities' in data and wikidata_id in data['entities']:
-            entity = data['entities'][wikidata_id]
-            label = entity.get('labels', {}).get('en', {}).get('value', wikidata_id)
-            description = entity.get('descriptions', {}).get('en', {}).get('value', '')
-            
-            result = {
-                'label': label,
-                'description': description,
-                'id': wikidata_id
-            }
-            
-            # Cache the result
-            cache.set(cache_key, result, CACHE_TIMEOUT)
-            logger.info(f"Cached Wikidata entity: {wikidata_id}")
-            
-            return result
-        
-        return None
-        
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching entity from Wikidata API: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected error in get_wikidata_entity: {e}")
-        return None
+        })
+        return _parse_entity(wikidata_id, data.get('entities', {}).get(wikidata_id))
+
+    # Unknown entities are cached as False (None means "not cached")
+    return _cached_lookup(_entity_cache_key(wikidata_id), fetch, False) or None
+
+
+def _entity_cache_key(wikidata_id: str) -> str:
+    return f'wikidata_entity_{wikidata_id}'
+
+
+def _parse_entity(wikidata_id: str, entity: Optional[Dict]):
+    """Label/description dict of a wbgetentities entity, or False if it does not exist"""
+    if not entity or 'missing' in entity:
+        return False
+    return {
+        'label': entity.get('labels', {}).get('en', {}).get('value', wikidata_id),
+        'description': entity.get('descriptions', {}).get('en', {}).get('value', ''),
+        'id': wikidata_id
+    }
+
+
+def get_wikidata_entities(wikidata_ids: Iterable[str]) -> Dict[str, Dict]:
+    """
+    Get several entities at once: from the local mirror, then the cache, the rest
+    with one wbgetentities call per MAX_IDS_PER_REQUEST ids. Fetched entities warm the same
+    per-entity cache entries get_wikidata_entity uses.
+
+    Args:
+        wikidata_ids: Wikidata Q identifiers (invalid ones are ignored)
+
+    Returns:
+        Dict mapping each found Q identifier to its 'label', 'description' and 'id'
+    """
+    ids = list(dict.fromkeys(wid for wid in wikidata_ids if wid and wid.startswith('Q')))
+    entities = mirror_entities(ids) if settings.WIKIDATA_MIRROR else {}
+    remote_ids = [wid for wid in ids if wid not in entities] if settings.WIKIDATA_LIVE_API else []
+    cached = cache.get_many([_entity_cache_key(wid) for wid in remote_ids])
+    missing = []
+    for wid in remote_ids:
+        value = cached.get(_entity_cache_key(wid))
+        if value is None:
+            missing.append(wid)
+        elif value:
+            entities[wid] = value
+
+    for start in range(0, len(missing), MAX_IDS_PER_REQUEST):
+        batch = missing[start:start + MAX_IDS_PER_REQUEST]
+        try:
+            data = _api_get({
+                'action': 'wbgetentities',
+                'ids': '|'.join(batch),
+                'languages': 'en',
+                'format': 'json',
+                'props': 'labels|descriptions'
+            })
+        except WikidataUnavailable as e:
+            stale = cache.get_many([f'{_entity_cache_key(wid)}_stale' for wid in batch])
+            logger.error(f"Wikidata unavailable for {len(batch)} entities ({e}); serving {len(stale)} stale")
+            results = {wid: stale.get(f'{_entity_cache_key(wid)}_stale', False) for wid in batch}
+            cache.set_many({_entity_cache_key(wid): value for wid, value in results.items()}, NEGATIVE_CACHE_TIMEOUT)
+        else:
+            results = {wid: _parse_entity(wid, data.get('entities', {}).get(wid)) for wid in batch}
+            found = {_entity_cache_key(wid): value for wid, value in results.items() if value}
+            cache.set_many(found, CACHE_TIMEOUT)
+            cache.set_many({f'{key}_stale': value for key, value in found.items()}, STALE_CACHE_TIMEOUT)
+            cache.set_many({_entity_cache_key(wid): False for wid, value in results.items() if not value}, NEGATIVE_CACHE_TIMEOUT)
+        entities.update({wid: value for wid, value in results.items() if value})
 
+    return {wid: entities[wid] for wid in ids if wid in entities}
@@ -0,0 +1,135 @@
+import bz2
+import gzip
+import json
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from django.db.models import Case, IntegerField, Value, When
+
+from .tag_index import fold
+
+SEARCH_LIMIT = 10
+LABEL_MAX_LENGTH = 250
+
+
+def open_dump(path: str):
+    """Open a dump for line-by-line text reading; .bz2 and .gz files are decompressed as they stream"""
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def parse_dump_line(line: str, language: str = 'en') -> Optional[Dict]:
+    """
+    One mirror row from a dump line, or None for lines without a usable label.
+
+    Accepts both the official JSON dump (one entity per line inside a JSON
+    array, lines ending with a comma) and JSON lines of
+    {"id", "label", "description", "sitelinks"} records.
+    """
+    line = line.strip().rstrip(',')
+    if not line or line in ('[', ']'):
+        return None
+    try:
+        item = json.loads(line)
+    except ValueError:
+        return None
+    wikidata_id = item.get('id', '')
+    if not isinstance(wikidata_id, str) or not wikidata_id.startswith('Q'):
+        return None
+    if 'labels' in item:
+        label = item.get('labels', {}).get(language, {}).get('value', '')
+        description = item.get('descriptions', {}).get(language, {}).get('value', '')
+        sitelinks = len(item.get('sitelinks') or {})
+    else:
+        label = item.get('label') or ''
+        description = item.get('description') or ''
+        sitelinks = item.get('sitelinks') or 0
+    if not label:
+        return None
+    label = label[:LABEL_MAX_LENGTH]
+    return {
+        'wikidata_id': wikidata_id,
+        'label': label,
+        'search_label': fold(label)[:LABEL_MAX_LENGTH],
+        'description': description,
+        'sitelinks': int(sitelinks),
+    }
+
+
+def import_labels(lines: Iterable[str], language: str = 'en', batch_size: int = 5000) -> int:
+    """
+    Upsert mirror rows from dump lines in batches, so memory stays constant for any dump size.
+
+    Args:
+        lines: Dump lines (a file object streams them)
+        language: Label language to keep
+        batch_size: Rows per upsert
+
+    Returns:
+        Number of rows written
+    """
+    written = 0
+    for batch in _batches(filter(None, (parse_dump_line(line, language) for line in lines)), batch_size):
+        _upsert(batch)
+        written += len(batch)
+    return written
+
+
+def _batches(rows: Iterator[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _upsert(rows: List[Dict]):
+    from ..models import WikidataLabel
+
+    # Dumps may repeat an entity; the last line wins (one row per id per statement)
+    rows = {row['wikidata_id']: row for row in rows}
+    WikidataLabel.objects.bulk_create(
+        [WikidataLabel(**row) for row in rows.values()],
+        update_conflicts=True,
+        unique_fields=['wikidata_id'],
+        update_fields=['label', 'search_label', 'description', 'sitelinks'],
+    )
+
+
+def search_mirror(query: str, limit: int = SEARCH_LIMIT) -> List[Dict]:
+    """
+    Mirror entities whose label starts with the query (case and accent insensitive).
+
+    A range scan on the indexed search_label; exact matches come first, then
+    entities with more Wikipedia articles.
+
+    Returns:
+        List of dictionaries with 'label', 'id', and 'description' keys, like search_wikidata
+    """
+    from ..models import WikidataLabel
+
+    prefix = fold(query)
+    if not prefix:
+        return []
+    rows = WikidataLabel.objects.filter(
+        search_label__gte=prefix, search_label__lt=prefix + '\U0010ffff'
+    ).annotate(
+        exact=Case(When(search_label=prefix, then=Value(1)), default=Value(0), output_field=IntegerField())
+    ).order_by('-exact', '-sitelinks', 'search_label')[:limit]
+    return [{'label': row.label, 'id': row.wikidata_id, 'description': row.description} for row in rows]
+
+
+def mirror_entities(wikidata_ids: Iterable[str]) -> Dict[str, Dict]:
+    """Mirror entries for some ids, in the get_wikidata_entities format"""
+    from ..models import WikidataLabel
+
+    rows = WikidataLabel.objects.in_bulk(list(wikidata_ids), field_name='wikidata_id')
+    return {
+        wid: {'label': row.label, 'description': row.description, 'id': wid}
+        for wid, row in rows.items()
+    }
@@ -0,0 +1,158 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .models import ForumTopic, Message, Post, Profile, Proposal, Tag
+from .services.events import publish_event
+from .services.notifications import bump_version
+from .services.search import index_posts, remove_posts
+from .services import tag_index
+
+
+@receiver(post_save, sender=Message)
+def publish_new_message(sender, instance, created, **kwargs):
+    """Push new chat messages to the recipient's open streams"""
+    if not created:
+        return
+    content = instance.content
+    publish_event(instance.recipient_id, 'message', {
+        'chat_id': instance.chat_id,
+        'message_id': instance.id,
+        'sender_id': instance.sender_id,
+        'content': content[:200] + '...' if len(content) > 200 else content,
+        'created_at': instance.created_at.isoformat(),
+    })
+
+
+@receiver(post_save, sender=Proposal)
+def publish_proposal_status(sender, instance, created, **kwargs):
+    """Push proposal status changes to both parties"""
+    previous_status = getattr(instance, '_previous_status', None)
+    if not created and previous_status == instance.status:
+        return
+    data = {
+        'proposal_id': instance.id,
+        'post_id': instance.post_id,
+        'status': instance.status,
+        'previous_status': previous_status,
+    }
+    for user_id in {instance.requester_id, instance.provider_id}:
+        publish_event(user_id, 'proposal', data)
+
+
+@receiver(post_save, sender=Profile)
+def publish_balance(sender, instance, update_fields=None, **kwargs):
+    """Push the current time balance whenever it may have changed"""
+    if update_fields is not None and 'time_balance' not in update_fields:
+        return
+    publish_event(instance.user_id, 'balance', {'time_balance': str(instance.time_balance)})
+
+
+# Notification summary versions (ETag of /api/notifications/summary/)
+
+@receiver(post_save, sender=Message)
+def bump_message_versions(sender, instance, created, **kwargs):
+    """A new message changes the recipient's unread count"""
+    if created:
+        bump_version(instance.recipient_id)
+
+
+@receiver(post_save, sender=Proposal)
+def bump_proposal_versions(sender, instance, created, **kwargs):
+    """New proposals and status changes affect both parties' pending counts"""
+    if created or getattr(instance, '_previous_status', None) != instance.status:
+        for user_id in {instance.requester_id, instance.provider_id}:
+            bump_version(user_id)
+
+
+@receiver(post_delete, sender=Proposal)
+def bump_deleted_proposal_versions(sender, instance, **kwargs):
+    """Deleted proposals drop out of both parties' pending counts"""
+    for user_id in {instance.requester_id, instance.provider_id}:
+        bump_version(user_id)
+
+
+@receiver(post_save, sender=Profile)
+def bump_profile_version(sender, instance, update_fields=None, **kwargs):
+    """Balance changes are part of the notification summary"""
+    if update_fields is None or 'time_balance' in update_fields:
+        bump_version(instance.user_id)
+
+
+# Full-text search index (see services/search.py)
+
+SEARCHED_POST_FIELDS = {'title', 'description'}
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, created, update_fields=None, **kwargs):
+    """Re-index a post when its title or description may have changed"""
+    if created or update_fields is None or SEARCHED_POST_FIELDS & set(update_fields):
+        index_posts([instance.pk])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    remove_posts([instance.pk])
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def index_post_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    """Tag names are searchable, so re-index posts whose tags change"""
+    if action == 'pre_clear' and reverse:
+        # The affected posts are gone from the relation by post_clear
+        instance._search_cleared_post_ids = list(instance.post_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            index_posts([instance.pk])
+        elif action == 'post_clear':
+            index_posts(getattr(instance, '_search_cleared_post_ids', []))
+        else:
+            index_posts(pk_set or [])
+
+
+@receiver(pre_save, sender=Tag)
+def remember_tag_name(sender, instance, **kwargs):
+    instance._search_renamed = bool(instance.pk) and not Tag.objects.filter(pk=instance.pk, name=instance.name).exists()
+
+
+@receiver(post_save, sender=Tag)
+def index_renamed_tag(sender, instance, created, **kwargs):
+    """Renaming a tag changes the indexed text of every post using it"""
+    if not created and getattr(instance, '_search_renamed', False):
+        index_posts(instance.post_set.values_list('pk', flat=True))
+
+
+# Tag autocomplete index (see services/tag_index.py)
+
+@receiver(post_save, sender=Tag)
+def index_saved_tag(sender, instance, created, **kwargs):
+    tag_index.tag_saved(instance, created=created)
+
+
+@receiver(post_delete, sender=Tag)
+def unindex_deleted_tag(sender, instance, **kwargs):
+    tag_index.tag_deleted(instance.pk)
+
+
+def count_tag_usage(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep tag popularity current as posts, forum topics and profiles gain or lose tags"""
+    if action == 'pre_clear':
+        # The cleared rows are gone by post_clear
+        if reverse:
+            instance._tag_usage_cleared = {instance.pk: sender.objects.filter(tag_id=instance.pk).count()}
+        else:
+            source = f'{instance._meta.model_name}_id'
+            instance._tag_usage_cleared = {tag_id: 1 for tag_id in sender.objects.filter(**{source: instance.pk}).values_list('tag_id', flat=True)}
+    elif action == 'post_clear':
+        for tag_id, uses in getattr(instance, '_tag_usage_cleared', {}).items():
+            tag_index.tags_used([tag_id], -uses)
+    elif action in ('post_add', 'post_remove') and pk_set:
+        delta = 1 if action == 'post_add' else -1
+        if reverse:
+            tag_index.tags_used([instance.pk], delta * len(pk_set))
+        else:
+            tag_index.tags_used(pk_set, delta)
+
+
+for tag_relation in (Post.tags, ForumTopic.semantic_tags, Profile.interested_tags):
+    m2m_changed.connect(count_tag_usage, sender=tag_relation.through, dispatch_uid=f'count_tag_usage_{tag_relation.through.__name__}')
@@ -0,0 +1,129 @@
+"""
+Tests for realtime events (broker, publishing receivers and the SSE stream)
+"""
+import asyncio
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from api.models import Chat, Message, Post, Proposal
+from api.services.events import InMemoryEventBroker, get_broker
+
+
+class InMemoryEventBrokerTest(TestCase):
+    """Test the in-process broker"""
+    
+    async def test_publish_reaches_only_that_users_subscriptions(self):
+        """Test events are delivered to the target user's subscribers only"""
+        broker = InMemoryEventBroker()
+        alice = broker.subscribe(1)
+        bob = broker.subscribe(2)
+        
+        broker.publish(1, 'message', {'chat_id': 7})
+        
+        event = await alice.get(timeout=1)
+        self.assertEqual(event['type'], 'message')
+        self.assertEqual(event['data'], {'chat_id': 7})
+        self.assertIsNone(await bob.get(timeout=0.05))
+    
+    async def test_unsubscribe_stops_delivery(self):
+        """Test closed subscriptions no longer receive events"""
+        broker = InMemoryEventBroker()
+        subscription = broker.subscribe(1)
+        subscription.close()
+        broker.publish(1, 'balance', {'time_balance': '1.00'})
+        self.assertIsNone(await subscription.get(timeout=0.05))
+
+
+class EventPublishingTest(TestCase):
+    """Test model writes publish events after commit"""
+    
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='user1', password='pass123')
+        self.user2 = User.objects.create_user(username='user2', password='pass123')
+    
+    def _published(self, func):
+        """Run func and return the (user_id, event_type, data) events it published"""
+        with mock.patch.object(get_broker(), 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                func()
+        return [call.args for call in publish.call_args_list]
+    
+    def test_new_message_event_goes_to_recipient(self):
+        """Test a new chat message is pushed to the other participant"""
+        chat = Chat.objects.create(participant1=self.user1, participant2=self.user2)
+        events = self._published(lambda: Message.objects.create(chat=chat, sender=self.user1, content='Hi'))
+        self.assertEqual(len(events), 1)
+        user_id, event_type, data = events[0]
+        self.assertEqual((user_id, event_type), (self.user2.id, 'message'))
+        self.assertEqual(data['content'], 'Hi')
+    
+    def test_proposal_status_change_event(self):
+        """Test a proposal status change is pushed to both parties"""
+        post = Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.user2,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour'
+        )
+        proposal = Proposal.objects.create(
+            post=post,
+            requester=self.user1,
+            provider=self.user2,
+            timebank_hour=Decimal('1.00'),
+            status='waiting'
+        )
+        self.user1.profile.time_balance = Decimal('2.00')
+        self.user1.profile.save()
+        
+        def accept():
+            proposal.status = 'accepted'
+            proposal.save()
+        
+        proposal_events = [event for event in self._published(accept) if event[1] == 'proposal']
+        self.assertEqual({event[0] for event in proposal_events}, {self.user1.id, self.user2.id})
+        self.assertEqual(proposal_events[0][2]['previous_status'], 'waiting')
+        self.assertEqual(proposal_events[0][2]['status'], 'accepted')
+        
+        # Saving without a status change publishes nothing for the proposal
+        self.assertFalse([event for event in self._published(proposal.save) if event[1] == 'proposal'])
+    
+    def test_balance_event(self):
+        """Test a time balance change is pushed to the profile owner"""
+        profile = self.user1.profile
+        profile.time_balance = Decimal('4.00')
+        events = self._published(profile.save)
+        self.assertEqual(events, [(self.user1.id, 'balance', {'time_balance': '4.00'})])
+
+
+class EventStreamViewTest(TestCase):
+    """Test the SSE endpoint"""
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='streamer', password='pass123')
+    
+    async def test_stream_requires_login(self):
+        """Test anonymous users cannot open a stream"""
+        response = await self.async_client.get(reverse('event-stream'))
+        self.assertEqual(response.status_code, 401)
+    
+    async def test_stream_delivers_published_events(self):
+        """Test a published event is written to the open stream in SSE format"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('event-stream'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        
+        chunks = response.streaming_content
+        self.assertTrue((await anext(chunks)).startswith(b'retry:'))
+        
+        get_broker().publish(self.user.id, 'balance', {'time_balance': '2.50'})
+        chunk = await asyncio.wait_for(anext(chunks), timeout=2)
+        self.assertIn(b'event: balance\n', chunk)
+        self.assertIn(b'data: {"time_balance": "2.50"}\n\n', chunk)
+        await chunks.aclose()
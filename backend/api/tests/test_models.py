@@ -1,12 +1,30 @@
 """
 Unit tests for models
 """
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase, override_settings
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
-from api.models import Profile, Tag, Post, Comment, Proposal, Review, Job, Chat, Message, ForumTopic, ForumComment
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from api.models import Profile, Tag, Post, Comment, Proposal, Review, Job, Chat, ChatReadState, Message, ForumTopic, ForumComment, PostGridCell, RatingSummary, LedgerEntry, BalanceSnapshot
+from api.services.clusters import MAX_CLUSTER_ZOOM, cluster_cell
+from api.services.geo import grid_cell
+from api.services import expiry, ledger
+from api.services.images import blob_path
+from api.services.sequences import get_sequence_backend, next_values
+from api.services.tags import resolve_tags
+from datetime import date, timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
 
 
 class ProfileModelTest(TestCase):
@@ -149,6 +167,25 @@ class TagModelTest(TestCase):
         self.assertEqual(tag1.tag_id, 1)
         self.assertEqual(tag2.tag_id, 2)
     
+    def test_tag_id_allocation(self):
+        """Test tag_ids come from the sequence in single values and blocks"""
+        with self.assertNumQueries(2):
+            tag = Tag.objects.create(name='First')
+        self.assertEqual(tag.tag_id, 1)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(next_values('tag_id', 3), [2, 3, 4])
+        self.assertEqual(Tag.objects.create(name='Second').tag_id, 5)
+        self.assertEqual(Tag.objects.create(name='Explicit', tag_id=50).tag_id, 50)
+        self.assertEqual(next_values('tag_id', 0), [])
+
+    def test_tag_id_sequence_reseeds_after_existing_tags(self):
+        """Test a missing counter starts after the highest tag_id"""
+        Tag.objects.create(name='Seeded', tag_id=40)
+        with connection.cursor() as cursor:
+            get_sequence_backend().uninstall(cursor, 'tag_id')
+        self.assertEqual(Tag.objects.create(name='After').tag_id, 41)
+
     def test_tag_unique_name(self):
         """Test tag name uniqueness"""
         Tag.objects.create(name='Unique Tag')
@@ -163,6 +200,43 @@ class TagModelTest(TestCase):
         )
         self.assertTrue(tag.is_custom)
 
+    def test_resolve_tags_in_bulk(self):
+        """Test tag payloads resolve with one query per group and keep input order"""
+        existing = [Tag.objects.create(name=f'Existing {i}') for i in range(5)]
+        items = [
+            {'name': 'New A'},
+            existing[0].id,
+            {'id': existing[1].id},
+            'Existing 2',
+            {'value': 'Existing 3'},
+            'New B',
+            {'name': 'New A'},
+            existing[0].id,
+            {'id': 999999},
+            {'id': 'not-a-number'},
+            True,
+            '   ',
+            {'name': 'New C', 'description': 'Third', 'is_custom': False},
+            {'id': existing[4].id},
+        ]
+        # ids, names, tag_id block, insert, read-back
+        with self.assertNumQueries(5):
+            tags = resolve_tags(items)
+
+        self.assertEqual(
+            [tag.name for tag in tags],
+            ['New A', 'Existing 0', 'Existing 1', 'Existing 2', 'Existing 3', 'New B', 'New C', 'Existing 4']
+        )
+        new_c = Tag.objects.get(name='New C')
+        self.assertEqual(new_c.description, 'Third')
+        self.assertFalse(new_c.is_custom)
+        self.assertTrue(Tag.objects.get(name='New A').is_custom)
+        new_ids = sorted(Tag.objects.filter(name__startswith='New').values_list('tag_id', flat=True))
+        self.assertEqual(new_ids, [6, 7, 8])
+
+        with self.assertNumQueries(2):
+            self.assertEqual(resolve_tags(['New A', existing[0].id]), [tags[0], existing[0]])
+
 
 class PostModelTest(TestCase):
     """Test Post model"""
@@ -229,6 +303,66 @@ class PostModelTest(TestCase):
         )
         self.assertEqual(post.latitude, 41.0082)
         self.assertEqual(post.longitude, 28.9784)
+    
+    def test_grid_cell_maintained_on_save(self):
+        """Test the spatial grid cell follows the coordinates"""
+        post = Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.user,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour',
+            latitude=41.0082,
+            longitude=28.9784
+        )
+        self.assertEqual(post.grid_cell, grid_cell(41.0082, 28.9784))
+        
+        post.latitude = 39.9334
+        post.longitude = 32.8597
+        post.save(update_fields=['latitude', 'longitude'])
+        post.refresh_from_db()
+        self.assertEqual(post.grid_cell, grid_cell(39.9334, 32.8597))
+        
+        post.latitude = None
+        post.save()
+        post.refresh_from_db()
+        self.assertIsNone(post.grid_cell)
+
+    def test_cluster_aggregates_follow_posts(self):
+        """Test map cluster cells track create, move, hide and delete, and match a rebuild"""
+        def cells(zoom):
+            return list(PostGridCell.objects.filter(zoom=zoom).order_by('cell').values_list('cell', 'post_count', 'offer_count', 'need_count'))
+        
+        offer = Post.objects.create(
+            title='Offer', description='d', posted_by=self.user, post_type='offer',
+            location='l', duration='1 hour', latitude=41.03, longitude=29.03
+        )
+        need = Post.objects.create(
+            title='Need', description='d', posted_by=self.user, post_type='need',
+            location='l', duration='1 hour', latitude=41.04, longitude=29.04
+        )
+        istanbul = cluster_cell(41.03, 29.03, 10)
+        self.assertEqual(cells(10), [(istanbul, 2, 1, 1)])
+        cell = PostGridCell.objects.get(zoom=10, cell=istanbul)
+        self.assertAlmostEqual(cell.latitude_sum / cell.post_count, 41.035)
+        
+        need = Post.objects.get(pk=need.pk)
+        need.latitude, need.longitude = 39.93, 32.86
+        need.save()
+        self.assertEqual(cells(10), sorted([(istanbul, 1, 1, 0), (cluster_cell(39.93, 32.86, 10), 1, 0, 1)]))
+        
+        offer.is_hidden = True
+        offer.save()
+        self.assertEqual(cells(10), [(cluster_cell(39.93, 32.86, 10), 1, 0, 1)])
+        self.assertEqual(cells(0), [(cluster_cell(39.93, 32.86, 0), 1, 0, 1)])
+        
+        incremental = {zoom: cells(zoom) for zoom in range(MAX_CLUSTER_ZOOM + 1)}
+        call_command('rebuild_post_clusters', stdout=StringIO())
+        self.assertEqual({zoom: cells(zoom) for zoom in range(MAX_CLUSTER_ZOOM + 1)}, incremental)
+        
+        Post.objects.filter(pk=need.pk).delete()
+        self.assertFalse(PostGridCell.objects.exists())
 
 
 class ProposalModelTest(TestCase):
@@ -386,6 +520,316 @@ class ProposalModelTest(TestCase):
         self.assertEqual(self.provider.profile.time_balance, Decimal('7.00'))
 
 
+    def test_transition_query_counts(self):
+        """Test each status transition runs only its own writes"""
+        proposal = Proposal.objects.create(
+            post=self.post,
+            requester=self.requester,
+            provider=self.provider,
+            timebank_hour=Decimal('2.00'),
+            status='waiting'
+        )
+        proposal = Proposal.objects.select_related('post').get(pk=proposal.pk)
+        
+        # Guarded proposal update, balance update + journal entry + read-back,
+        # waiting job check, job insert, pending counts update, savepoint pair
+        proposal.status = 'accepted'
+        with self.assertNumQueries(9):
+            proposal.save()
+        
+        # No status change: the proposal update alone
+        proposal.provider_approved = True
+        with self.assertNumQueries(1):
+            proposal.save()
+        
+        # Guarded proposal update, waiting jobs read + update, payout (3), savepoint pair
+        proposal.requester_approved = True
+        with self.assertNumQueries(8):
+            proposal.save()
+        self.assertEqual(proposal.status, 'completed')
+        
+        cancelled = Proposal.objects.create(
+            post=self.post,
+            requester=self.requester,
+            provider=self.provider,
+            timebank_hour=Decimal('1.00'),
+            status='accepted'
+        )
+        # Guarded proposal update, refund (3), jobs update, savepoint pair
+        cancelled.status = 'cancelled'
+        with self.assertNumQueries(7):
+            cancelled.save()
+        
+        self.requester.profile.refresh_from_db()
+        self.provider.profile.refresh_from_db()
+        self.assertEqual(self.requester.profile.time_balance, Decimal('3.00'))
+        self.assertEqual(self.provider.profile.time_balance, Decimal('7.00'))
+        self.assertEqual(cancelled.jobs.get().status, 'cancelled')
+    
+    def test_stale_transition_is_rejected(self):
+        """Test a transition saved from an outdated copy fails without side effects"""
+        proposal = Proposal.objects.create(
+            post=self.post,
+            requester=self.requester,
+            provider=self.provider,
+            timebank_hour=Decimal('2.00'),
+            status='waiting'
+        )
+        stale = Proposal.objects.get(pk=proposal.pk)
+        proposal.status = 'accepted'
+        proposal.save()
+        
+        stale.status = 'accepted'
+        with self.assertRaises(ValidationError):
+            stale.save()
+        self.requester.profile.refresh_from_db()
+        self.assertEqual(self.requester.profile.time_balance, Decimal('3.00'))
+        self.assertEqual(proposal.jobs.count(), 1)
+        self.assertFalse(proposal.has_changed('status'))
+
+    def test_expiry_sweep(self):
+        """Test the sweep closes expired proposals and refunds overdue jobs in batches"""
+        today = date(2026, 6, 15)
+
+        def proposal(status, proposed_date=None):
+            return Proposal.objects.create(
+                post=self.post, requester=self.requester, provider=self.provider,
+                timebank_hour=Decimal('1.00'), status=status, proposed_date=proposed_date
+            )
+
+        past = [proposal('waiting', date(2026, 6, day)) for day in (1, 1, 14)]
+        upcoming = proposal('waiting', date(2026, 6, 20))
+        undated = proposal('waiting')
+        stale = proposal('waiting')
+        Proposal.objects.filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(days=expiry.PROPOSAL_TTL_DAYS + 1))
+        overdue = proposal('accepted', date(2026, 6, 1))
+        in_grace = proposal('accepted', date(2026, 6, 10))
+
+        report = expiry.sweep(today=today, batch_size=2)
+        self.assertEqual(report['expired_proposals'], 4)
+        self.assertEqual(report['overdue_jobs'], 1)
+        self.assertEqual(report['refunded_hours'], Decimal('1.00'))
+        self.assertEqual(report['batches'], 4)
+        self.assertEqual(
+            set(Proposal.objects.filter(status='cancelled').values_list('pk', flat=True)),
+            {p.pk for p in past} | {stale.pk, overdue.pk}
+        )
+        self.assertEqual(Proposal.objects.get(pk=upcoming.pk).status, 'waiting')
+        self.assertEqual(Proposal.objects.get(pk=undated.pk).status, 'waiting')
+        self.assertEqual(overdue.jobs.get().status, 'cancelled')
+        self.assertEqual(in_grace.jobs.get().status, 'waiting')
+        # Two accepted proposals charged 2 hours, the overdue one was refunded
+        self.requester.profile.refresh_from_db()
+        self.assertEqual(self.requester.profile.time_balance, Decimal('4.00'))
+        self.assertEqual(LedgerEntry.objects.filter(reason='refund', proposal=overdue).count(), 1)
+
+        # The command sweeps as of the real date: the remaining ones are in the past too
+        out = StringIO()
+        call_command('expire_stale_proposals', stdout=out)
+        self.assertIn('Expired 1 proposals and cancelled 1 overdue jobs', out.getvalue())
+
+
+class LedgerConcurrencyTest(TransactionTestCase):
+    """Test balance moves under parallel workers (threads on the shared test database)"""
+    
+    WORKERS = 8
+    
+    def setUp(self):
+        self.requester = User.objects.create_user(username='requester', password='pass123')
+        self.provider = User.objects.create_user(username='provider', password='pass123')
+        Profile.objects.filter(user=self.requester).update(time_balance=Decimal('5.00'))
+        Profile.objects.filter(user=self.provider).update(time_balance=Decimal('5.00'))
+        self.post = Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.provider,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour'
+        )
+    
+    def run_workers(self, work, arguments):
+        """Run work(argument) on parallel threads, retrying while SQLite reports the table locked"""
+        barrier = threading.Barrier(len(arguments))
+        results = []
+        
+        def worker(argument):
+            try:
+                barrier.wait()
+                for _ in range(200):
+                    try:
+                        results.append(work(argument))
+                        return
+                    except OperationalError:
+                        time.sleep(0.005)
+                results.append('gave up')
+            finally:
+                connection.close()
+        
+        threads = [threading.Thread(target=worker, args=(argument,)) for argument in arguments]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+    
+    def accept(self, proposal_id):
+        proposal = Proposal.objects.get(pk=proposal_id)
+        proposal.status = 'accepted'
+        try:
+            proposal.save()
+        except ValidationError:
+            return 'insufficient'
+        return 'accepted'
+    
+    def balance(self, user):
+        return Profile.objects.get(user=user).time_balance
+    
+    def test_parallel_accepts_never_overdraw(self):
+        """Test parallel accepts spend the balance exactly once"""
+        proposal_ids = [
+            Proposal.objects.create(
+                post=self.post, requester=self.requester, provider=self.provider,
+                timebank_hour=Decimal('1.00'), status='waiting'
+            ).pk
+            for _ in range(self.WORKERS)
+        ]
+        results = self.run_workers(self.accept, proposal_ids)
+        
+        self.assertEqual(results.count('accepted'), 5)
+        self.assertEqual(results.count('insufficient'), self.WORKERS - 5)
+        self.assertEqual(self.balance(self.requester), Decimal('0.00'))
+        self.assertEqual(Job.objects.filter(status='waiting').count(), 5)
+    
+    def test_parallel_accepts_of_one_proposal_charge_once(self):
+        """Test accepting the same proposal in parallel deducts and creates a job once"""
+        proposal = Proposal.objects.create(
+            post=self.post, requester=self.requester, provider=self.provider,
+            timebank_hour=Decimal('2.00'), status='waiting'
+        )
+        self.run_workers(self.accept, [proposal.pk] * self.WORKERS)
+        
+        self.assertEqual(self.balance(self.requester), Decimal('3.00'))
+        self.assertEqual(proposal.jobs.count(), 1)
+    
+    def test_opposite_transfers_do_not_deadlock_or_lose_updates(self):
+        """Test transfers in both directions keep the total and apply every move"""
+        directions = [(self.requester.id, self.provider.id), (self.provider.id, self.requester.id)] * (self.WORKERS // 2)
+        results = self.run_workers(lambda users: ledger.transfer(users[0], users[1], Decimal('0.50'), 'adjustment'), directions)
+        
+        self.assertEqual(len(results), len(directions))
+        self.assertNotIn('gave up', results)
+        self.assertEqual(self.balance(self.requester), Decimal('5.00'))
+        self.assertEqual(self.balance(self.provider), Decimal('5.00'))
+    
+    def test_failed_transfer_changes_nothing(self):
+        """Test a transfer the payer cannot cover leaves both balances alone"""
+        with self.assertRaises(ValidationError):
+            ledger.transfer(self.requester.id, self.provider.id, Decimal('6.00'), 'adjustment')
+        self.assertEqual(self.balance(self.requester), Decimal('5.00'))
+        self.assertEqual(self.balance(self.provider), Decimal('5.00'))
+
+
+class LedgerJournalTest(TestCase):
+    """Test the balance journal, snapshots and reconciliation"""
+    
+    def setUp(self):
+        self.requester = User.objects.create_user(username='requester', password='pass123')
+        self.provider = User.objects.create_user(username='provider', password='pass123')
+        ledger.credit(self.requester.id, Decimal('5.00'), 'signup_bonus')
+        self.post = Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.provider,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour'
+        )
+        self.proposal = Proposal.objects.create(
+            post=self.post, requester=self.requester, provider=self.provider,
+            timebank_hour=Decimal('2.00'), status='waiting'
+        )
+    
+    def complete(self):
+        self.proposal.status = 'accepted'
+        self.proposal.save()
+        self.proposal.provider_approved = True
+        self.proposal.requester_approved = True
+        self.proposal.save()
+    
+    def test_proposal_moves_are_journaled(self):
+        """Test payment and payout entries record the proposal, job and counterparty"""
+        self.complete()
+        job = self.proposal.jobs.get()
+        
+        entries = list(LedgerEntry.objects.values_list('user_id', 'amount', 'reason', 'proposal_id', 'job_id', 'counterparty_id'))
+        self.assertEqual(entries, [
+            (self.requester.id, Decimal('5.00'), 'signup_bonus', None, None, None),
+            (self.requester.id, Decimal('-2.00'), 'payment', self.proposal.id, None, self.provider.id),
+            (self.provider.id, Decimal('2.00'), 'payout', self.proposal.id, job.id, self.requester.id),
+        ])
+        self.assertEqual(ledger.reconcile(), [])
+    
+    def test_moves_for_user_without_profile(self):
+        """Test moves touching a user with no profile fail cleanly and change nothing"""
+        Profile.objects.filter(user=self.provider).delete()
+        
+        # Each attempt in its own atomic block: a failed move rolls back its enclosing transaction
+        with self.assertRaisesMessage(ValidationError, f'User {self.provider.id} has no profile'), transaction.atomic():
+            ledger.apply_changes({self.requester.id: Decimal('-1.00'), self.provider.id: Decimal('1.00')}, 'payment')
+        with self.assertRaisesMessage(ValidationError, f'User {self.provider.id} has no profile'), transaction.atomic():
+            ledger.debit(self.provider.id, Decimal('1.00'), 'payment')
+        self.assertEqual(Profile.objects.get(user=self.requester).time_balance, Decimal('5.00'))
+        self.assertEqual(LedgerEntry.objects.count(), 1)
+    
+    def test_entries_are_append_only(self):
+        """Test journal entries cannot be edited or deleted"""
+        entry = LedgerEntry.objects.get()
+        entry.amount = Decimal('9.00')
+        with self.assertRaises(ValidationError):
+            entry.save()
+        with self.assertRaises(ValidationError):
+            entry.delete()
+    
+    def test_balance_from_snapshot_and_tail(self):
+        """Test balances read one snapshot plus the later entries in two queries"""
+        self.proposal.status = 'accepted'
+        self.proposal.save()
+        with mock.patch.object(ledger, 'SNAPSHOT_SETTLE_SECONDS', 0):
+            self.assertEqual(ledger.take_snapshots(), 1)
+            self.assertEqual(ledger.take_snapshots(), 0)
+        snapshot = BalanceSnapshot.objects.get()
+        self.assertEqual(snapshot.balance, Decimal('3.00'))
+        
+        ledger.credit(self.requester.id, Decimal('1.50'), 'adjustment')
+        with self.assertNumQueries(2):
+            self.assertEqual(ledger.balance_at(self.requester.id), Decimal('4.50'))
+        # Before the snapshot: the snapshot is skipped and entries are summed instead
+        self.assertEqual(ledger.balance_at(self.requester.id, snapshot.as_of), Decimal('5.00'))
+        self.assertEqual(ledger.balance_at(self.provider.id), Decimal('0.00'))
+    
+    def test_statement_running_balance(self):
+        """Test statements start from the opening balance and carry a running balance"""
+        self.complete()
+        payment_time = LedgerEntry.objects.get(reason='payment').created_at
+        
+        opening, entries = ledger.statement(self.requester.id, start=payment_time)
+        self.assertEqual(opening, Decimal('5.00'))
+        self.assertEqual([(entry['reason'], entry['balance']) for entry in entries], [('payment', Decimal('3.00'))])
+    
+    def test_reconcile_command(self):
+        """Test reconciliation reports balances changed outside the ledger and can journal them"""
+        Profile.objects.filter(user=self.provider).update(time_balance=Decimal('1.25'))
+        
+        with self.assertRaises(CommandError):
+            call_command('reconcile_ledger', stdout=StringIO())
+        out = StringIO()
+        call_command('reconcile_ledger', '--fix', stdout=out)
+        self.assertIn(f'User {self.provider.id}: journal 0.00, profile 1.25', out.getvalue())
+        self.assertEqual(LedgerEntry.objects.get(reason='adjustment').amount, Decimal('1.25'))
+        self.assertEqual(ledger.reconcile(), [])
+
+
 class ReviewModelTest(TestCase):
     """Test Review model"""
     
@@ -483,6 +927,72 @@ class ReviewModelTest(TestCase):
                 work_quality=4
             )
 
+    
+    def test_rating_summary_tracks_edit_and_delete(self):
+        """Test stored rating totals follow review create, edit and delete"""
+        review = Review.objects.create(
+            proposal=self.proposal,
+            reviewer=self.reviewer,
+            reviewed_user=self.reviewed_user,
+            friendliness=5,
+            time_management=4,
+            reliability=5,
+            communication=4,
+            work_quality=5
+        )
+        summary = RatingSummary.objects.get(user=self.reviewed_user)
+        self.assertEqual(summary.review_count, 1)
+        self.assertEqual(summary.friendliness_total, 5)
+        
+        review.friendliness = 2
+        review.save()
+        summary.refresh_from_db()
+        self.assertEqual(summary.review_count, 1)
+        self.assertEqual(summary.friendliness_total, 2)
+        
+        review.delete()
+        summary.refresh_from_db()
+        self.assertEqual(summary.review_count, 0)
+        self.assertEqual(summary.friendliness_total, 0)
+        self.assertEqual(self.reviewed_user.profile.get_review_averages()['total_reviews'], 0)
+    
+    def test_get_review_averages_runs_no_aggregate(self):
+        """Test reading review averages is a single primary-key lookup"""
+        Review.objects.create(
+            proposal=self.proposal,
+            reviewer=self.reviewer,
+            reviewed_user=self.reviewed_user,
+            friendliness=5,
+            time_management=4,
+            reliability=5,
+            communication=4,
+            work_quality=5
+        )
+        profile = Profile.objects.get(user=self.reviewed_user)
+        with self.assertNumQueries(1):
+            averages = profile.get_review_averages()
+        self.assertEqual(averages['overall'], 4.6)
+    
+    def test_rebuild_rating_summaries_command(self):
+        """Test the rebuild command recomputes totals from the Review table"""
+        Review.objects.create(
+            proposal=self.proposal,
+            reviewer=self.reviewer,
+            reviewed_user=self.reviewed_user,
+            friendliness=3,
+            time_management=3,
+            reliability=3,
+            communication=3,
+            work_quality=3
+        )
+        RatingSummary.objects.filter(user=self.reviewed_user).update(review_count=7, friendliness_total=99)
+        
+        call_command('rebuild_rating_summaries', stdout=StringIO())
+        
+        summary = RatingSummary.objects.get(user=self.reviewed_user)
+        self.assertEqual(summary.review_count, 1)
+        self.assertEqual(summary.friendliness_total, 3)
+
 
 class ChatModelTest(TestCase):
     """Test Chat and Message models"""
@@ -567,6 +1077,39 @@ class ChatModelTest(TestCase):
         
         self.assertTrue(message.is_read)
 
+    
+    def test_read_mark_never_moves_backwards(self):
+        """Test ChatReadState.mark_read upserts one row and only moves forward"""
+        chat = Chat.objects.create(
+            participant1=self.user1,
+            participant2=self.user2
+        )
+        first = Message.objects.create(chat=chat, sender=self.user2, content='First')
+        second = Message.objects.create(chat=chat, sender=self.user2, content='Second')
+        
+        self.assertEqual(ChatReadState.mark_read(chat.id, self.user1.id), second.id)
+        self.assertEqual(ChatReadState.mark_read(chat.id, self.user1.id, up_to_message_id=first.id), second.id)
+        self.assertEqual(ChatReadState.objects.filter(chat=chat, user=self.user1).count(), 1)
+        self.assertTrue(Message.objects.get(id=first.id).is_read)
+        self.assertEqual(ChatReadState.unread_messages(self.user1).count(), 0)
+
+    
+    def test_read_state_annotation(self):
+        """Test with_read_state answers is_read for a whole list in one query"""
+        chat = Chat.objects.create(
+            participant1=self.user1,
+            participant2=self.user2
+        )
+        first = Message.objects.create(chat=chat, sender=self.user2, content='First')
+        Message.objects.create(chat=chat, sender=self.user2, content='Second')
+        Message.objects.create(chat=chat, sender=self.user1, content='Reply')
+        ChatReadState.mark_read(chat.id, self.user1.id, up_to_message_id=first.id)
+        
+        with self.assertNumQueries(1):
+            read = [message.is_read for message in Message.with_read_state(chat.messages.all())]
+        self.assertEqual(read, [True, False, False])
+        self.assertEqual(read, [message.is_read for message in chat.messages.all()])
+
 
 class ForumModelTest(TestCase):
     """Test Forum models"""
@@ -605,3 +1148,77 @@ class ForumModelTest(TestCase):
         self.assertFalse(comment.is_hidden)
         self.assertEqual(comment.report_count, 0)
 
+
+
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + b'\x00' * 32
+PNG_DATA_URL = 'data:image/png;base64,' + base64.b64encode(PNG_BYTES).decode()
+
+
+class ImageStoreModelTest(TestCase):
+    """Test base64 images are moved into the content-addressed blob store"""
+    
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_dir, ignore_errors=True)
+        override = override_settings(IMAGE_STORE_ROOT=self.store_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+    
+    def _create_post(self, image):
+        return Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.user,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour',
+            image=image
+        )
+    
+    def test_save_stores_image_once(self):
+        """Test identical uploads are decoded into one blob and saved as a short URL"""
+        post = self._create_post(PNG_DATA_URL)
+        topic = ForumTopic.objects.create(author=self.user, title='Topic', content='Content', image=PNG_DATA_URL)
+        self.user.profile.avatar = PNG_DATA_URL
+        self.user.profile.save()
+        
+        key = hashlib.sha256(PNG_BYTES).hexdigest()
+        expected = f'/api/images/{key}/'
+        post.refresh_from_db()
+        topic.refresh_from_db()
+        self.user.profile.refresh_from_db()
+        self.assertEqual(post.image, expected)
+        self.assertEqual(topic.image, expected)
+        self.assertEqual(self.user.profile.avatar, expected)
+        
+        stored = [f for _, _, files in os.walk(self.store_dir) for f in files]
+        self.assertEqual(stored, [key])
+        with open(blob_path(key), 'rb') as blob:
+            self.assertEqual(blob.read(), PNG_BYTES)
+    
+    def test_external_urls_unchanged(self):
+        """Test external URLs and non-image data are kept as submitted"""
+        post = self._create_post('https://example.com/image.png')
+        self.assertEqual(post.image, 'https://example.com/image.png')
+        
+        text_data_url = 'data:text/plain;base64,' + base64.b64encode(b'hello').decode()
+        post = self._create_post(text_data_url)
+        self.assertEqual(post.image, text_data_url)
+    
+    def test_backfill_command(self):
+        """Test backfill moves existing inline images in batches without touching updated_at"""
+        posts = [self._create_post(None) for _ in range(3)]
+        Post.objects.filter(pk__in=[p.pk for p in posts]).update(image=PNG_DATA_URL)
+        updated_at = Post.objects.get(pk=posts[0].pk).updated_at
+        
+        out = StringIO()
+        call_command('backfill_images', '--batch-size', '2', stdout=out)
+        
+        key = hashlib.sha256(PNG_BYTES).hexdigest()
+        self.assertEqual(
+            set(Post.objects.values_list('image', flat=True)),
+            {f'/api/images/{key}/'}
+        )
+        self.assertEqual(Post.objects.get(pk=posts[0].pk).updated_at, updated_at)
+        self.assertIn('Post.image: 3 images moved', out.getvalue())
@@ -1,14 +1,28 @@
 """
 Integration tests for API views
 """
-from django.test import TestCase, Client
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
-from api.models import Profile, Tag, Post, Comment, Proposal, Review, Job, Chat, Message, ForumTopic, ForumComment
+from api.models import Profile, Tag, Post, Comment, Proposal, Review, Job, Chat, Message, ForumTopic, ForumComment, PendingApprovalCount
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.management import call_command
 from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+from PIL import Image as PILImage
+from api.services import ledger, transitions
+from api.services.image_variants import variant_path
+from api.services.wikidata import search_cache_key
+import base64
+import csv
+import hashlib
 import json
+import shutil
+import tempfile
 
 
 class AuthenticationAPITest(TestCase):
@@ -50,6 +64,21 @@ class AuthenticationAPITest(TestCase):
         user = User.objects.get(username='newuser')
         self.assertTrue(hasattr(user, 'profile'))
     
+    def test_register_signup_bonus_is_journaled(self):
+        """Test the signup bonus is credited through the ledger"""
+        data = {
+            'username': 'bonususer',
+            'email': 'bonus@example.com',
+            'password': 'newpass123',
+            'password2': 'newpass123',
+            'birth_date': '2000-01-01',
+        }
+        response = self.client.post(reverse('register'), data, format='json')
+        self.assertIn(response.status_code, [status.HTTP_200_OK, status.HTTP_201_CREATED])
+        user = User.objects.get(username='bonususer')
+        self.assertEqual(Profile.objects.get(user=user).time_balance, Decimal('3.00'))
+        self.assertEqual(list(user.ledger_entries.values_list('reason', 'amount')), [('signup_bonus', Decimal('3.00'))])
+    
     def test_register_password_mismatch(self):
         """Test registration with password mismatch"""
         url = reverse('register')
@@ -165,6 +194,51 @@ class PostAPITest(TestCase):
         else:
             self.assertEqual(len(response.data), 1)
     
+    def test_keyset_pagination(self):
+        """Test cursor pages of the feed are stable under inserts and link both ways"""
+        posts = [
+            Post.objects.create(
+                title=f'Post {i}', description='Description', posted_by=self.user,
+                post_type='offer', location='Location', duration='1 hour'
+            )
+            for i in range(25)
+        ]
+        # Ties on created_at are broken by id
+        Post.objects.filter(id__in=[p.id for p in posts[5:15]]).update(created_at=posts[5].created_at)
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        
+        url = reverse('post-list')
+        response = self.client.get(url, {'pagination': 'cursor', 'page_size': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 25)
+        self.assertIsNone(response.data['previous'])
+        seen = [post['id'] for post in response.data['results']]
+        
+        # A post created while paging does not shift the following pages
+        Post.objects.create(
+            title='Newest', description='Description', posted_by=self.user,
+            post_type='offer', location='Location', duration='1 hour'
+        )
+        second = self.client.get(response.data['next'])
+        seen += [post['id'] for post in second.data['results']]
+        third = self.client.get(second.data['next'])
+        seen += [post['id'] for post in third.data['results']]
+        self.assertEqual(seen, expected)
+        self.assertIsNone(third.data['next'])
+        
+        previous = self.client.get(third.data['previous'])
+        self.assertEqual([post['id'] for post in previous.data['results']], expected[10:20])
+        
+        # The total count can be skipped; a malformed cursor starts over
+        response = self.client.get(url, {'pagination': 'cursor', 'count': 'false', 'before': 'garbage'})
+        self.assertNotIn('count', response.data)
+        self.assertEqual(response.data['results'][0]['title'], 'Newest')
+        
+        # Other orderings keep page numbers
+        response = self.client.get(url, {'pagination': 'cursor', 'ordering': 'title', 'page_size': 10})
+        self.assertEqual(response.data['count'], 26)
+        self.assertIn('page=2', response.data['next'])
+    
     def test_get_post_detail(self):
         """Test getting post details"""
         post = Post.objects.create(
@@ -259,6 +333,142 @@ class PostAPITest(TestCase):
             self.assertEqual(len(response.data), 1)
             self.assertIn('Python', response.data[0]['title'])
 
+    
+    def _create_located_post(self, title, latitude, longitude):
+        return Post.objects.create(
+            title=title,
+            description='Description',
+            posted_by=self.user,
+            post_type='offer',
+            location='Location',
+            duration='1 hour',
+            latitude=latitude,
+            longitude=longitude
+        )
+    
+    def test_bounding_box_filter(self):
+        """Test bounding box filtering through the grid cell index"""
+        self._create_located_post('Kadikoy', 40.9903, 29.0290)
+        self._create_located_post('Besiktas', 41.0422, 29.0083)
+        self._create_located_post('Ankara', 39.9334, 32.8597)
+        
+        url = reverse('post-list')
+        response = self.client.get(url, {'min_lat': 40.95, 'max_lat': 41.05, 'min_lon': 28.9, 'max_lon': 29.1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual({p['title'] for p in posts}, {'Kadikoy', 'Besiktas'})
+        
+        # Box edges inside a grid cell are still exact
+        response = self.client.get(url, {'min_lat': 41.0, 'max_lat': 41.05, 'min_lon': 28.9, 'max_lon': 29.1})
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([p['title'] for p in posts], ['Besiktas'])
+    
+    def test_near_radius_search(self):
+        """Test near=lat,lon returns posts within radius_km ordered by distance"""
+        self._create_located_post('Far', 41.0422, 29.0083)  # ~6 km away
+        self._create_located_post('Close', 40.9920, 29.0300)  # ~0.2 km away
+        self._create_located_post('Ankara', 39.9334, 32.8597)  # ~350 km away
+        self._create_located_post('No coordinates', None, None)
+        
+        url = reverse('post-list')
+        response = self.client.get(url, {'near': '40.9903,29.0290', 'radius_km': 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([p['title'] for p in posts], ['Close', 'Far'])
+        self.assertLess(posts[0]['distance_km'], 0.5)
+        self.assertAlmostEqual(posts[1]['distance_km'], 5.9, delta=0.3)
+        
+        response = self.client.get(url, {'near': '40.9903,29.0290', 'radius_km': 400})
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([p['title'] for p in posts], ['Close', 'Far', 'Ankara'])
+    
+    def test_full_text_search(self):
+        """Test q= matches word prefixes across title, description and tags, ranked with snippets"""
+        cooking = Tag.objects.create(name='Cooking')
+        title_match = Post.objects.create(
+            title='Guitar lessons', description='Beginner friendly <b>acoustic</b> sessions',
+            posted_by=self.user, post_type='offer', location='Location', duration='1 hour'
+        )
+        Post.objects.create(
+            title='Moving help', description='Can carry a guitar case and boxes',
+            posted_by=self.user, post_type='need', location='Location', duration='1 hour'
+        )
+        tagged = Post.objects.create(
+            title='Dinner', description='Homemade meals',
+            posted_by=self.user, post_type='offer', location='Location', duration='1 hour'
+        )
+        tagged.tags.add(cooking)
+        
+        url = reverse('post-list')
+        response = self.client.get(url, {'q': 'guit'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([p['title'] for p in posts], ['Guitar lessons', 'Moving help'])
+        self.assertGreater(posts[0]['search_rank'], posts[1]['search_rank'])
+        self.assertIn('<mark>Guitar</mark>', posts[0]['search_snippet'])
+        
+        # Post text is escaped; only the highlight markup is HTML
+        response = self.client.get(url, {'q': 'acoustic'})
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertIn('&lt;b&gt;<mark>acoustic</mark>&lt;/b&gt;', posts[0]['search_snippet'])
+        
+        response = self.client.get(url, {'q': 'cook'})
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([p['id'] for p in posts], [tagged.id])
+        
+        # Index follows edits, tag removal and deletion
+        title_match.title = 'Piano lessons'
+        title_match.save()
+        tagged.tags.remove(cooking)
+        response = self.client.get(url, {'q': 'piano'})
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([p['id'] for p in posts], [title_match.id])
+        for query in ('cook', 'guitar lessons', '"*'):
+            response = self.client.get(url, {'q': query})
+            posts = response.data['results'] if 'results' in response.data else response.data
+            self.assertEqual(posts, [], query)
+    
+    def test_map_clusters(self):
+        """Test clusters aggregate posts per cell, are cached, and refresh when a post is hidden"""
+        self._create_located_post('Kadikoy', 40.9903, 29.0290)
+        need = self._create_located_post('Besiktas', 41.0422, 29.0083)
+        Post.objects.filter(pk=need.pk).update(post_type='need')
+        call_command('rebuild_post_clusters', stdout=StringIO())
+        self._create_located_post('Ankara', 39.9334, 32.8597)
+        caches['clusters'].clear()
+        
+        url = reverse('post-clusters')
+        params = {'min_lat': 35, 'max_lat': 43, 'min_lon': 25, 'max_lon': 45, 'zoom': 6}
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['zoom'], 6)
+        clusters = sorted(response.data['clusters'], key=lambda c: c['longitude'])
+        self.assertEqual([(c['count'], c['offer_count'], c['need_count']) for c in clusters], [(2, 1, 1), (1, 1, 0)])
+        self.assertAlmostEqual(clusters[0]['latitude'], (40.9903 + 41.0422) / 2)
+        
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, params).data['clusters'], response.data['clusters'])
+        
+        self.client.force_authenticate(user=User.objects.create_user(username='admin', password='pass123', is_staff=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-toggle-hide', args=[need.pk]))
+        response = self.client.get(url, params)
+        self.assertEqual(sorted(c['count'] for c in response.data['clusters']), [1, 1])
+    
+    def test_map_clusters_requires_bbox(self):
+        """Test clusters reject a missing bounding box"""
+        response = self.client.get(reverse('post-clusters'), {'zoom': 3})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+    
+    def test_near_across_antimeridian(self):
+        """Test radius search finds posts on the other side of the 180th meridian"""
+        self._create_located_post('Fiji east', -17.0, 179.95)
+        self._create_located_post('Fiji west', -17.0, -179.95)
+        
+        response = self.client.get(reverse('post-list'), {'near': '-17.0,179.99', 'radius_km': 20})
+        posts = response.data['results'] if 'results' in response.data else response.data
+        self.assertEqual([p['title'] for p in posts], ['Fiji east', 'Fiji west'])
+
 
 class CommentAPITest(TestCase):
     """Test Comment API endpoints"""
@@ -428,6 +638,152 @@ class ProposalAPITest(TestCase):
             self.assertEqual(len(response.data), 1)
 
 
+    def test_statement_stream(self):
+        """Test the statement CSV streams the journal with running balances"""
+        # The balance set in setUp bypassed the ledger; journal it
+        ledger.reconcile(fix=True)
+        proposal = Proposal.objects.create(
+            post=self.post,
+            requester=self.requester,
+            provider=self.provider,
+            timebank_hour=Decimal('2.00'),
+            status='waiting'
+        )
+        proposal.status = 'accepted'
+        proposal.save()
+        
+        self.client.force_authenticate(user=self.requester)
+        response = self.client.get(reverse('user-statement', kwargs={'username': 'me'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:4], ['date', 'reason', 'amount', 'balance'])
+        self.assertEqual([row[1:4] for row in rows[1:]], [
+            ['opening_balance', '', '0.00'],
+            ['adjustment', '5.00', '5.00'],
+            ['payment', '-2.00', '3.00'],
+        ])
+        self.assertEqual(rows[3][6], 'provider')
+        
+        # A later period starts from the balance at its start
+        response = self.client.get(reverse('user-statement', kwargs={'username': 'requester'}) + '?from=2999-01-01')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([row[1:4] for row in rows[1:]], [['opening_balance', '', '3.00']])
+        
+        response = self.client.get(reverse('user-statement', kwargs={'username': 'me'}) + '?from=yesterday')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('user-statement', kwargs={'username': 'provider'}))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def _waiting_proposals(self, count, hours):
+        return [
+            Proposal.objects.create(
+                post=self.post,
+                requester=self.requester,
+                provider=self.provider,
+                timebank_hour=Decimal(hours),
+                status='waiting'
+            ).pk
+            for _ in range(count)
+        ]
+
+    def test_bulk_transition(self):
+        """Test bulk accept changes legal proposals with set-based writes and skips the rest"""
+        other = User.objects.create_user(username='other', password='pass123')
+        foreign = Proposal.objects.create(
+            post=self.post, requester=self.requester, provider=other, timebank_hour=Decimal('1.00')
+        )
+        declined = Proposal.objects.create(
+            post=self.post, requester=self.requester, provider=self.provider,
+            timebank_hour=Decimal('1.00'), status='declined'
+        )
+        ids = self._waiting_proposals(3, '1.00')
+        url = reverse('proposal-bulk-transition')
+        transitions.reset_metrics()
+
+        self.client.force_authenticate(user=self.provider)
+        # Lock/read, status update, waiting jobs read, jobs insert, balance update,
+        # journal insert, balance read, pending counts update, savepoint pair:
+        # independent of the batch size
+        with self.assertNumQueries(10):
+            response = self.client.post(url, {'transition': 'accept', 'ids': ids + [foreign.pk, declined.pk]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], ids)
+        self.assertEqual(response.data['skipped'], [foreign.pk, declined.pk])
+        self.assertEqual(Proposal.objects.filter(pk__in=ids, status='accepted').count(), 3)
+        self.assertEqual(Job.objects.filter(proposal_id__in=ids, status='waiting').count(), 3)
+        self.requester.profile.refresh_from_db()
+        self.assertEqual(self.requester.profile.time_balance, Decimal('2.00'))
+
+        # The requester cannot accept, but can cancel; hours are refunded
+        self.client.force_authenticate(user=self.requester)
+        response = self.client.post(url, {'transition': 'accept', 'ids': [foreign.pk]}, format='json')
+        self.assertEqual(response.data['updated'], [])
+        response = self.client.post(url, {'transition': 'cancel', 'ids': ids[:2]}, format='json')
+        self.assertEqual(response.data['updated'], ids[:2])
+        self.assertEqual(Job.objects.filter(proposal_id__in=ids[:2], cancelled_by=self.requester).count(), 2)
+        self.requester.profile.refresh_from_db()
+        self.assertEqual(self.requester.profile.time_balance, Decimal('4.00'))
+
+        response = self.client.post(url, {'transition': 'complete', 'ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(reverse('proposal-transition-metrics'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.requester.is_staff = True
+        self.requester.save()
+        response = self.client.get(reverse('proposal-transition-metrics'))
+        self.assertEqual(response.data['accept:bulk']['count'], 2)
+        self.assertEqual(response.data['cancel:bulk']['count'], 1)
+
+    def test_pending_count(self):
+        """Test the pending count is a stored lookup kept in step with proposal writes"""
+        url = reverse('proposal-for-approval-count')
+
+        def counts():
+            self.client.force_authenticate(user=self.requester)
+            with self.assertNumQueries(1):
+                requester_count = self.client.get(url).data['count']
+            self.client.force_authenticate(user=self.provider)
+            return requester_count, self.client.get(url).data['count']
+
+        self.client.force_authenticate(user=self.requester)
+        response = self.client.post(
+            reverse('proposal-list'), {'post': self.post.id, 'timebank_hour': '1.00'}, format='json'
+        )
+        ids = self._waiting_proposals(2, '1.00')
+        self.assertEqual(counts(), (3, 3))
+
+        self.client.force_authenticate(user=self.provider)
+        self.client.patch(reverse('proposal-detail', kwargs={'pk': response.data['id']}), {'status': 'declined'}, format='json')
+        self.assertEqual(counts(), (2, 2))
+        self.client.post(reverse('proposal-bulk-transition'), {'transition': 'accept', 'ids': ids[:1]}, format='json')
+        self.assertEqual(counts(), (1, 1))
+        Proposal.objects.get(pk=ids[1]).delete()
+        self.assertEqual(counts(), (0, 0))
+
+        # The repair job recounts drifted counters
+        self._waiting_proposals(1, '1.00')
+        PendingApprovalCount.objects.filter(pk=self.requester.pk).update(count=7)
+        out = StringIO()
+        call_command('repair_pending_counts', stdout=out)
+        self.assertIn(f'User {self.requester.pk}: stored 7, counted 1', out.getvalue())
+        self.assertEqual(counts(), (1, 1))
+
+    def test_bulk_transition_is_all_or_nothing(self):
+        """Test a bulk accept the payer cannot cover changes nothing"""
+        ids = self._waiting_proposals(3, '2.00')
+        self.client.force_authenticate(user=self.provider)
+        response = self.client.post(
+            reverse('proposal-bulk-transition'), {'transition': 'accept', 'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Insufficient balance', response.data['error'])
+        self.assertEqual(Proposal.objects.filter(pk__in=ids, status='waiting').count(), 3)
+        self.assertFalse(Job.objects.filter(proposal_id__in=ids).exists())
+        self.requester.profile.refresh_from_db()
+        self.assertEqual(self.requester.profile.time_balance, Decimal('5.00'))
+
+
 class ReviewAPITest(TestCase):
     """Test Review API endpoints"""
     
@@ -612,6 +968,130 @@ class ChatAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 2)
 
+    
+    def test_get_messages_marks_read_and_flags_unread(self):
+        """Test fetching marks the other user's messages read and flags them"""
+        chat = Chat.objects.create(participant1=self.user1, participant2=self.user2)
+        own = Message.objects.create(chat=chat, sender=self.user1, content='Mine')
+        theirs = Message.objects.create(chat=chat, sender=self.user2, content='Theirs')
+        
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('chat-messages', kwargs={'pk': chat.id})
+        response = self.client.get(url)
+        flags = {msg['id']: msg['was_unread_before_fetch'] for msg in response.data}
+        self.assertEqual(flags, {own.id: False, theirs.id: True})
+        self.assertTrue(all(msg['is_read'] for msg in response.data if msg['id'] == theirs.id))
+        self.assertFalse(Message.objects.get(id=own.id).is_read)
+        
+        # Second fetch: nothing is newly read any more
+        response = self.client.get(url)
+        self.assertFalse(any(msg['was_unread_before_fetch'] for msg in response.data))
+    
+    def test_get_messages_cursor_pagination(self):
+        """Test keyset pagination with before/after cursors"""
+        chat = Chat.objects.create(participant1=self.user1, participant2=self.user2)
+        for i in range(5):
+            Message.objects.create(chat=chat, sender=self.user2, content=f'Message {i}')
+        
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('chat-messages', kwargs={'pk': chat.id})
+        response = self.client.get(url, {'page_size': 2})
+        self.assertEqual([msg['content'] for msg in response.data], ['Message 3', 'Message 4'])
+        self.assertIn('rel="prev"', response['Link'])
+        self.assertNotIn('rel="next"', response['Link'])
+        
+        prev_url = response['Link'].split(';')[0].strip('<>')
+        response = self.client.get(prev_url)
+        self.assertEqual([msg['content'] for msg in response.data], ['Message 1', 'Message 2'])
+        
+        prev_url = response['Link'].split(';')[0].strip('<>')
+        response = self.client.get(prev_url)
+        self.assertEqual([msg['content'] for msg in response.data], ['Message 0'])
+        self.assertNotIn('rel="prev"', response.get('Link', ''))
+        
+        next_url = [link for link in response['Link'].split(', ') if 'rel="next"' in link][0].split(';')[0].strip('<>')
+        response = self.client.get(next_url)
+        self.assertEqual([msg['content'] for msg in response.data], ['Message 1', 'Message 2'])
+        
+        # Without paging parameters the whole history is returned
+        response = self.client.get(url)
+        self.assertEqual([msg['content'] for msg in response.data], [f'Message {i}' for i in range(5)])
+        self.assertNotIn('Link', response)
+    
+    def test_get_messages_query_count(self):
+        """Test fetching a page costs a fixed number of queries regardless of chat length"""
+        chat = Chat.objects.create(participant1=self.user1, participant2=self.user2)
+        for i in range(30):
+            Message.objects.create(chat=chat, sender=self.user2, content=f'Message {i}')
+        
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('chat-messages', kwargs={'pk': chat.id})
+        # chat lookup + read marks + read-mark upsert + chat updated_at + message page
+        with self.assertNumQueries(5):
+            response = self.client.get(url, {'page_size': 10})
+        self.assertEqual(len(response.data), 10)
+
+    
+    def test_unread_count_uses_read_mark(self):
+        """Test unread-count drops to zero once the chat has been opened"""
+        chat = Chat.objects.create(participant1=self.user1, participant2=self.user2)
+        Message.objects.create(chat=chat, sender=self.user2, content='One')
+        Message.objects.create(chat=chat, sender=self.user2, content='Two')
+        Message.objects.create(chat=chat, sender=self.user1, content='Mine')
+        
+        self.client.force_authenticate(user=self.user1)
+        url = reverse('chat-unread-count')
+        self.assertEqual(self.client.get(url).data['unread_count'], 2)
+        
+        self.client.get(reverse('chat-messages', kwargs={'pk': chat.id}))
+        self.assertEqual(self.client.get(url).data['unread_count'], 0)
+        
+        Message.objects.create(chat=chat, sender=self.user2, content='Three')
+        self.assertEqual(self.client.get(url).data['unread_count'], 1)
+
+    
+    def _create_inbox(self, chat_count):
+        """Create chats for user1, each with a post and a few messages"""
+        for i in range(chat_count):
+            other = User.objects.create_user(username=f'inbox_user_{chat_count}_{i}', password='pass123')
+            post = Post.objects.create(
+                title=f'Post {i}',
+                description='Test Description',
+                posted_by=other,
+                post_type='offer',
+                location='Test Location',
+                duration='1 hour'
+            )
+            chat = Chat.objects.create(participant1=self.user1, participant2=other, post=post)
+            Message.objects.create(chat=chat, sender=self.user1, content='Hi there')
+            Message.objects.create(chat=chat, sender=other, content='x' * 60)
+            Message.objects.create(chat=chat, sender=other, content='Last one')
+    
+    def test_list_chats_annotated(self):
+        """Test inbox rows carry last message, unread count and post details"""
+        self._create_inbox(1)
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(reverse('chat-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        chat_data = response.data['results'][0]
+        self.assertEqual(chat_data['last_message']['content'], 'Last one')
+        self.assertEqual(chat_data['last_message']['sender_username'], 'inbox_user_1_0')
+        self.assertEqual(chat_data['unread_count'], 2)
+        self.assertEqual(chat_data['post_title'], 'Post 0')
+        self.assertEqual(chat_data['other_user'], 'inbox_user_1_0')
+    
+    def test_list_chats_constant_query_count(self):
+        """Test the inbox costs the same number of queries for 1 or 5 chats"""
+        self.client.force_authenticate(user=self.user1)
+        self._create_inbox(1)
+        with self.assertNumQueries(2):  # page count + annotated chat query
+            self.client.get(reverse('chat-list'))
+        
+        self._create_inbox(4)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('chat-list'))
+        self.assertEqual(response.data['count'], 5)
+
 
 class ForumAPITest(TestCase):
     """Test Forum API endpoints"""
@@ -635,6 +1115,18 @@ class ForumAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data['title'], 'Test Topic')
     
+    def test_forum_topics_keyset_pagination(self):
+        """Test forum topics can be listed with cursor pages"""
+        for i in range(3):
+            ForumTopic.objects.create(author=self.user, title=f'Topic {i}', content='Content')
+        
+        url = reverse('forum-topic-list')
+        response = self.client.get(url, {'pagination': 'cursor', 'page_size': 2})
+        self.assertEqual([topic['title'] for topic in response.data['results']], ['Topic 2', 'Topic 1'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([topic['title'] for topic in response.data['results']], ['Topic 0'])
+        self.assertIsNone(response.data['next'])
+    
     def test_create_forum_comment(self):
         """Test creating a forum comment"""
         topic = ForumTopic.objects.create(
@@ -687,6 +1179,19 @@ class ProfileAPITest(TestCase):
         self.user.profile.refresh_from_db()
         self.assertEqual(self.user.profile.bio, 'Test bio')
     
+    def test_update_own_profile_keeps_ledger_balance(self):
+        """Test a profile edit does not write back a balance moved by the ledger meanwhile"""
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.user.profile.time_balance, Decimal('0.00'))  # Loaded before the credit
+        ledger.credit(self.user.id, Decimal('2.50'), 'adjustment')
+        
+        response = self.client.put(reverse('my-profile'), {'bio': 'Test bio'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(profile.bio, 'Test bio')
+        self.assertEqual(profile.time_balance, Decimal('2.50'))
+        self.assertEqual(ledger.reconcile(), [])
+    
     def test_get_user_profile(self):
         """Test getting another user's profile"""
         url = reverse('user-profile', kwargs={'username': self.user.username})
@@ -694,3 +1199,388 @@ class ProfileAPITest(TestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['username'], 'testuser')
 
+
+
+class TagSearchAPITest(TestCase):
+    """Test tag autocomplete through the in-memory prefix index"""
+    
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.url = reverse('tag-search')
+        self.python = Tag.objects.create(name='Python')
+        self.pythonic = Tag.objects.create(name='Pythonic style')
+        self.monty = Tag.objects.create(name='Comedy', label='Monty Python')
+        self.jython = Tag.objects.create(name='Jython')
+        Tag.objects.create(name='İstanbul')
+        # Usage: Pythonic style on two posts, Python on one
+        for i, tags in enumerate([[self.pythonic, self.python], [self.pythonic]]):
+            post = Post.objects.create(
+                title=f'Post {i}', description='Description', posted_by=self.user,
+                post_type='offer', location='Location', duration='1 hour'
+            )
+            post.tags.add(*tags)
+    
+    def search(self, query, wikidata=()):
+        # Seed the Wikidata result cache so the remote API is never called
+        cache.set(search_cache_key(query), list(wikidata))
+        response = self.client.get(self.url, {'q': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+    
+    def test_prefix_ranking(self):
+        """Test name prefixes rank above word prefixes, then by usage"""
+        self.assertEqual([r['name'] for r in self.search('pyt')], ['Pythonic style', 'Python', 'Comedy'])
+        self.assertEqual([r['name'] for r in self.search('PYTHON')], ['Python', 'Pythonic style', 'Comedy'])
+        self.assertEqual([r['name'] for r in self.search('ist')], ['İstanbul'])
+    
+    def test_index_follows_tag_changes(self):
+        """Test renamed, deleted and externally added tags are reflected"""
+        from api.services.tag_index import VERSION_KEY
+        
+        self.jython.name = 'Pyjamas'
+        self.jython.save()
+        self.python.delete()
+        self.assertEqual([r['name'] for r in self.search('py')], ['Pythonic style', 'Pyjamas', 'Comedy'])
+        
+        # Rows written without signals show up once the shared version moves (another process saved a tag)
+        Tag.objects.bulk_create([Tag(name='Pygame', tag_id=100)])
+        caches['shared'].incr(VERSION_KEY)
+        self.assertIn('Pygame', [r['name'] for r in self.search('pyg')])
+    
+    def test_tag_changes_reach_other_processes(self):
+        """Test a tag created in one worker shows up in another worker's already loaded index"""
+        from api.services import tag_index
+        
+        # Another worker: its own index and default cache, only the shared cache in common
+        other_index = tag_index.TagIndex()
+        other_caches = dict(settings.CACHES, default={
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-process',
+        })
+        
+        with mock.patch.object(tag_index, '_index', other_index), override_settings(CACHES=other_caches):
+            self.assertEqual([r['name'] for r in self.search('pyr')], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Pyramid')
+        self.assertEqual([r['name'] for r in self.search('pyr')], ['Pyramid'])
+        with mock.patch.object(tag_index, '_index', other_index), override_settings(CACHES=other_caches):
+            self.assertEqual([r['name'] for r in self.search('pyr')], ['Pyramid'])
+    
+    def test_wikidata_results_use_one_lookup(self):
+        """Test remote results are matched to existing tags with a single query"""
+        django_tag = Tag.objects.create(name='Django framework', wikidata_id='Q842014')
+        flask_tag = Tag.objects.create(name='Flask framework', wikidata_id='Q289281')
+        wikidata = [
+            {'id': 'Q842014', 'label': 'Django', 'description': 'web framework'},
+            {'id': 'Q289281', 'label': 'Flask', 'description': 'web framework'},
+            {'id': 'Q1', 'label': 'Zzqx', 'description': 'new entity'},
+        ]
+        self.search('zzqx')  # Loads the index
+        # The (empty) local Wikidata mirror, then every remote result's tag in one query
+        with self.assertNumQueries(2):
+            results = self.search('zzqx', wikidata)
+        self.assertEqual([r['id'] for r in results], [django_tag.id, flask_tag.id, None])
+        self.assertEqual([r['source'] for r in results], ['local', 'local', 'wikidata'])
+
+
+class LeaderboardAPITest(TestCase):
+    """Test leaderboard endpoint and the admin dashboard's best users"""
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.provider = User.objects.create_user(username='provider', password='pass123')
+        self.post = Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.provider,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour'
+        )
+        self.users = {}
+        for username, scores in [('alice', [5, 5]), ('bob', [3]), ('carol', [4, 4])]:
+            user = User.objects.create_user(username=username, password='pass123')
+            self.users[username] = user
+            for score in scores:
+                reviewer = User.objects.create_user(username=f'{username}_reviewer_{Review.objects.count()}', password='pass123')
+                proposal = Proposal.objects.create(
+                    post=self.post,
+                    requester=reviewer,
+                    provider=user,
+                    timebank_hour=Decimal('1.00'),
+                    status='completed'
+                )
+                Review.objects.create(
+                    proposal=proposal,
+                    reviewer=reviewer,
+                    reviewed_user=user,
+                    friendliness=score,
+                    time_management=score,
+                    reliability=score,
+                    communication=score,
+                    work_quality=score
+                )
+    
+    def test_leaderboard_order_and_limit(self):
+        """Test users are ranked by overall rating and limited"""
+        response = self.client.get(reverse('leaderboard'), {'limit': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['username'] for row in response.data], ['alice', 'carol'])
+        self.assertEqual(response.data[0]['rating'], 5.0)
+        self.assertEqual(response.data[0]['total_reviews'], 2)
+    
+    def test_leaderboard_min_reviews(self):
+        """Test users below the minimum review count are excluded"""
+        response = self.client.get(reverse('leaderboard'), {'min_reviews': 2})
+        self.assertEqual([row['username'] for row in response.data], ['alice', 'carol'])
+    
+    def test_leaderboard_is_single_query(self):
+        """Test the leaderboard does not issue a query per user"""
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('leaderboard'))
+        self.assertEqual(len(response.data), 3)
+    
+    def test_admin_dashboard_best_users(self):
+        """Test the admin dashboard lists the top rated users"""
+        admin = User.objects.create_user(username='admin', password='pass123', is_staff=True)
+        self.client.force_authenticate(user=admin)
+        response = self.client.get(reverse('admin-dashboard'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data['metrics']['bestUsers'],
+            [{'username': 'alice', 'rating': 5.0}, {'username': 'carol', 'rating': 4.0}, {'username': 'bob', 'rating': 3.0}]
+        )
+    
+    def test_benchmark_command_smoke(self):
+        """Test the leaderboard benchmark runs and rolls its data back"""
+        users_before = User.objects.count()
+        out = StringIO()
+        call_command('benchmark', 'leaderboard', '--sizes', '5', '10', '--repeat', '1', stdout=out)
+        self.assertIn('users=', out.getvalue())
+        self.assertEqual(User.objects.count(), users_before)
+    
+    def test_geo_benchmark_smoke(self):
+        """Test the geo benchmark runs and rolls its posts back"""
+        posts_before = Post.objects.count()
+        out = StringIO()
+        call_command('benchmark', 'geo', '--sizes', '50', '--repeat', '1', stdout=out)
+        self.assertIn('posts=', out.getvalue())
+        self.assertEqual(Post.objects.count(), posts_before)
+
+    def test_search_benchmark_smoke(self):
+        """Test the search benchmark runs and rolls its posts back"""
+        posts_before = Post.objects.count()
+        out = StringIO()
+        call_command('benchmark', 'search', '--sizes', '50', '--repeat', '1', stdout=out)
+        self.assertIn('q (full-text)', out.getvalue())
+        self.assertEqual(Post.objects.count(), posts_before)
+
+
+class NotificationSummaryAPITest(TestCase):
+    """Test the unified notification summary endpoint and its ETag handling"""
+    
+    def setUp(self):
+        caches['shared'].clear()
+        self.client = APIClient()
+        self.user1 = User.objects.create_user(username='user1', password='pass123')
+        self.user2 = User.objects.create_user(username='user2', password='pass123')
+        self.user1.profile.time_balance = Decimal('4.00')
+        self.user1.profile.save()
+        self.chat = Chat.objects.create(participant1=self.user1, participant2=self.user2)
+        self.url = reverse('notification-summary')
+    
+    def test_summary_counts(self):
+        """Test summary returns unread messages, pending proposals and balance together"""
+        post = Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.user2,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour'
+        )
+        Proposal.objects.create(post=post, requester=self.user1, provider=self.user2, status='waiting')
+        Message.objects.create(chat=self.chat, sender=self.user2, content='Hello')
+        
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 1)
+        self.assertEqual(response.data['pending_proposal_count'], 1)
+        self.assertEqual(Decimal(response.data['time_balance']), Decimal('4.00'))
+        self.assertTrue(response['ETag'])
+    
+    def test_unchanged_poll_returns_304_without_queries(self):
+        """Test a matching If-None-Match is answered from the cache alone"""
+        self.client.force_authenticate(user=self.user1)
+        etag = self.client.get(self.url)['ETag']
+        
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+    
+    def test_writes_change_etag(self):
+        """Test new messages and balance changes bump the recipient's version"""
+        self.client.force_authenticate(user=self.user1)
+        etag = self.client.get(self.url)['ETag']
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(chat=self.chat, sender=self.user2, content='Hello')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['unread_count'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+        
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user1.profile.time_balance = Decimal('6.00')
+            self.user1.profile.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Decimal(response.data['time_balance']), Decimal('6.00'))
+    
+    def test_chat_polls_keep_etag_until_read_mark_moves(self):
+        """Test reading a chat changes the ETag only when it marks new messages read"""
+        Message.objects.create(chat=self.chat, sender=self.user2, content='Hello')
+        self.client.force_authenticate(user=self.user1)
+        messages_url = reverse('chat-messages', kwargs={'pk': self.chat.id})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(messages_url)
+        etag = self.client.get(self.url)['ETag']
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.get(messages_url)
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        
+        Message.objects.create(chat=self.chat, sender=self.user2, content='Again')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(messages_url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+    
+    def test_requires_authentication(self):
+        """Test anonymous users cannot read the summary"""
+        response = self.client.get(self.url)
+        self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+
+
+class ImageStoreAPITest(TestCase):
+    """Test base64 uploads are served from the blob store by short URL"""
+    
+    def setUp(self):
+        self.store_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.store_dir, ignore_errors=True)
+        override = override_settings(IMAGE_STORE_ROOT=self.store_dir, IMAGE_VARIANT_WORKERS=0)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.png = b'\x89PNG\r\n\x1a\n' + b'\x01' * 32
+        self.data_url = 'data:image/png;base64,' + base64.b64encode(self.png).decode()
+        self.key = hashlib.sha256(self.png).hexdigest()
+    
+    def test_create_post_returns_short_url(self):
+        """Test post create and list return an absolute blob URL instead of base64"""
+        self.client.force_authenticate(user=self.user)
+        data = {
+            'title': 'Test Post',
+            'description': 'Test Description',
+            'post_type': 'offer',
+            'location': 'Test Location',
+            'duration': '1 hour',
+            'image': self.data_url
+        }
+        response = self.client.post(reverse('post-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        expected = f'http://testserver/api/images/{self.key}/'
+        self.assertEqual(response.data['image'], expected)
+        
+        response = self.client.get(reverse('post-list'))
+        posts = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(posts[0]['image'], expected + 'thumb/')
+        
+        response = self.client.get(reverse('post-list'), {'image_variant': 'original'})
+        posts = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertEqual(posts[0]['image'], expected)
+    
+    def test_public_profile_with_stored_avatar(self):
+        """Test a public profile returns a stored avatar as an absolute URL"""
+        self.user.profile.avatar = self.data_url
+        self.user.profile.save()
+        response = self.client.get(reverse('user-profile', kwargs={'username': 'testuser'}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['profile']['avatar'], f'http://testserver/api/images/{self.key}/')
+    
+    def test_serve_image(self):
+        """Test blobs are served with immutable caching and revalidated by key"""
+        Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.user,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour',
+            image=self.data_url
+        )
+        url = reverse('image-blob', args=[self.key])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(b''.join(response.streaming_content), self.png)
+        
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_serve_thumbnail_variant(self):
+        """Test variants are rendered to WebP within their size and cached on disk"""
+        buffer = BytesIO()
+        PILImage.new('RGB', (800, 600), (200, 30, 30)).save(buffer, 'PNG')
+        data_url = 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+        post = Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.user,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour',
+            image=data_url
+        )
+        key = post.image.split('/')[-2]
+        
+        response = self.client.get(reverse('image-variant', args=[key, 'thumb']))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        with PILImage.open(BytesIO(b''.join(response.streaming_content))) as thumb:
+            self.assertEqual(thumb.format, 'WEBP')
+            self.assertEqual(thumb.size, (320, 240))
+        self.assertTrue(variant_path(key, 'thumb').exists())
+        
+        response = self.client.get(reverse('image-variant', args=[key, 'avatar']))
+        with PILImage.open(BytesIO(b''.join(response.streaming_content))) as avatar:
+            self.assertEqual(avatar.size, (96, 96))
+    
+    def test_undecodable_variant_redirects_to_original(self):
+        """Test images Pillow cannot decode fall back to the original blob"""
+        Post.objects.create(
+            title='Test Post',
+            description='Test Description',
+            posted_by=self.user,
+            post_type='offer',
+            location='Test Location',
+            duration='1 hour',
+            image=self.data_url
+        )
+        response = self.client.get(reverse('image-variant', args=[self.key, 'thumb']))
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response['Location'], reverse('image-blob', args=[self.key]))
+        self.assertEqual(self.client.get(reverse('image-variant', args=[self.key, 'huge'])).status_code, status.HTTP_404_NOT_FOUND)
+    
+    def test_missing_image(self):
+        """Test unknown or malformed keys return 404"""
+        self.assertEqual(self.client.get(reverse('image-blob', args=['0' * 64])).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('image-blob', args=['not-a-key'])).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,358 @@
+"""
+Tests for the Wikidata client (caching, request coalescing, circuit breaker) against a local fake API,
+and for the offline label mirror
+"""
+import bz2
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import Tag, WikidataLabel
+from api.services import wikidata
+from api.services.wikidata import get_wikidata_entities, get_wikidata_entity, search_cache_key, search_wikidata
+
+
+class FakeWikidataServer:
+    """
+    Minimal stand-in for the Wikidata API (wbsearchentities / wbgetentities) on a local port.
+
+    Tests fill search_results and entities, and can make it slow (delay) or fail (status).
+    Every request's query parameters are recorded in requests.
+    """
+
+    def __init__(self):
+        self.search_results = {}  # search text -> list of {'id', 'label', 'description'}
+        self.entities = {}  # Q id -> {'label', 'description'}
+        self.delay = 0
+        self.status = 200
+        self.requests = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                with server._lock:
+                    server.requests.append(params)
+                if server.delay:
+                    time.sleep(server.delay)
+                if server.status != 200:
+                    self.send_response(server.status)
+                    self.end_headers()
+                    return
+                body = json.dumps(server.respond(params)).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_address[1]}/w/api.php'
+
+    def respond(self, params):
+        if params.get('action') == 'wbsearchentities':
+            return {'search': self.search_results.get(params.get('search'), [])}
+        entities = {}
+        for wikidata_id in params.get('ids', '').split('|'):
+            entity = self.entities.get(wikidata_id)
+            if entity is None:
+                entities[wikidata_id] = {'id': wikidata_id, 'missing': ''}
+            else:
+                entities[wikidata_id] = {
+                    'id': wikidata_id,
+                    'labels': {'en': {'language': 'en', 'value': entity['label']}},
+                    'descriptions': {'en': {'language': 'en', 'value': entity.get('description', '')}},
+                }
+        return {'entities': entities}
+
+    def reset(self):
+        self.search_results, self.entities, self.requests = {}, {}, []
+        self.delay, self.status = 0, 200
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeWikidataMixin:
+    """
+    Points WIKIDATA_API_URL at a FakeWikidataServer and starts every test with a cold cache
+    and closed breaker. The local label mirror is off so lookups reach the (fake) API.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.wikidata_server = FakeWikidataServer()
+        cls.wikidata_server.start()
+        cls.addClassCleanup(cls.wikidata_server.stop)
+        cls.enterClassContext(override_settings(
+            WIKIDATA_API_URL=cls.wikidata_server.url, WIKIDATA_MIRROR=False, WIKIDATA_LIVE_API=True
+        ))
+        super().setUpClass()
+
+    def setUp(self):
+        super().setUp()
+        self.wikidata_server.reset()
+        cache.clear()
+        wikidata.breaker.reset()
+
+
+class WikidataClientTest(FakeWikidataMixin, SimpleTestCase):
+    """Test the cached Wikidata client"""
+
+    def test_search_results_are_cached(self):
+        """Test a repeated search is answered from the cache"""
+        self.wikidata_server.search_results['python'] = [
+            {'id': 'Q28865', 'label': 'Python', 'description': 'programming language'},
+            {'id': '', 'label': 'no id'},
+        ]
+        self.assertEqual(search_wikidata('python'), [{'id': 'Q28865', 'label': 'Python', 'description': 'programming language'}])
+        self.assertEqual(search_wikidata('Python '), search_wikidata('python'))
+        self.assertEqual(len(self.wikidata_server.requests), 1)
+
+    def test_empty_results_and_failures_are_cached_briefly(self):
+        """Test empty answers and errors are negative-cached instead of retried per request"""
+        self.assertEqual(search_wikidata('nothing'), [])
+        self.assertEqual(search_wikidata('nothing'), [])
+        self.assertIsNone(get_wikidata_entity('Q404'))
+        self.assertIsNone(get_wikidata_entity('Q404'))
+        self.assertEqual(len(self.wikidata_server.requests), 2)
+
+        self.wikidata_server.status = 503
+        with self.assertLogs('api.services.wikidata', 'ERROR'):
+            self.assertEqual(search_wikidata('failing'), [])
+            self.assertEqual(search_wikidata('failing'), [])
+            self.assertEqual(len(self.wikidata_server.requests), 3)
+
+            with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+                search_wikidata('failing again')
+        cache_set.assert_called_once_with(search_cache_key('failing again'), [], wikidata.NEGATIVE_CACHE_TIMEOUT)
+
+    def test_concurrent_identical_lookups_are_coalesced(self):
+        """Test simultaneous misses for one key make a single API call"""
+        self.wikidata_server.entities['Q42'] = {'label': 'Douglas Adams', 'description': 'writer'}
+        self.wikidata_server.delay = 0.3
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(get_wikidata_entity('Q42'))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.wikidata_server.requests), 1)
+        self.assertEqual([result['label'] for result in results], ['Douglas Adams'] * 5)
+
+    def test_circuit_breaker_serves_stale_results(self):
+        """Test repeated failures open the breaker, which skips the API and serves the last good answer"""
+        self.wikidata_server.search_results['django'] = [{'id': 'Q842014', 'label': 'Django', 'description': 'web framework'}]
+        good = search_wikidata('django')
+        cache.delete(search_cache_key('django'))  # Expired
+
+        self.wikidata_server.status = 500
+        with self.assertLogs('api.services.wikidata', 'WARNING') as logs:
+            for query in ('aa', 'bb', 'cc'):
+                search_wikidata(query)
+            self.assertEqual(len(self.wikidata_server.requests), 4)
+
+            self.assertEqual(search_wikidata('django'), good)
+            self.assertEqual(search_wikidata('dd'), [])
+        self.assertEqual(len(self.wikidata_server.requests), 4)
+        self.assertIn('serving stale result', logs.output[-2])
+
+    def test_breaker_counts_slow_responses_and_recovers(self):
+        """Test slow answers trip the breaker and a successful trial call closes it"""
+        self.wikidata_server.delay = 0.1
+        with mock.patch.object(wikidata, 'SLOW_REQUEST_SECONDS', 0.05), self.assertLogs('api.services.wikidata', 'WARNING'):
+            for query in ('aa', 'bb', 'cc'):
+                search_wikidata(query)
+        self.assertFalse(wikidata.breaker.allow())
+
+        self.wikidata_server.delay = 0
+        self.wikidata_server.search_results['ee'] = [{'id': 'Q1', 'label': 'Ee', 'description': ''}]
+        with mock.patch.object(wikidata.breaker, 'reset_timeout', 0):
+            self.assertEqual(len(search_wikidata('ee')), 1)
+        self.assertTrue(wikidata.breaker.allow())
+        self.assertEqual(len(self.wikidata_server.requests), 4)
+
+    def test_unexpected_responses_and_coalescing_timeouts_fall_back(self):
+        """Test malformed answers and followers giving up on a slow call return empty results"""
+        with mock.patch.object(self.wikidata_server, 'respond', return_value={'search': 'oops'}), \
+                self.assertLogs('api.services.wikidata', 'ERROR'):
+            self.assertEqual(search_wikidata('malformed'), [])
+        self.assertEqual(wikidata.breaker.failures, 1)
+
+        wikidata.breaker.reset()
+        self.wikidata_server.entities['Q42'] = {'label': 'Douglas Adams'}
+        self.wikidata_server.delay = 0.3
+        results = []
+        with mock.patch.object(wikidata, 'COALESCED_WAIT_SECONDS', 0.05), \
+                self.assertLogs('api.services.wikidata', 'ERROR'):
+            threads = [threading.Thread(target=lambda: results.append(get_wikidata_entity('Q42'))) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+                time.sleep(0.05)
+            for thread in threads:
+                thread.join()
+        self.assertEqual(results, [None, {'id': 'Q42', 'label': 'Douglas Adams', 'description': ''}])
+        self.assertEqual(len(self.wikidata_server.requests), 2)
+
+    def test_entities_are_fetched_in_batches(self):
+        """Test many ids cost one wbgetentities call per 50 and warm the per-entity cache"""
+        ids = [f'Q{i}' for i in range(1, 121)]
+        for wid in ids[:-1]:
+            self.wikidata_server.entities[wid] = {'label': f'Entity {wid}'}
+        entities = get_wikidata_entities(ids + ['Q1', 'not-an-id'])
+        self.assertEqual(list(entities), ids[:-1])
+        self.assertEqual([len(r['ids'].split('|')) for r in self.wikidata_server.requests], [50, 50, 20])
+        
+        self.assertEqual(get_wikidata_entity('Q7')['label'], 'Entity Q7')
+        self.assertIsNone(get_wikidata_entity('Q120'))
+        self.assertEqual(len(get_wikidata_entities(ids)), 119)
+        self.assertEqual(len(self.wikidata_server.requests), 3)
+
+
+class WikidataTagCreationTest(FakeWikidataMixin, TestCase):
+    """Test tags are created from Wikidata ids with batched lookups"""
+    
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+    
+    def test_forum_topic_wikidata_ids(self):
+        """Test a topic's missing Wikidata tags are fetched in one call and bulk-created"""
+        existing = Tag.objects.create(name='Python', wikidata_id='Q28865')
+        Tag.objects.create(name='Taken')
+        self.wikidata_server.entities.update({
+            'Q842014': {'label': 'Django', 'description': 'web framework'},
+            'Q289281': {'label': 'Flask', 'description': 'web framework'},
+            'Q1': {'label': 'Taken'},
+        })
+        
+        response = self.client.post(reverse('forum-topic-list'), {
+            'title': 'Web frameworks', 'content': 'Which one?',
+            'wikidata_ids': ['Q28865', 'Q842014', 'Q289281', 'Q1', 'Q404'],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        
+        self.assertEqual(len(self.wikidata_server.requests), 1)
+        self.assertEqual(self.wikidata_server.requests[0]['ids'], 'Q842014|Q289281|Q1|Q404')
+        self.assertEqual(
+            sorted(tag['name'] for tag in response.data['semantic_tags']), ['Django', 'Flask', 'Python']
+        )
+        django_tag = Tag.objects.get(wikidata_id='Q842014')
+        self.assertEqual((django_tag.description, django_tag.is_custom), ('web framework', False))
+        self.assertEqual(Tag.objects.get(wikidata_id='Q289281').tag_id, django_tag.tag_id + 1)
+        self.assertGreater(django_tag.tag_id, existing.tag_id)
+    
+    def test_post_tags_with_known_labels(self):
+        """Test tag picker entries carrying a label create their tags without calling Wikidata"""
+        response = self.client.post(reverse('post-list'), {
+            'title': 'Help', 'description': 'Description', 'post_type': 'offer',
+            'location': 'Location', 'duration': '1 hour',
+            'tags_data': [
+                {'name': 'Gardening', 'label': 'gardening', 'wikidata_id': 'Q14748', 'description': 'growing plants'},
+                {'name': 'Cooking', 'wikidata_id': 'Q38695'},
+                'Custom',
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.wikidata_server.requests, [])
+        self.assertEqual(sorted(Tag.objects.values_list('name', 'wikidata_id', 'is_custom')), [
+            ('Cooking', 'Q38695', False), ('Custom', None, True), ('Gardening', 'Q14748', False),
+        ])
+
+
+@override_settings(WIKIDATA_MIRROR=True, WIKIDATA_LIVE_API=False, WIKIDATA_API_URL='http://127.0.0.1:9/unreachable')
+class WikidataMirrorTest(TestCase):
+    """Test the offline label mirror and its import command"""
+    
+    def import_dump(self, lines, suffix='.json.bz2', *args):
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        opener = bz2.open if suffix.endswith('.bz2') else open
+        with opener(path, 'wt', encoding='utf-8') as dump:
+            dump.write('\n'.join(lines) + '\n')
+        call_command('import_wikidata_labels', path, *args, stdout=StringIO())
+    
+    def setUp(self):
+        cache.clear()
+        # Official dump layout: a JSON array with one entity per line
+        entity = lambda wid, label, sitelinks, description='': json.dumps({
+            'id': wid, 'type': 'item',
+            'labels': {'en': {'language': 'en', 'value': label}, 'tr': {'language': 'tr', 'value': label + ' (tr)'}},
+            'descriptions': {'en': {'language': 'en', 'value': description}},
+            'sitelinks': {f'site{i}': {} for i in range(sitelinks)},
+        }) + ','
+        self.import_dump([
+            '[',
+            entity('Q28865', 'Python', 90, 'programming language'),
+            entity('Q271218', 'Python', 40, 'genus of reptiles'),
+            entity('Q1046088', 'Pythonidae', 60),
+            entity('Q406', 'İstanbul', 200, 'largest city in Turkey'),
+            json.dumps({'id': 'P31', 'labels': {'en': {'value': 'instance of'}}}) + ',',
+            json.dumps({'id': 'Q5', 'labels': {}}) + ',',
+            ']',
+        ])
+    
+    def test_import_streams_dump_formats(self):
+        """Test the command reads the official dump (bz2) and JSON lines, skipping unusable lines"""
+        self.assertEqual(WikidataLabel.objects.count(), 4)
+        istanbul = WikidataLabel.objects.get(wikidata_id='Q406')
+        self.assertEqual((istanbul.search_label, istanbul.sitelinks), ('istanbul', 200))
+        
+        self.import_dump([
+            json.dumps({'id': 'Q406', 'label': 'Istanbul', 'description': 'city', 'sitelinks': 201}),
+            'not json',
+            json.dumps({'id': 'Q90', 'label': 'Paris', 'description': 'capital of France'}),
+        ], '.jsonl')
+        self.assertEqual(WikidataLabel.objects.count(), 5)
+        self.assertEqual(WikidataLabel.objects.get(wikidata_id='Q406').label, 'Istanbul')
+        
+        self.import_dump([json.dumps({'id': 'Q90', 'label': 'Paris'})], '.jsonl', '--replace')
+        self.assertEqual(list(WikidataLabel.objects.values_list('wikidata_id', flat=True)), ['Q90'])
+    
+    def test_search_without_network(self):
+        """Test search_wikidata answers from the mirror, exact matches and popular entities first"""
+        self.assertEqual([r['id'] for r in search_wikidata('python')], ['Q28865', 'Q271218', 'Q1046088'])
+        self.assertEqual([r['id'] for r in search_wikidata('pythoni')], ['Q1046088'])
+        self.assertEqual(search_wikidata('ist')[0]['description'], 'largest city in Turkey')
+        self.assertEqual(search_wikidata('zz'), [])
+        self.assertEqual(get_wikidata_entity('Q28865')['label'], 'Python')
+        self.assertIsNone(get_wikidata_entity('Q999'))
+        
+        client = APIClient()
+        response = client.get(reverse('tag-search'), {'q': 'pyth'})
+        self.assertEqual([(r['wikidata_id'], r['source']) for r in response.data][:1], [('Q28865', 'wikidata')])
+    
+    def test_tags_created_from_mirror(self):
+        """Test forum topic tags are created from mirror labels with the live API off"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(reverse('forum-topic-list'), {
+            'title': 'Snakes', 'content': 'Content', 'wikidata_ids': ['Q271218', 'Q999'],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([tag['description'] for tag in response.data['semantic_tags']], ['genus of reptiles'])
@@ -22,5 +22,11 @@ urlpatterns = [
     path('session/', views.SessionView.as_view(), name='session'),
     path('users/me/', views.MyProfileView.as_view(), name='my-profile'),  # Must come before users/<str:username>/
     path('users/<str:username>/', views.UserProfileView.as_view(), name='user-profile'),
+    path('users/<str:username>/statement/', views.UserStatementView.as_view(), name='user-statement'),
+    path('events/stream/', views.event_stream, name='event-stream'),
+    path('images/<str:key>/', views.image_blob, name='image-blob'),
+    path('images/<str:key>/<str:variant>/', views.image_variant, name='image-variant'),
+    path('notifications/summary/', views.NotificationSummaryView.as_view(), name='notification-summary'),
+    path('leaderboard/', views.LeaderboardView.as_view(), name='leaderboard'),
     path('admin-dashboard/', views.AdminDashboardView.as_view(), name='admin-dashboard'),
 ]
\ No newline at end of file
@@ -1,5 +1,13 @@
+import csv
+import json
+import math
+from datetime import datetime, time
+
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.contrib.auth import login, authenticate, logout
+from django.http import FileResponse, HttpResponseNotModified, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
 
@@ -11,7 +19,7 @@ from rest_framework.decorators import action
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
 
-from .models import Post, Tag, Profile, Comment, Proposal, Review, Job, Chat, Message, ForumTopic, ForumComment
+from .models import Post, Tag, Profile, Comment, Proposal, Review, Job, Chat, ChatReadState, Message, ForumTopic, ForumComment
 from django.contrib.auth.models import User
 from .serializers import (RegisterSerializer, 
     UserSerializer, 
@@ -31,9 +39,37 @@ from .serializers import (RegisterSerializer,
     AdminForumTopicSerializer,
     AdminCommentSerializer,
     AdminForumCommentSerializer)
-from django.db.models import Q, Count, Sum, F
+from django.db.models import Q, Count, Sum, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Substr
 from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
 from .services.wikidata import search_wikidata
+from .services.leaderboard import get_leaderboard, DEFAULT_LIMIT
+from .pagination import KeysetPagination, encode_cursor, decode_cursor, keyset_filter
+from .services.events import get_broker
+from .services import ledger, transitions
+from .services.notifications import get_version, pending_proposal_count
+from .services.geo import DEFAULT_RADIUS_KM, filter_bbox, filter_near
+from .services.clusters import get_clusters
+from .services.search import get_snippets, search_posts
+from .services.tag_index import search_tags
+from .services.tags import resolve_tags
+from .services.images import IMAGE_KEY_RE, IMAGE_STORE_CACHE_CONTROL, blob_path, image_path, image_url, sniff_content_type
+from .services.image_variants import IMAGE_VARIANTS, VARIANT_CONTENT_TYPE, ensure_variant
+
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_MAX_PAGE_SIZE = 100
+
+
+def get_image_variant(request, default):
+    """
+    Image rendition requested with ?image_variant= (a name from IMAGE_VARIANTS or 'original').
+    Unknown values fall back to the view's default; None means the original image.
+    """
+    variant = request.query_params.get('image_variant', default)
+    if variant == 'original':
+        return None
+    return variant if variant in IMAGE_VARIANTS else default
 
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
@@ -97,6 +133,20 @@ class SessionView(APIView):
         # Return 401 error if not authenticated
         return Response({"error": "Not authenticated."}, status=status.HTTP_401_UNAUTHORIZED)
 
+def tag_search_result(tag):
+    """Tag search entry for a tag that exists locally"""
+    return {
+        'id': tag.id,
+        'tag_id': tag.tag_id,
+        'name': tag.name,
+        'label': tag.label,
+        'description': tag.description,
+        'wikidata_id': tag.wikidata_id,
+        'is_custom': tag.is_custom,
+        'source': 'local'
+    }
+
+
 class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
@@ -107,6 +157,7 @@ class TagViewSet(viewsets.ModelViewSet):
         """
         Search tags locally and on Wikidata.
         Query parameter: q (search query)
+        Local tags match by word prefix (case and accent insensitive), best match and most used first.
         """
         query = request.query_params.get('q', '').strip()
         
@@ -116,47 +167,31 @@ class TagViewSet(viewsets.ModelViewSet):
         results = []
         existing_wikidata_ids = set()
         
-        # 1. Search local database
-        local_tags = Tag.objects.filter(name__icontains=query)[:10]
-        for tag in local_tags:
-            results.append({
-                'id': tag.id,
-                'tag_id': tag.tag_id,
-                'name': tag.name,
-                'label': tag.label,
-                'description': tag.description,
-                'wikidata_id': tag.wikidata_id,
-                'is_custom': tag.is_custom,
-                'source': 'local'
-            })
+        # 1. Search local tags: in-memory prefix index ranked by match quality and usage
+        for tag in search_tags(query):
+            results.append(tag_search_result(tag))
             if tag.wikidata_id:
                 existing_wikidata_ids.add(tag.wikidata_id)
         
         # 2. If local results are less than 5, search Wikidata
         if len(results) < 5:
-            wikidata_results = search_wikidata(query)
+            wikidata_results = [
+                item for item in search_wikidata(query)
+                # Skip if we already have this Wikidata entity locally
+                if item.get('id', '') not in existing_wikidata_ids
+            ]
+            # Tags already created from these entities, in one query
+            known_tags = Tag.objects.in_bulk(
+                [item['id'] for item in wikidata_results if item.get('id')], field_name='wikidata_id'
+            )
             
             for item in wikidata_results:
                 wikidata_id = item.get('id', '')
-                # Skip if we already have this Wikidata entity locally
-                if wikidata_id in existing_wikidata_ids:
-                    continue
-                
-                # Check if tag with this wikidata_id exists
-                existing_tag = Tag.objects.filter(wikidata_id=wikidata_id).first()
+                existing_tag = known_tags.get(wikidata_id)
                 if existing_tag:
                     # Add existing tag if it matches query
                     if existing_tag.name.lower() not in [r['name'].lower() for r in results]:
-                        results.append({
-                            'id': existing_tag.id,
-                            'tag_id': existing_tag.tag_id,
-                            'name': existing_tag.name,
-                            'label': existing_tag.label,
-                            'description': existing_tag.description,
-                            'wikidata_id': existing_tag.wikidata_id,
-                            'is_custom': existing_tag.is_custom,
-                            'source': 'local'
-                        })
+                        results.append(tag_search_result(existing_tag))
                 else:
                     # New Wikidata result (not in DB yet)
                     results.append({
@@ -176,11 +211,29 @@ class TagViewSet(viewsets.ModelViewSet):
 class PostViewSet(viewsets.ModelViewSet):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination  # ?pagination=cursor for keyset pages of the feed
 
     def perform_create(self, serializer):
        
         serializer.save(posted_by=self.request.user)
 
+    def paginate_queryset(self, queryset):
+        """Attach highlighted snippets to the current page of a full-text search"""
+        page = super().paginate_queryset(queryset)
+        query = self.request.query_params.get('q')
+        if query:
+            posts = page if page is not None else list(queryset)
+            snippets = get_snippets([post.pk for post in posts], query)
+            for post in posts:
+                post.search_snippet = snippets.get(post.pk)
+        return page
+
+    def get_serializer_context(self):
+        """Lists reference thumbnails; single posts return the original image"""
+        context = super().get_serializer_context()
+        context['image_variant'] = get_image_variant(self.request, 'thumb' if self.action == 'list' else None)
+        return context
+
     # Filtering settings
     filter_backends = [
         DjangoFilterBackend, 
@@ -209,6 +262,31 @@ class PostViewSet(viewsets.ModelViewSet):
             'message': 'Post visibility toggled successfully'
         }, status=status.HTTP_200_OK)
     
+    @action(detail=False, methods=['get'])
+    def clusters(self, request):
+        """
+        GET /api/posts/clusters/ - Aggregated post clusters for zoomed-out map views
+        Query parameters: min_lat, max_lat, min_lon, max_lon, zoom (map zoom level)
+        Each cluster has count, centroid (latitude/longitude), offer/need split and cell bounds.
+        """
+        try:
+            bbox = [float(request.query_params[name]) for name in ('min_lat', 'max_lat', 'min_lon', 'max_lon')]
+            zoom = int(request.query_params.get('zoom', 0))
+        except (KeyError, ValueError, TypeError):
+            return Response(
+                {"error": "min_lat, max_lat, min_lon and max_lon are required numbers; zoom must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(math.isfinite(value) for value in bbox) or bbox[0] > bbox[1]:
+            return Response({"error": "Invalid bounding box"}, status=status.HTTP_400_BAD_REQUEST)
+        
+        min_lat, max_lat, min_lon, max_lon = bbox
+        return Response(get_clusters(
+            max(-90.0, min_lat), min(90.0, max_lat),
+            max(-180.0, min(180.0, min_lon)), max(-180.0, min(180.0, max_lon)),
+            zoom
+        ))
+    
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to check if post is hidden for non-staff users"""
         instance = self.get_object()
@@ -223,8 +301,8 @@ class PostViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """
-        Adds geographical bounding box filter and hides posts based on user permissions.
-        Query parameters: min_lat, max_lat, min_lon, max_lon
+        Adds full-text search, geographical bounding box / radius filters and hides posts based on user permissions.
+        Query parameters: q, min_lat, max_lat, min_lon, max_lon, near=lat,lon, radius_km
         """
         # Optimize queries with select_related and prefetch_related
         # Use only() to fetch only required fields for better performance
@@ -249,36 +327,43 @@ class PostViewSet(viewsets.ModelViewSet):
         if not self.request.user.is_authenticated or not self.request.user.is_staff:
             queryset = queryset.filter(is_hidden=False)
         
-        # Get bounding box parameters
-        min_lat = self.request.query_params.get('min_lat')
-        max_lat = self.request.query_params.get('max_lat')
-        min_lon = self.request.query_params.get('min_lon')
-        max_lon = self.request.query_params.get('max_lon')
+        params = self.request.query_params
         
-        # Apply geographical filtering
-        if min_lat is not None:
-            try:
-                queryset = queryset.filter(latitude__gte=float(min_lat))
-            except (ValueError, TypeError):
-                pass
+        # Full-text search: q= matches title, description and tag names by word prefix, best first
+        query = params.get('q')
+        if query:
+            queryset = search_posts(queryset, query)
         
-        if max_lat is not None:
+        # Radius search: near=lat,lon&radius_km= returns posts nearest first
+        near = params.get('near')
+        if near is not None:
             try:
-                queryset = queryset.filter(latitude__lte=float(max_lat))
+                lat, lon = (float(value) for value in near.split(','))
+                radius_km = float(params.get('radius_km', DEFAULT_RADIUS_KM))
             except (ValueError, TypeError):
                 pass
+            else:
+                if -90 <= lat <= 90 and -180 <= lon <= 180:
+                    queryset = filter_near(queryset, lat, lon, radius_km)
         
-        if min_lon is not None:
-            try:
-                queryset = queryset.filter(longitude__gte=float(min_lon))
-            except (ValueError, TypeError):
-                pass
+        # Get bounding box parameters
+        bbox = {}
+        for name in ('min_lat', 'max_lat', 'min_lon', 'max_lon'):
+            value = params.get(name)
+            if value is not None:
+                try:
+                    value = float(value)
+                except (ValueError, TypeError):
+                    continue
+                if math.isfinite(value):
+                    bbox[name] = value
         
-        if max_lon is not None:
-            try:
-                queryset = queryset.filter(longitude__lte=float(max_lon))
-            except (ValueError, TypeError):
-                pass
+        # Apply geographical filtering: a full box uses the grid cell index
+        if len(bbox) == 4:
+            queryset = filter_bbox(queryset, bbox['min_lat'], bbox['max_lat'], bbox['min_lon'], bbox['max_lon'])
+        else:
+            lookups = {'min_lat': 'latitude__gte', 'max_lat': 'latitude__lte', 'min_lon': 'longitude__gte', 'max_lon': 'longitude__lte'}
+            queryset = queryset.filter(**{lookups[name]: value for name, value in bbox.items()})
         
         return queryset
 
@@ -302,6 +387,8 @@ class UserProfileView(APIView):
                     self.query_params = original_request.query_params.copy()
                     self.query_params['include_reviews'] = 'true'
                     self.user = original_request.user
+                    # Stored images are returned as absolute URLs (services/images.py)
+                    self.build_absolute_uri = original_request.build_absolute_uri
             
             modified_request = ModifiedRequest(request)
             serializer = UserSerializer(user, context={'request': modified_request})
@@ -330,7 +417,7 @@ class UserProfileView(APIView):
                 # Fallback: manually add profile data if serializer doesn't include it
                 profile = user.profile if hasattr(user, 'profile') else None
                 user_data['profile'] = {
-                    'avatar': profile.avatar if profile else None,
+                    'avatar': image_url(profile.avatar, request) if profile else None,
                     'time_balance': float(profile.time_balance) if profile else 0.0,
                     'bio': profile.bio if profile and hasattr(profile, 'bio') else None,
                     'phone': profile.phone if profile and hasattr(profile, 'phone') else None,
@@ -415,68 +502,19 @@ class MyProfileView(APIView):
         user.save()
         
         # Profile update (avatar, bio, phone, location, interested_tags)
-        if 'avatar' in request.data:
-            profile.avatar = request.data['avatar']
-        
-        if 'bio' in request.data:
-            profile.bio = request.data['bio']
-        
-        if 'phone' in request.data:
-            profile.phone = request.data['phone']
-        
-        if 'location' in request.data:
-            profile.location = request.data['location']
+        edited_fields = [field for field in ('avatar', 'bio', 'phone', 'location') if field in request.data]
+        for field in edited_fields:
+            setattr(profile, field, request.data[field])
         
         if 'interested_tags' in request.data:
-            interested_tags_data = request.data['interested_tags']
-            from .models import Tag
-            
             # Process interested_tags: can be list of IDs, list of tag objects, or mixed
-            tag_objects = []
-            if interested_tags_data:
-                for tag_data in interested_tags_data:
-                    if isinstance(tag_data, dict):
-                        # If it's a dict with 'id', get existing tag
-                        if 'id' in tag_data:
-                            try:
-                                tag = Tag.objects.get(id=tag_data['id'])
-                                tag_objects.append(tag)
-                            except Tag.DoesNotExist:
-                                continue
-                        # If it's a dict with 'name', create or get tag
-                        elif 'name' in tag_data:
-                            tag_name = tag_data.get('name', '').strip()
-                            if tag_name:
-                                tag, created = Tag.objects.get_or_create(
-                                    name=tag_name,
-                                    defaults={
-                                        'description': tag_data.get('description', ''),
-                                        'wikidata_id': tag_data.get('wikidata_id'),
-                                        'is_custom': tag_data.get('is_custom', True),
-                                        'label': tag_data.get('label', tag_name)
-                                    }
-                                )
-                                tag_objects.append(tag)
-                    # If it's just an integer (tag ID)
-                    elif isinstance(tag_data, int):
-                        try:
-                            tag = Tag.objects.get(id=tag_data)
-                            tag_objects.append(tag)
-                        except Tag.DoesNotExist:
-                            continue
-                    # If it's a string (tag name)
-                    elif isinstance(tag_data, str):
-                        tag_name = tag_data.strip()
-                        if tag_name:
-                            tag, created = Tag.objects.get_or_create(
-                                name=tag_name,
-                                defaults={'is_custom': True}
-                            )
-                            tag_objects.append(tag)
-            
+            tag_objects = resolve_tags(request.data['interested_tags'])
             profile.interested_tags.set(tag_objects)
         
-        profile.save()
+        # Only the edited columns: time_balance moves through the ledger and must not be
+        # written back from the copy loaded at the start of the request
+        if edited_fields:
+            profile.save(update_fields=edited_fields)
         
         return Response(UserSerializer(user).data)
 
@@ -550,9 +588,11 @@ class ProposalViewSet(viewsets.ModelViewSet):
     POST /api/proposals/ - Create a new proposal
     PUT /api/proposals/<id>/ - Update a proposal
     DELETE /api/proposals/<id>/ - Delete a proposal
+    Lists accept ?pagination=cursor for keyset pages over (created_at, id); see KeysetPagination
     """
     serializer_class = ProposalSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """Filter proposals by requester (sent proposals), provider (received proposals), or post ID"""
@@ -638,6 +678,7 @@ class ProposalViewSet(viewsets.ModelViewSet):
         # Check if images should be excluded from post_details
         exclude_images = self.request.query_params.get('exclude_images', 'false').lower() == 'true'
         context['exclude_images'] = exclude_images
+        context['image_variant'] = get_image_variant(self.request, 'thumb')
         return context
     
     def perform_create(self, serializer):
@@ -645,6 +686,35 @@ class ProposalViewSet(viewsets.ModelViewSet):
         post = serializer.validated_data['post']
         serializer.save(requester=self.request.user, provider=post.posted_by)
     
+    def perform_update(self, serializer):
+        """Record who applied a status change (cancelled_by of the closed jobs)"""
+        serializer.instance._transition_actor = self.request.user
+        serializer.save()
+    
+    @action(detail=False, methods=['post'], url_path='bulk-transition')
+    def bulk_transition(self, request):
+        """
+        Apply one transition ('accept', 'decline' or 'cancel') to many proposals at once.
+        Body: {"transition": "accept", "ids": [1, 2, 3]}. Proposals not in a legal
+        source status, or on which the user is not an allowed party, are skipped;
+        the rest change in one transaction (all or nothing).
+        """
+        ids = request.data.get('ids')
+        if not isinstance(ids, list) or not ids:
+            return Response({'error': 'ids must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = transitions.bulk_transition(request.data.get('transition', ''), ids, request.user)
+        except (TypeError, ValueError):
+            return Response({'error': 'ids must be proposal ids'}, status=status.HTTP_400_BAD_REQUEST)
+        except DjangoValidationError as e:
+            return Response({'error': ' '.join(e.messages)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+    
+    @action(detail=False, methods=['get'], url_path='transition-metrics', permission_classes=[permissions.IsAdminUser])
+    def transition_metrics(self, request):
+        """Per-transition timings (count, total, average and max seconds) of this server process"""
+        return Response(transitions.get_metrics())
+    
     @action(detail=False, methods=['get'], url_path='for-approval')
     def for_approval(self, request):
         """
@@ -713,14 +783,8 @@ class ProposalViewSet(viewsets.ModelViewSet):
         Get count of proposals that need approval (waiting/pending status)
         Lightweight endpoint that doesn't fetch images or details
         """
-        user = request.user
-        
-        from django.db.models import Q
-        # Only count proposals with waiting or pending status
-        count = Proposal.objects.filter(
-            (Q(requester=user) | Q(provider=user)),
-            (Q(status='waiting') | Q(status='pending'))
-        ).count()
+        # Stored per user and kept current by proposal writes: a primary key lookup
+        count = pending_proposal_count(request.user)
         
         return Response({
             'count': count,
@@ -736,55 +800,17 @@ class ProposalViewSet(viewsets.ModelViewSet):
             # If proposal is already accepted and has jobs, we should only cancel the job, not the proposal
             if 'decline_job' in request.data and request.data['decline_job']:
                 # This is a decline from approval page - only cancel the job, keep proposal status as accepted
-                from api.models import Profile
-                from rest_framework.response import Response
+                # Set cancellation_reason if provided
+                cancellation_reason = request.data.get('cancellation_reason', 'other')
+                if cancellation_reason not in ['not_showed_up', 'other']:
+                    cancellation_reason = 'other'  # Default to 'other'
                 
-                # Cancel the job (at approval stage, job should be 'waiting')
-                job = instance.jobs.filter(status='waiting').first()
-                if not job:
+                if transitions.decline_job(instance, request.user, cancellation_reason) is None:
                     return Response(
                         {'detail': 'No waiting job found to cancel.'},
                         status=status.HTTP_400_BAD_REQUEST
                     )
                 
-                job.status = 'cancelled'
-                job.cancelled_by = request.user
-                
-                # Set cancellation_reason if provided
-                cancellation_reason = request.data.get('cancellation_reason', 'other')
-                if cancellation_reason in ['not_showed_up', 'other']:
-                    job.cancellation_reason = cancellation_reason
-                else:
-                    job.cancellation_reason = 'other'  # Default to 'other'
-                
-                job.save()
-                
-                # Handle balance based on cancellation_reason
-                if cancellation_reason == 'not_showed_up':
-                    # Transfer balance to the other party
-                    if instance.post.post_type == 'offer':
-                        # Offer: transfer to provider (post owner)
-                        provider_profile = instance.provider.profile
-                        provider_profile.time_balance += instance.timebank_hour
-                        provider_profile.save()
-                    elif instance.post.post_type == 'need':
-                        # Need: transfer to requester
-                        requester_profile = instance.requester.profile
-                        requester_profile.time_balance += instance.timebank_hour
-                        requester_profile.save()
-                else:  # 'other' - refund to original payer
-                    # Refund balance based on post type
-                    if instance.post.post_type == 'offer':
-                        # Offer: refund to requester
-                        requester_profile = instance.requester.profile
-                        requester_profile.time_balance += instance.timebank_hour
-                        requester_profile.save()
-                    elif instance.post.post_type == 'need':
-                        # Need: refund to provider
-                        provider_profile = instance.provider.profile
-                        provider_profile.time_balance += instance.timebank_hour
-                        provider_profile.save()
-                
                 # Update notes if provided
                 if 'notes' in request.data:
                     instance.notes = (instance.notes or '') + '\n\n' + request.data['notes']
@@ -795,15 +821,6 @@ class ProposalViewSet(viewsets.ModelViewSet):
                 serializer = self.get_serializer(instance)
                 return Response(serializer.data)
             
-            # Check if status is being changed to cancelled (regular cancellation)
-            if 'status' in request.data and request.data['status'] == 'cancelled':
-                # Update related jobs to set cancelled_by
-                for job in instance.jobs.all():
-                    if job.status == 'waiting':
-                        job.status = 'cancelled'
-                        job.cancelled_by = request.user
-                        job.save()
-            
             return super().update(request, *args, **kwargs)
         except ValidationError as e:
             from rest_framework.response import Response
@@ -812,6 +829,12 @@ class ProposalViewSet(viewsets.ModelViewSet):
                 {'detail': str(e)},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        except DjangoValidationError as e:
+            # Raised by Proposal.save() (e.g. a concurrent status change)
+            return Response(
+                {'detail': ' '.join(e.messages)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
 
 class ReviewViewSet(viewsets.ModelViewSet):
@@ -916,9 +939,45 @@ class ChatViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Get all chats where current user is participant1 or participant2"""
         user = self.request.user
-        return Chat.objects.filter(
+        queryset = Chat.objects.filter(
             Q(participant1=user) | Q(participant2=user)
         ).order_by('-updated_at')
+        
+        if self.action in ('list', 'retrieve'):
+            queryset = self._annotate_inbox(queryset, user)
+        
+        return queryset
+
+    def _annotate_inbox(self, queryset, user):
+        """
+        Load everything ChatListSerializer needs in one query:
+        participants with profiles and post via select_related, and the last message
+        and unread count via correlated subqueries (no per-chat queries)
+        """
+        last_message = Message.objects.filter(chat=OuterRef('pk')).order_by('-created_at', '-id')
+        unread_messages = ChatReadState.unread_messages(user).filter(
+            chat=OuterRef('pk')
+        ).order_by().values('chat').annotate(count=Count('id')).values('count')
+        
+        return queryset.select_related(
+            'participant1__profile',
+            'participant2__profile',
+            'post'
+        ).only(
+            # Chat fields
+            'id', 'participant1_id', 'participant2_id', 'post_id', 'created_at', 'updated_at',
+            # Participant fields
+            'participant1__id', 'participant1__username', 'participant1__profile__avatar',
+            'participant2__id', 'participant2__username', 'participant2__profile__avatar',
+            # Post fields
+            'post__id', 'post__title', 'post__post_type'
+        ).annotate(
+            # 51 characters is enough for the serializer to decide whether to truncate
+            last_message_content=Subquery(last_message.annotate(preview=Substr('content', 1, 51)).values('preview')[:1]),
+            last_message_created_at=Subquery(last_message.values('created_at')[:1]),
+            last_message_sender_username=Subquery(last_message.values('sender__username')[:1]),
+            unread_message_count=Coalesce(Subquery(unread_messages[:1]), 0)
+        )
 
     def get_serializer_context(self):
         """Add request to serializer context for ChatListSerializer"""
@@ -1002,52 +1061,94 @@ class ChatViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get', 'post'], url_path='messages')
     def messages(self, request, pk=None):
-        """Get messages for a chat or create a new message"""
+        """
+        Get messages for a chat or create a new message
+        GET query parameters (keyset pagination over (created_at, id)):
+            before - cursor: return the page of messages older than this position
+            after - cursor: return the page of messages newer than this position
+            page_size - messages per page (default 50, max 100)
+        Paging is opt-in: without any of these the whole history is returned, as before.
+        page_size alone returns the latest page. Messages are always listed oldest first;
+        cursors for the neighbouring pages are sent in the Link header (rel="prev" / rel="next").
+        """
         chat = self.get_object()
         
         # Check if user is participant
-        if chat.participant1 != request.user and chat.participant2 != request.user:
+        if request.user.id not in (chat.participant1_id, chat.participant2_id):
             raise PermissionDenied("You are not authorized to access this chat.")
         
         if request.method == 'GET':
-            # Get messages and mark unread messages as read
-            messages = Message.objects.filter(chat=chat).order_by('created_at')
+            try:
+                page_size = int(request.query_params.get('page_size', MESSAGE_PAGE_SIZE))
+            except (ValueError, TypeError):
+                page_size = MESSAGE_PAGE_SIZE
+            page_size = max(1, min(page_size, MESSAGE_MAX_PAGE_SIZE))
             
-            # Store original is_read status before marking as read
-            # This allows frontend to show unread messages visually
-            message_ids_with_original_status = {}
-            for msg in messages:
-                if msg.sender != request.user:
-                    message_ids_with_original_status[msg.id] = not msg.is_read
+            before = decode_cursor(request.query_params.get('before'))
+            after = decode_cursor(request.query_params.get('after'))
             
-            # CRITICAL LOGIC: Mark messages as read if sender is not current user
-            # Only mark messages that are from the other participant and not yet read
-            messages_to_mark_read = messages.filter(
-                sender__in=[chat.participant1, chat.participant2],
-                is_read=False
-            ).exclude(sender=request.user)
+            # Read marks of both participants before this fetch (at most two rows)
+            read_marks = dict(
+                ChatReadState.objects.filter(chat=chat).values_list('user_id', 'last_read_message_id')
+            )
+            previous_mark = read_marks.get(request.user.id, 0)
+            other_user_id = chat.participant2_id if request.user.id == chat.participant1_id else chat.participant1_id
             
-            # Update in bulk
-            if messages_to_mark_read.exists():
-                messages_to_mark_read.update(is_read=True)
-                
+            # CRITICAL LOGIC: Opening the chat marks everything read with a one-row upsert of the read mark
+            current_mark = ChatReadState.mark_read(chat.id, request.user.id)
+            if current_mark > previous_mark:
                 # Update chat's updated_at to reflect activity
                 chat.updated_at = timezone.now()
                 chat.save(update_fields=['updated_at'])
+            read_marks[request.user.id] = current_mark
+            
+            messages = Message.objects.filter(chat=chat).select_related('sender')
+            paged = any(param in request.query_params for param in ('before', 'after', 'page_size'))
+            has_more_older = has_more_newer = False
+            if not paged:
+                page = list(messages.order_by('created_at', 'id'))
+            elif after is not None:
+                # Newer messages (e.g. polling for new ones): walk forward from the cursor
+                page = list(messages.filter(keyset_filter(after, before=False)).order_by('created_at', 'id')[:page_size + 1])
+                has_more_newer = len(page) > page_size
+                page = page[:page_size]
+                has_more_older = True
+            else:
+                # Latest page, or older history before the cursor: walk backward, then flip
+                if before is not None:
+                    messages = messages.filter(keyset_filter(before, before=True))
+                page = list(messages.order_by('-created_at', '-id')[:page_size + 1])
+                has_more_older = len(page) > page_size
+                page = page[:page_size][::-1]
+                has_more_newer = before is not None
+            
+            # Derive is_read from the recipient's read mark so serialization needs no extra queries
+            was_unread_ids = set()
+            for msg in page:
+                recipient_id = other_user_id if msg.sender_id == request.user.id else request.user.id
+                msg.cache_read_state(read_marks.get(recipient_id, 0) >= msg.id)
+                if msg.sender_id != request.user.id and msg.id > previous_mark:
+                    was_unread_ids.add(msg.id)
             
-            # Re-fetch messages to get updated is_read status
-            messages = Message.objects.filter(chat=chat).order_by('created_at')
-            serializer = MessageSerializer(messages, many=True)
+            serializer = MessageSerializer(page, many=True)
             response_data = serializer.data
             
-            # Add original_is_unread field to messages that were unread before marking as read
+            # Add was_unread_before_fetch field to messages that were unread before marking as read
             for msg_data in response_data:
-                if msg_data['id'] in message_ids_with_original_status:
-                    msg_data['was_unread_before_fetch'] = message_ids_with_original_status[msg_data['id']]
-                else:
-                    msg_data['was_unread_before_fetch'] = False
+                msg_data['was_unread_before_fetch'] = msg_data['id'] in was_unread_ids
             
-            return Response(response_data)
+            response = Response(response_data)
+            if page:
+                links = []
+                if has_more_older:
+                    cursor = encode_cursor(page[0].created_at, page[0].id)
+                    links.append(f'<{self._page_url(request, before=cursor)}>; rel="prev"')
+                if has_more_newer:
+                    cursor = encode_cursor(page[-1].created_at, page[-1].id)
+                    links.append(f'<{self._page_url(request, after=cursor)}>; rel="next"')
+                if links:
+                    response['Link'] = ', '.join(links)
+            return response
         
         elif request.method == 'POST':
             # Create new message
@@ -1061,9 +1162,9 @@ class ChatViewSet(viewsets.ModelViewSet):
             message = Message.objects.create(
                 chat=chat,
                 sender=request.user,
-                content=content,
-                is_read=False  # New message is unread for the receiver
+                content=content
             )
+            message.cache_read_state(False)  # New message is unread for the receiver
             
             # Update chat's updated_at to reflect new message
             chat.updated_at = timezone.now()
@@ -1072,6 +1173,14 @@ class ChatViewSet(viewsets.ModelViewSet):
             serializer = MessageSerializer(message)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    def _page_url(self, request, **cursor):
+        """Build the messages URL for a neighbouring page, keeping page_size"""
+        params = request.query_params.copy()
+        params.pop('before', None)
+        params.pop('after', None)
+        params.update(cursor)
+        return request.build_absolute_uri(request.path) + '?' + params.urlencode()
+
     @action(detail=False, methods=['get'], url_path='unread-count')
     def unread_count(self, request):
         """Get total count of unread messages for current user"""
@@ -1085,11 +1194,8 @@ class ChatViewSet(viewsets.ModelViewSet):
         # Count unread messages where:
         # 1. Message is in one of user's chats
         # 2. Message sender is NOT the current user
-        # 3. Message is not read
-        unread_count = Message.objects.filter(
-            chat__in=user_chats,
-            is_read=False
-        ).exclude(sender=user).count()
+        # 3. Message id is above the user's read mark for that chat (index range on (chat, id))
+        unread_count = ChatReadState.unread_messages(user, chats=user_chats).count()
         
         return Response({'unread_count': unread_count}, status=status.HTTP_200_OK)
 
@@ -1103,9 +1209,11 @@ class ForumTopicViewSet(viewsets.ModelViewSet):
     PUT /api/forum-topics/<id>/ - Update topic
     DELETE /api/forum-topics/<id>/ - Delete topic
     POST /api/forum-topics/<id>/toggle_hide/ - Toggle visibility (Admin only)
+    The list accepts ?pagination=cursor for keyset pages over (created_at, id); see KeysetPagination
     """
     serializer_class = ForumTopicSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """Filter topics based on user permissions"""
@@ -1178,6 +1286,117 @@ class ForumCommentViewSet(viewsets.ModelViewSet):
         serializer.save(author=self.request.user)
 
 
+class LeaderboardView(APIView):
+    """
+    GET /api/leaderboard/ - Best rated users
+    Query parameters: limit (default 10, max 100), min_reviews (default 1)
+    """
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except (ValueError, TypeError):
+            limit = DEFAULT_LIMIT
+        
+        try:
+            min_reviews = int(request.query_params.get('min_reviews', 1))
+        except (ValueError, TypeError):
+            min_reviews = 1
+        
+        return Response(get_leaderboard(limit=limit, min_reviews=min_reviews))
+
+
+class _Echo:
+    """File-like object whose write() returns the line, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+class UserStatementView(APIView):
+    """
+    GET /api/users/<username>/statement/ - Time balance statement as a streamed CSV
+    Use 'me' for the logged-in user; staff may read anyone's statement.
+    Optional ?from= and ?to= (ISO date or datetime) bound the period; the first row
+    is the opening balance, the rest are journal entries with the running balance.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, username):
+        if username == 'me':
+            user = request.user
+        else:
+            user = User.objects.filter(username=username).first()
+            if user is None:
+                return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+            if user.pk != request.user.pk and not request.user.is_staff:
+                return Response({"error": "You can only read your own statement."}, status=status.HTTP_403_FORBIDDEN)
+        
+        period = {}
+        for param in ('from', 'to'):
+            value = request.query_params.get(param)
+            if not value:
+                continue
+            parsed = parse_datetime(value)
+            if parsed is None:
+                day = parse_date(value)
+                if day is None:
+                    return Response({"error": f"Invalid '{param}' date."}, status=status.HTTP_400_BAD_REQUEST)
+                parsed = datetime.combine(day, time.min)
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            period[param] = parsed
+        
+        opening, entries = ledger.statement(user.pk, period.get('from'), period.get('to'))
+        writer = csv.writer(_Echo())
+        
+        def rows():
+            yield writer.writerow(['date', 'reason', 'amount', 'balance', 'proposal_id', 'job_id', 'counterparty'])
+            yield writer.writerow([period['from'].isoformat() if 'from' in period else '', 'opening_balance', '', opening, '', '', ''])
+            for entry in entries:
+                yield writer.writerow([
+                    entry['created_at'].isoformat(), entry['reason'], entry['amount'], entry['balance'],
+                    entry['proposal_id'] or '', entry['job_id'] or '', entry['counterparty__username'] or '',
+                ])
+        
+        response = StreamingHttpResponse(rows(), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="statement-{user.username}.csv"'
+        return response
+
+
+class NotificationSummaryView(APIView):
+    """
+    GET /api/notifications/summary/ - Unread messages, pending proposals and time balance
+    Replaces polling of chats/unread-count, proposals/for-approval/count and users/me.
+    Responses carry a version ETag; a matching If-None-Match is answered with
+    304 Not Modified from the shared cache alone, without querying the database.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        user = request.user
+        # Read the version before the counts: a write landing in between bumps it again,
+        # so the client refetches on its next poll instead of caching a stale body
+        etag = f'"{user.id}-{get_version(user.id)}"'
+        
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            user_chats = Chat.objects.filter(Q(participant1=user) | Q(participant2=user))
+            profile = Profile.objects.filter(user=user).only('time_balance').first()
+            response = Response({
+                'unread_count': ChatReadState.unread_messages(user, chats=user_chats).count(),
+                'pending_proposal_count': pending_proposal_count(user),
+                'time_balance': profile.time_balance if profile else 0,
+            })
+        
+        response['ETag'] = etag
+        # Let browsers revalidate on every poll instead of reusing the body blindly
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
 class AdminDashboardView(APIView):
     """
     Admin Dashboard API View
@@ -1231,22 +1450,11 @@ class AdminDashboardView(APIView):
         active_user_ids.update(job_provider_ids)
         active_users_count = len(active_user_ids)
         
-        # Best Users: Get users with highest overall rating
-        all_users = User.objects.filter(profile__isnull=False).select_related('profile')
-        users_with_ratings = []
-        for user_obj in all_users:
-            review_averages = user_obj.profile.get_review_averages()
-            if review_averages['total_reviews'] > 0:  # Only include users with at least one review
-                users_with_ratings.append({
-                    'username': user_obj.username,
-                    'overall_rating': review_averages['overall'],
-                    'total_reviews': review_averages['total_reviews']
-                })
-        
-        # Sort by overall rating (descending) and take top 3
-        best_users = sorted(users_with_ratings, key=lambda x: x['overall_rating'], reverse=True)[:3]
-        # Include username and rating for frontend
-        best_users_data = [{'username': user['username'], 'rating': user['overall_rating']} for user in best_users]
+        # Best Users: top 3 by overall rating, read from the maintained rating summaries
+        best_users_data = [
+            {'username': row['username'], 'rating': row['rating']}
+            for row in get_leaderboard(limit=3)
+        ]
         
         # Popular Post Tags: Get tags with most usage in posts
         popular_post_tags = Tag.objects.annotate(
@@ -1311,4 +1519,95 @@ class AdminDashboardView(APIView):
             'reportedPostComments': reported_post_comments_data,
             'reportedForumComments': reported_forum_comments_data,
             'transactions': transactions_data,
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+        }, status=status.HTTP_200_OK)
+
+
+async def event_stream(request):
+    """
+    GET /api/events/stream/ - Server-Sent Events stream for the logged-in user
+    Pushes 'message', 'proposal' and 'balance' events as they happen.
+    Async view: under ASGI an open stream does not hold a worker thread.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Not authenticated."}, status=401)
+    
+    heartbeat = getattr(settings, 'EVENT_STREAM_HEARTBEAT', 15)
+    
+    async def stream():
+        subscription = get_broker().subscribe(user.id)
+        try:
+            # Ask the browser to reconnect after 5 seconds if the connection drops
+            yield 'retry: 5000\n\n'
+            while True:
+                event = await subscription.get(timeout=heartbeat)
+                if event is None:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ': keepalive\n\n'
+                    continue
+                payload = json.dumps(event['data'], default=str)
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+        finally:
+            subscription.close()
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Disable nginx response buffering
+    return response
+
+
+def image_blob(request, key):
+    """
+    GET /api/images/<sha256>/ - Serve an image from the content-addressed blob store
+    Responses are immutable: clients may cache them forever and revalidation is answered
+    from the key alone without touching the disk.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if not IMAGE_KEY_RE.match(key):
+        return JsonResponse({'error': 'Image not found'}, status=404)
+    
+    etag = f'"{key}"'
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        try:
+            blob = open(blob_path(key), 'rb')
+        except FileNotFoundError:
+            return JsonResponse({'error': 'Image not found'}, status=404)
+        content_type = sniff_content_type(blob.read(12)) or 'application/octet-stream'
+        blob.seek(0)
+        response = FileResponse(blob, content_type=content_type)
+        response['X-Content-Type-Options'] = 'nosniff'
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = IMAGE_STORE_CACHE_CONTROL
+    return response
+
+
+def image_variant(request, key, variant):
+    """
+    GET /api/images/<sha256>/<variant>/ - Serve a WebP rendition (thumb, avatar, medium)
+    Renditions are cached on disk; a missing one is rendered in the image process pool.
+    Images that cannot be decoded redirect to the original.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    if not IMAGE_KEY_RE.match(key) or variant not in IMAGE_VARIANTS:
+        return JsonResponse({'error': 'Image not found'}, status=404)
+    
+    etag = f'"{key}-{variant}"'
+    if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+        response = HttpResponseNotModified()
+    else:
+        path = ensure_variant(key, variant)
+        if path is None:
+            if not blob_path(key).exists():
+                return JsonResponse({'error': 'Image not found'}, status=404)
+            return HttpResponseRedirect(image_path(key))
+        response = FileResponse(open(path, 'rb'), content_type=VARIANT_CONTENT_TYPE)
+        response['X-Content-Type-Options'] = 'nosniff'
+    
+    response['ETag'] = etag
+    response['Cache-Control'] = IMAGE_STORE_CACHE_CONTROL
+    return response
@@ -149,9 +149,27 @@ STATIC_URL = 'django-static/'
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000
 
+# Content-addressed image store: base64 uploads are decoded once and served from /api/images/<sha256>/
+IMAGE_STORE_ROOT = os.environ.get('IMAGE_STORE_ROOT', BASE_DIR / 'media' / 'images')
+# Processes rendering thumbnails/WebP variants; 0 renders inline in the request (tests)
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 0 if 'test' in sys.argv or 'pytest' in sys.modules else 2))
+
+# Wikidata API used for tag search and entity details (tests point it at a local fake server)
+WIKIDATA_API_URL = os.environ.get('WIKIDATA_API_URL', 'https://www.wikidata.org/w/api.php')
+# Local label mirror filled by `manage.py import_wikidata_labels`, searched before the API.
+# With WIKIDATA_LIVE_API off, tag search and tag creation never leave the server.
+WIKIDATA_MIRROR = get_env_bool('WIKIDATA_MIRROR', True)
+WIKIDATA_LIVE_API = get_env_bool('WIKIDATA_LIVE_API', True)
+
 # CACHE Configuration
 # Used for caching Wikidata API responses (1 hour cache)
-# LocMemCache is sufficient for single-server deployments
+# LocMemCache is sufficient here: every process may keep its own copy
+# The 'shared' alias holds values all worker processes must agree on: the per-user
+# notification versions behind the ETag of /api/notifications/summary/ and the tag index
+# version. Set REDIS_URL whenever several workers serve requests (the Docker image runs
+# four); without it each process keeps its own copy, which only suits a single process
+# (tests, runserver, one gunicorn worker).
+REDIS_URL = os.environ.get('REDIS_URL')
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -160,5 +178,35 @@ CACHES = {
             'MAX_ENTRIES': 1000,  # Maximum number of entries in cache
         },
         'TIMEOUT': 3600,  # Default timeout: 1 hour (used as fallback if not specified in cache.set())
-    }
-}
\ No newline at end of file
+    },
+    # Map clusters of /api/posts/clusters/, one entry per (zoom, cell); kept apart so viewports do not evict the default cache
+    'clusters': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'post-clusters',
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'TIMEOUT': None,  # Version counters never expire on their own
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'shared',
+        'TIMEOUT': None,
+    },
+}
+
+# REALTIME EVENTS (Server-Sent Events at /api/events/stream/)
+# On PostgreSQL events cross worker processes through LISTEN/NOTIFY (PostgresEventBroker).
+# InMemoryEventBroker only reaches streams served by the same process: use it only with
+# a single process (tests, runserver, one gunicorn worker); with several workers most
+# events would be silently dropped.
+EVENT_BROKER = os.environ.get(
+    'EVENT_BROKER',
+    'api.services.events.PostgresEventBroker'
+    if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql'
+    else 'api.services.events.InMemoryEventBroker'
+)
+EVENT_STREAM_HEARTBEAT = 15  # Seconds between keepalive comments on idle streams